@@ -0,0 +1,76 @@
+"""
+Compares the sweep-and-prune collision check (`World.check_entity_collisions`) with checking every pair,
+for rooms of different sizes. Also checks that both give the same results.
+
+Run from anywhere: `python benchmarks/collisions.py`
+"""
+
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT) # maps are loaded from ./server/maps
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+from world.world import World
+
+ROOM_SIZES = [8, 16, 32, 64, 128, 256]
+REPEATS = 200
+
+class FakeClient:
+    """ Just records the events that would be sent """
+
+    def __init__(self, id: str) -> None:
+        self.id = id
+        self.events = []
+
+    def send_data(self, data, event: str) -> None:
+        self.events.append((event, data.get("new_physics")))
+
+def make_world(cars: int, seed: int) -> World:
+    """
+    A world with `cars` cars spread along the first part of the track, packed closely enough that some collide.
+    """
+
+    rng = random.Random(seed)
+    world = World("Curvy", vectorized=False)
+    track = cars * 8
+
+    for i in range(cars):
+        pos = [rng.uniform(0, track), rng.uniform(-40, 40)]
+        world.create_entity(f"car{i}", "red", FakeClient(str(i)), pos, hitbox_radius=5)
+
+    return world
+
+def state(world: World) -> list:
+    return [(e.pos[0], e.pos[1], e.vel, e.angle, e.crash_ticks, e.client.events) for e in world.entities.values()]
+
+def timed(check, repeats: int) -> float:
+    """ Average seconds per call of `check` """
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        check()
+    return (time.perf_counter() - start) / repeats
+
+def main() -> None:
+    print(f"{'cars':>6} {'all pairs (ms)':>15} {'sweep (ms)':>11} {'speedup':>8}")
+
+    for cars in ROOM_SIZES:
+        brute_world, sweep_world = make_world(cars, cars), make_world(cars, cars)
+
+        # collisions print a line each
+        with contextlib.redirect_stdout(io.StringIO()):
+            brute = timed(brute_world.check_entity_collisions_brute_force, REPEATS)
+            sweep = timed(sweep_world.check_entity_collisions, REPEATS)
+
+        assert state(brute_world) == state(sweep_world), f"results differ with {cars} cars"
+
+        print(f"{cars:>6} {brute*1000:>15.3f} {sweep*1000:>11.3f} {brute/sweep:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""
+Measures how much one server process can simulate, without any real clients: rooms full of players with scripted
+key presses (see `Driver`) are ticked and broadcast to the way the server does it (see `server/mainloop.py`), with sockets that
+only count the bytes written to them.
+
+For every combination of players per room and number of rooms, it reports ticks per second, p50/p99 tick times
+(overall and per phase) and bytes sent per tick, as JSON, so runs can be compared across commits.
+
+Run from anywhere:
+```
+python benchmarks/simulation.py                                    # the default sweep, JSON on stdout
+python benchmarks/simulation.py --players 8,64 --rooms 1,16 --ticks 1200 --out before.json
+python benchmarks/simulation.py --engine vector                    # the NumPy physics engine (see VECTOR_PHYSICS)
+```
+
+### Options:
+- `--players <n,...>`: players per room (default `PLAYERS`)
+- `--rooms <n,...>`: rooms on the server (default `ROOMS`)
+- `--ticks <n>`: ticks measured per combination (default `TICKS`), after `--warmup <n>` unmeasured ones (default `WARMUP_TICKS`)
+- `--engine scalar|vector`: the physics engine (default: the server's, `VECTOR_PHYSICS`)
+- `--map <map name>`: the map every room is on (default `MAP_NAME`)
+- `--seed <n>`: seeds the players' driving (default 0) - the same seed always gives the same games
+- `--out <file>`: write the JSON there instead of to stdout
+
+### What a tick is:
+One period of the server's simulation task: every room's physics (`tick_rooms`), plus the broadcasts that fall due
+during it. Time is simulated, so rooms broadcast `BROADCAST_RATE_MAX` times per simulated second (what they do on a
+server that isn't overloaded, see `ServerLoad.room_rate`) however fast the ticks actually run.
+
+Each client acknowledges every snapshot by the next broadcast, so snapshots are deltas, like on a fast network.
+
+### Phases (each reported as p50/p99 milliseconds per tick, summed over every room):
+- `update`: physics, including collisions (`World.update`)
+- `collisions`: `World.check_entity_collisions` alone
+- `snapshot_encode`: capturing and encoding snapshots (`SnapshotEncoder.capture` and `encode`)
+- `fanout`: the rest of the broadcasts - picking what each client gets, framing, and writing to the sockets
+- `world_data`: `World.get_world_data`, encoded as the `game-init` event. Only sent when a game starts, so it is
+  measured separately, and not counted in the tick time.
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT) # maps are loaded from ./server/maps
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+from client_room import Client, Room
+from mainloop import tick_rooms
+from socket_wrapper import wrap_message, MESSAGE_INPUT, INPUT_RECORD
+from world.world import World
+from CONSTANTS import TICK_SPEED, BROADCAST_RATE_MAX, MAX_ROOM_CAPACITY
+
+PLAYERS = [8, 32, 64]
+""" Players per room, by default """
+ROOMS = [1, 4, 16]
+""" Numbers of rooms, by default """
+TICKS = 480
+""" Ticks measured per combination, by default (20 simulated seconds) """
+WARMUP_TICKS = 48
+""" Ticks run before measuring, by default - long enough for every client's broadcast rate to ramp up """
+MAP_NAME = "Curvy"
+""" The map every room is on, by default (the longest one, so races rarely finish during a run) """
+
+PHASES = ["update", "collisions", "snapshot_encode", "fanout", "world_data"]
+
+class CountingSocket:
+    """ Stands in for a client's socket: takes everything written to it, and counts the bytes """
+
+    def __init__(self) -> None:
+        self.bytes_sent = 0
+
+    def send(self, data) -> int:
+        self.bytes_sent += len(data)
+        return len(data)
+
+    def fileno(self) -> int:
+        return 0 # open
+
+    def shutdown(self, how: int) -> None:
+        pass
+
+class Driver:
+    """
+    One scripted player: holds the accelerator and steers to keep to its lane (starting with the one it spawned in),
+    now and then braking for a moment or moving over to another lane - so cars overtake, and sometimes collide,
+    without everyone crashing all the time.
+    """
+
+    def __init__(self, client: Client, rng: random.Random) -> None:
+        self.client = client
+        self.rng = rng
+        self.lane = client.entity.pos[1]
+        self.keys = 0
+        """ Bitmask, as sent in `MESSAGE_INPUT` (bit 0 = forward, ..., bit 3 = right) """
+        self.braking = 0
+        """ Ticks left before letting go of the brake """
+        self.seq = 0
+
+    def next_input(self) -> bytes:
+        """
+        The `MESSAGE_INPUT` payload for the next tick, or `None` if the keys didn't change (clients only send changes).
+        """
+
+        entity = self.client.entity
+        half_width = entity.gamemap.map_data["width"] / 2
+
+        if self.rng.random() < 0.005:
+            self.lane = self.rng.uniform(-half_width * 0.6, half_width * 0.6)
+        if self.braking == 0 and self.rng.random() < 0.003:
+            self.braking = self.rng.randint(6, 24)
+
+        # head back towards the lane, at up to 15 degrees from the track
+        heading = (entity.angle - entity.gamemap.angle_at(entity.pos[0]) + 180) % 360 - 180
+        wanted = max(-15, min(15, (self.lane - entity.pos[1]) * 0.5))
+
+        keys = 0b0010 if self.braking else 0b0001
+        if heading < wanted - 2: keys |= 0b1000 # right
+        elif heading > wanted + 2: keys |= 0b0100 # left
+        self.braking = max(0, self.braking - 1)
+
+        if keys == self.keys: return None
+        self.keys = keys
+
+        self.seq += 1
+        return INPUT_RECORD.pack(self.seq, time.time(), keys)
+
+class PhaseTimer:
+    """ Adds up the time spent in wrapped functions, until `take` is called """
+
+    def __init__(self) -> None:
+        self.seconds = 0.0
+
+    def wrap(self, fn: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+        return timed
+
+    def take(self) -> float:
+        seconds, self.seconds = self.seconds, 0.0
+        return seconds
+
+class Simulation:
+    """
+    `room_count` rooms of `players` scripted players each, started and ready to tick.
+    """
+
+    def __init__(self, players: int, room_count: int, map_name: str, seed: int) -> None:
+        self.players = players
+        self.map_name = map_name
+        self.rng = random.Random(seed)
+        random.seed(seed) # spawn spots are shuffled (see `SpawnGrid`)
+
+        self.id_to_room: Dict[str, Room] = {}
+        self.drivers: Dict[str, Driver] = {}
+        """ `{client_id: Driver}` """
+        self.sockets: List[CountingSocket] = []
+
+        self.collisions = PhaseTimer()
+        self.snapshot_encode = PhaseTimer()
+
+        self.tick = 0
+        self.next_broadcast_tick = 0.0
+        self.races_finished = 0
+
+        for index in range(room_count):
+            self.add_room(f"BENCH{index}")
+
+    def add_room(self, room_id: str) -> None:
+        """
+        Creates a room with a new set of players, and starts its game right away (no countdown).
+        """
+
+        clients = []
+        for i in range(self.players):
+            sock = CountingSocket()
+            self.sockets.append(sock)
+
+            client = Client(sock, id=f"{room_id}-{i}", room_id=room_id)
+            client.username = f"player{i}"
+            clients.append(client)
+
+        room = Room(clients[0], clients, room_id, self.map_name)
+        clients[0].hosting = room
+
+        room.world.check_entity_collisions = self.collisions.wrap(room.world.check_entity_collisions)
+        room.snapshots.capture = self.snapshot_encode.wrap(room.snapshots.capture)
+        room.snapshots.encode = self.snapshot_encode.wrap(room.snapshots.encode)
+
+        for client in clients:
+            self.drivers[client.id] = Driver(client, self.rng)
+            client.reset_snapshots()
+            client.start_receiving()
+        room.started = True
+
+        self.id_to_room[room_id] = room
+
+    def send_inputs(self) -> None:
+        for room in self.id_to_room.values():
+            for client in room.clients.values():
+                c: Client = client["client_obj"]
+                payload = self.drivers[c.id].next_input()
+                if payload is not None:
+                    c.handle_message(MESSAGE_INPUT, payload)
+
+    def broadcast(self) -> None:
+        """
+        Every room broadcasts (like `broadcast_rooms`, at `BROADCAST_RATE_MAX`), after every client
+        acknowledged the latest snapshot it was sent.
+        """
+
+        for room in list(self.id_to_room.values()):
+            if room.num_connected() == 0 or room.ended: continue
+
+            for client in room.clients.values():
+                c: Client = client["client_obj"]
+                if c.sent_slots:
+                    c.acked_snapshot = next(reversed(c.sent_slots))
+
+            room.broadcast_rate = BROADCAST_RATE_MAX
+            room.broadcast_physics()
+
+    def run_tick(self) -> Dict[str, float]:
+        """
+        Runs one tick. Returns the seconds it took in total (`tick`), and in each phase (see `PHASES`).
+        """
+
+        self.send_inputs()
+
+        start = time.perf_counter()
+        tick_rooms(self.id_to_room)
+        updated = time.perf_counter()
+
+        # every broadcast due by the end of this tick
+        self.tick += 1
+        while self.next_broadcast_tick < self.tick:
+            self.next_broadcast_tick += TICK_SPEED / BROADCAST_RATE_MAX
+            self.broadcast()
+        end = time.perf_counter()
+
+        snapshot_encode = self.snapshot_encode.take()
+        timings = {
+            "tick": end - start,
+            "update": updated - start,
+            "collisions": self.collisions.take(),
+            "snapshot_encode": snapshot_encode,
+            "fanout": end - updated - snapshot_encode,
+            "world_data": self.time_world_data(),
+        }
+
+        # finished races start over (not timed)
+        for room_id, room in list(self.id_to_room.items()):
+            if room.ended:
+                self.races_finished += 1
+                self.add_room(room_id)
+
+        return timings
+
+    def time_world_data(self) -> float:
+        start = time.perf_counter()
+        for room in self.id_to_room.values():
+            wrap_message({"start_timestamp": 0, "init_world_data": room.world.get_world_data()}, "game-init")
+        return time.perf_counter() - start
+
+    def bytes_sent(self) -> int:
+        return sum(sock.bytes_sent for sock in self.sockets)
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """ The nearest-rank percentile of `samples` (`fraction` = 0.99 for p99) """
+
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+def summarize(seconds: List[float]) -> dict:
+    """ p50, p99, mean and max of `seconds`, in milliseconds """
+
+    return {
+        "p50": round(percentile(seconds, 0.5) * 1000, 4),
+        "p99": round(percentile(seconds, 0.99) * 1000, 4),
+        "mean": round(sum(seconds) / len(seconds) * 1000, 4),
+        "max": round(max(seconds) * 1000, 4),
+    }
+
+def run(players: int, room_count: int, ticks: int, warmup: int, map_name: str, seed: int) -> dict:
+    """
+    Measures one combination of players per room and number of rooms. Returns its result, as in the JSON output.
+    """
+
+    # entities print every collision and crash
+    with contextlib.redirect_stdout(io.StringIO()):
+        sim = Simulation(players, room_count, map_name, seed)
+
+        for _ in range(warmup):
+            sim.run_tick()
+
+        bytes_before = sim.bytes_sent()
+        samples = {phase: [] for phase in ["tick"] + PHASES}
+        for _ in range(ticks):
+            for phase, seconds in sim.run_tick().items():
+                samples[phase].append(seconds)
+        bytes_per_tick = (sim.bytes_sent() - bytes_before) / ticks
+
+    return {
+        "players": players,
+        "rooms": room_count,
+        "ticks": ticks,
+        "ticks_per_sec": round(ticks / sum(samples["tick"]), 2),
+        "tick_ms": summarize(samples["tick"]),
+        "phases_ms": {phase: summarize(samples[phase]) for phase in PHASES},
+        "bytes_per_tick": round(bytes_per_tick, 1),
+        "bytes_per_player_per_sec": round(bytes_per_tick * TICK_SPEED / (players * room_count), 1),
+        "world_data_bytes": round(len(wrap_message(
+            {"start_timestamp": 0, "init_world_data": next(iter(sim.id_to_room.values())).world.get_world_data()}, "game-init"
+        ))),
+        "races_finished": sim.races_finished,
+    }
+
+def git_commit() -> str:
+    """ The commit being measured (with `-dirty` if there are uncommitted changes), or `None` outside a git checkout """
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(args: list) -> int:
+    def option(name: str, default):
+        return args[args.index(name) + 1] if name in args else default
+
+    players_list = [int(n) for n in option("--players", ",".join(map(str, PLAYERS))).split(",")]
+    rooms_list = [int(n) for n in option("--rooms", ",".join(map(str, ROOMS))).split(",")]
+    ticks = int(option("--ticks", TICKS))
+    warmup = int(option("--warmup", WARMUP_TICKS))
+    map_name = option("--map", MAP_NAME)
+    seed = int(option("--seed", 0))
+    out = option("--out", None)
+
+    if "--engine" in args:
+        World.vectorized = option("--engine", None) == "vector"
+
+    if max(players_list) > MAX_ROOM_CAPACITY:
+        print(f"\x1b[31mRooms can't have more than {MAX_ROOM_CAPACITY} players\x1b[0m", file=sys.stderr)
+        return 1
+    Room.capacity = max(players_list)
+
+    results = []
+    for players in players_list:
+        for room_count in rooms_list:
+            result = run(players, room_count, ticks, warmup, map_name, seed)
+            results.append(result)
+
+            # progress goes to stderr, so stdout is only the JSON
+            print(
+                f"{players:>4} players x {room_count:>3} rooms: \x1b[32m{result['ticks_per_sec']:>9.1f} ticks/s\x1b[0m, "
+                f"p50 {result['tick_ms']['p50']:.2f}ms, p99 {result['tick_ms']['p99']:.2f}ms, {result['bytes_per_tick']:.0f} B/tick",
+                file=sys.stderr
+            )
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "engine": "vector" if World.vectorized else "scalar",
+        "map": map_name,
+        "seed": seed,
+        "tick_speed": TICK_SPEED,
+        "broadcast_rate": BROADCAST_RATE_MAX,
+        "results": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if out is None:
+        print(text)
+    else:
+        with open(out, "w") as f:
+            f.write(text + "\n")
+        print(f"\x1b[32mResults written to \x1b[33m{out}\x1b[0m", file=sys.stderr)
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main(sys.argv[1:]))
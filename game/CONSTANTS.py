@@ -75,6 +75,40 @@ MAIN_MENU_BOTTOM_RIGHT_TEXT = "Made with Pygame"
 HTTP_URL = 'http://localhost:4000'
 SOCKET_HOST = 'localhost'
 SOCKET_PORT = 3999
+UDP_PORT = 3999
+
+USE_UDP = True
+""" Whether to try sending physics snapshots and key inputs over UDP. Falls back to TCP if the server doesn't answer. """
+UDP_HELLO_ATTEMPTS = 5
+UDP_HELLO_TIMEOUT = 0.2
+""" Seconds to wait for each UDP hello reply before retrying """
+UDP_SIMULATED_LOSS = 0
+""" Fraction (0-1) of datagrams to drop on purpose, in both directions, for testing """
+
+INPUT_HISTORY_LENGTH = 128
+""" How many of our sent inputs to remember for replaying on top of server state (see `./prediction.py`) """
+RECONCILE_SMOOTHING = 0.2
+""" Fraction of the remaining position error removed each frame after a correction from the server """
+RECONCILE_SNAP_DISTANCE = 10
+""" Corrections larger than this (in meters) are applied at once instead of smoothed (e.g. after respawning) """
+
+INTERPOLATION_DELAY = 0.35
+"""
+How far in the past (seconds) other players' cars are drawn, so there is usually a snapshot on both sides
+of the drawn time to interpolate between (see `./interpolation.py`). Should be a bit more than the server's broadcast interval.
+"""
+MAX_EXTRAPOLATION = 0.25
+""" How long (seconds) to keep moving a car past its newest snapshot, if the next one is late """
+INTERPOLATION_BUFFER_LENGTH = 32
+""" Most snapshots kept per remote car """
+
+CLOCK_SYNC_INTERVAL = 1
+""" Seconds between clock sync pings (see `./server_clock.py`) """
+CLOCK_SYNC_BURST = 5
+""" Number of pings sent right after connecting, `CLOCK_SYNC_BURST_INTERVAL` apart, so the clock is synced before a game starts """
+CLOCK_SYNC_BURST_INTERVAL = 0.1
+CLOCK_SAMPLE_COUNT = 16
+""" The clock offset is taken from the lowest-latency sample among the last this many pings """
 
 
 CARS = {
@@ -93,4 +127,4 @@ SFX_BEEP = pygame.mixer.Sound("./game/assets/sounds/beep-22.mp3")
 
 #CAR_VROOM audio file not working - weird file type - how to convert?
 rev_sound = pygame.mixer.Sound('./game/assets/sounds/rev_engine.mp3')
-crash_sound = pygame.mixer.Sound('./game/assets/sounds/crash.mp3')
\ No newline at end of file
+crash_sound = pygame.mixer.Sound('./game/assets/sounds/crash.mp3')
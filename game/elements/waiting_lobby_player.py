@@ -1,7 +1,7 @@
 import pygame
 from CONSTANTS import FONT_SMALL
 
-def waiting_lobby_player(username: str, car_color: str, is_leader = False) -> pygame.surface.Surface:
+def waiting_lobby_player(username: str, car_color: str, is_leader = False, livery: int = 0) -> pygame.surface.Surface:
     """
     Creates a component that represents a player when on the waiting lobby screen (`./screens/waiting_room.py`)
     
@@ -16,6 +16,9 @@ def waiting_lobby_player(username: str, car_color: str, is_leader = False) -> py
     + `'yellow'`
     + `'white'`
     
+    In rooms with more players than colors, colors repeat, and `livery` tells the players of the same color apart
+    (the server numbers them 0, 1, 2...). Anything above 0 is shown as a number next to the car.
+    
     Using `is_leader = True` will render a crown on top of the player's car. (to show that they are the host of the room)
     
     Returns a `pygame.surface.Surface` component that can be mounted on any other element.
@@ -33,6 +36,10 @@ def waiting_lobby_player(username: str, car_color: str, is_leader = False) -> py
     car_texture = pygame.image.load(f'./game/assets/lobby/cars/car_{car_color}.png')
     base_component.blit(car_texture, (100-car_texture.get_width()//2, 10))
     
+    if livery > 0:
+        livery_text = FONT_SMALL.render(f"#{livery+1}", True, (0, 0, 0))
+        base_component.blit(livery_text, (170-livery_text.get_width()//2, 20))
+    
     if is_leader:
         crown_texture = pygame.image.load('./game/assets/lobby/leader_crown.png')
         pygame.transform.scale(crown_texture, (40, 40))
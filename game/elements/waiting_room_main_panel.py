@@ -1,4 +1,5 @@
 import pygame
+from CONSTANTS import FONT_MEDIUM
 from elements.waiting_lobby_player import waiting_lobby_player
 
 BLIT_LOCS = [
@@ -17,15 +18,16 @@ class WaitingRoomMainPanel:
     def __init__(self):
         self.surface = pygame.surface.Surface((920, 720), pygame.SRCALPHA)
         
-        self.players = [] # list of dicts {"username": str, "color": str, "is_host": bool, "component": Surface}
+        self.players = [] # list of dicts {"username": str, "color": str, "livery": int, "is_host": bool, "component": Surface}
         
-    def add_player(self, username: str, color: str, is_host = False):
+    def add_player(self, username: str, color: str, is_host = False, livery: int = 0):
         
-        comp = waiting_lobby_player(username, color, is_host)
+        comp = waiting_lobby_player(username, color, is_host, livery)
         
         self.players.append({
             "username": username,
             "color": color,
+            "livery": livery,
             "is_host": is_host,
             "component": comp
         })
@@ -58,9 +60,19 @@ class WaitingRoomMainPanel:
         
         self.surface = pygame.surface.Surface((920, 720), pygame.SRCALPHA)
         
+        # big rooms have more players than spots: the last spot shows how many more there are instead
+        shown = self.players
+        if len(self.players) > len(BLIT_LOCS):
+            shown = self.players[:len(BLIT_LOCS)-1]
+        
         index = 0
-        for player_obj in self.players:
+        for player_obj in shown:
             self.surface.blit(player_obj["component"], BLIT_LOCS[index])
             index += 1
         
+        if len(shown) < len(self.players):
+            more_text = FONT_MEDIUM.render(f"+{len(self.players) - len(shown)} more", True, (255, 255, 255))
+            x, y = BLIT_LOCS[-1]
+            self.surface.blit(more_text, (x + 100 - more_text.get_width()//2, y + 100 - more_text.get_height()//2))
+        
         return self.surface
\ No newline at end of file
@@ -1,5 +1,9 @@
-from typing import List
+from bisect import bisect_right
+from typing import List, Union
 from CONSTANTS import *
+from track import compile_curves, compile_vanishing_points
+from map_format import CompiledMapFile, compiled_file_for
+import os
 import random
 
 class CurveSegment:
@@ -108,11 +112,51 @@ class GameMap:
         ```
         """
         
-        self.segments = self.parse_map_file()
+        compiled = self.load_compiled_map()
         
-        print(f"\x1b[32mGameMap (client): Parsed segments to be the following:\x1b[0m")
-        for segment in self.segments:
-            print(f"\x1b[32m{segment}\x1b[0m")
+        if compiled is not None:
+            # the compiled map (see ./map_format.py) is used as it is, without parsing anything.
+            # it stays in the memory-mapped file, and only the parts around the cars are ever read
+            self.segments = compiled.segments(CurveSegment)
+            self.segment_starts = self.segments.starts
+            self.track = compiled.angle_track
+            self.vanishing_track = compiled.vanishing_track
+        else:
+            self.segments = self.parse_map_file()
+            self.segment_starts = [segment.start_x for segment in self.segments]
+            """ `start_x` of every segment, for binary searches """
+            self.track = compile_curves(self.segments)
+            self.vanishing_track = compile_vanishing_points(self.segments)
+        
+        # (long tracks have thousands of segments, so they aren't listed one by one)
+        print(f"\x1b[32mGameMap (client): Loaded {self.map_name} ({len(self.segments)} segments)\x1b[0m")
+        
+    def load_compiled_map(self) -> Union[CompiledMapFile, None]:
+        """
+        Returns the compiled map file if there is an up to date one (like the server, see `load_map` in `server/map_registry.py`):
+        it is of this version, was compiled from the same map data the server sent, and isn't older than the `.map` file.
+        Otherwise, returns `None`, and the `.map` file should be parsed instead.
+        """
+        
+        source_path = f"./game/maps/{self.map_data['map_file']}"
+        compiled_path = f"./game/maps/{compiled_file_for(self.map_data['map_file'])}"
+        
+        if not os.path.exists(compiled_path): return None
+        if os.path.exists(source_path) and os.path.getmtime(compiled_path) < os.path.getmtime(source_path):
+            print(f"\x1b[33m{compiled_path} is older than {source_path}, parsing it instead\x1b[0m")
+            return None
+        
+        try:
+            compiled = CompiledMapFile(compiled_path)
+        except (ValueError, OSError) as e:
+            print(f"\x1b[33mCould not load {compiled_path} ({e}), parsing {source_path} instead\x1b[0m")
+            return None
+        
+        if compiled.metadata != self.map_data:
+            print(f"\x1b[33m{compiled_path} was compiled with different map data, parsing {source_path} instead\x1b[0m")
+            return None
+        
+        return compiled
         
     def parse_map_file(self) -> List[CurveSegment]:
         """
@@ -165,31 +209,13 @@ class GameMap:
         - For the period between `S` and `Q1`, the angle is calculated linearly from `0` to `theta_f`.
         - For the period between `Q1` and `Q3`, the angle is constant at `theta_f`.
         - For the period between `Q3` and `E`, the angle is calculated linearly from `theta_f` to `0`.
-        """
         
-        curr_curvesegment = self.curvesegment_at(x_pos)
+        Exactly at `S`, `Q1`, `Q3` and `E`, the angle is the value both sides meet at.
         
-        if curr_curvesegment is None:
-            # No curvature
-            return 0
-    
-        curvesegment_rampup_length = curr_curvesegment.mid_x - curr_curvesegment.start_x
-        curvesegment_rampdown_length = curr_curvesegment.end_x - curr_curvesegment.mid_x
+        Looked up in the compiled track (see `./track.py`), so this takes constant time however many curves there are.
+        """
         
-        start = curr_curvesegment.start_x
-        q1 = curr_curvesegment.mid_x - curvesegment_rampup_length/2
-        q3 = curr_curvesegment.mid_x + curvesegment_rampdown_length/2
-        end = curr_curvesegment.end_x
-
-        if x_pos > start and x_pos < q1:
-            self.curve_percentage = (x_pos - start) / (q1 - start)
-            return curr_curvesegment.theta_f * self.curve_percentage
-        elif x_pos > q1 and x_pos < q3:
-            # just return the full angle
-            return curr_curvesegment.theta_f
-        elif x_pos > q3 and x_pos < end:
-            self.curve_percentage = (x_pos - q3) / (end - q3)
-            return curr_curvesegment.theta_f * (1 - self.curve_percentage)
+        return self.track.value_at(x_pos)
     
     def vanishing_point_at(self, pos_x) -> float:
         """
@@ -202,23 +228,19 @@ class GameMap:
         the center of the screen to the right edge. This means the vanishing point should be at 8/10 of the screen width, or 960px.
         """
         
-        # since there are a small number of segments, a linear search should be fine
-        for segment in self.segments:
-            if pos_x >= segment.start_x and pos_x <= segment.end_x:
-                return segment.get_vanishing_point_pos(pos_x)
-            
-        return WIDTH/2 # default to center of screen if not found
+        # the center of the screen on straight track
+        return (0.5 + (self.vanishing_track.value_at(pos_x) / FOV_DEGREES) / 2) * WIDTH
     
     def curvesegment_at(self, pos_x: float) -> CurveSegment | None:
         """
-        Returns the CurveSegment defined at a certain x position.
+        Returns the CurveSegment defined at a certain x position (a binary search, however many segments there are).
         
         If there is no segment at that position, returns None.
         """
         
-        # since there are a small number of segments, a linear search should be fine
-        for segment in self.segments:
-            if pos_x >= segment.start_x and pos_x <= segment.end_x:
-                return segment
+        # segments are sorted, so the only one that can contain pos_x is the last one starting at or before it
+        i = bisect_right(self.segment_starts, pos_x) - 1
+        if i >= 0 and pos_x <= self.segments[i].end_x:
+            return self.segments[i]
         
         return None
\ No newline at end of file
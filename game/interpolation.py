@@ -0,0 +1,100 @@
+import math
+from collections import deque
+from time import time_ns
+from typing import Deque, Tuple, TYPE_CHECKING
+
+from CONSTANTS import INTERPOLATION_BUFFER_LENGTH, MAX_EXTRAPOLATION
+
+if TYPE_CHECKING:
+    from game_map import GameMap
+    from world.entity import Entity
+
+class SnapshotBuffer:
+    """
+    The recent server states of one remote entity (another player's car), by server time.
+
+    Instead of jumping to every snapshot as it arrives, remote cars are drawn slightly in the past
+    (`INTERPOLATION_DELAY` seconds), where we usually already have snapshots on both sides of the render time.
+    Positions between two snapshots are interpolated with a cubic hermite curve, which uses each snapshot's
+    velocity as the curve's tangent, so cars follow curves smoothly instead of moving in straight segments at
+    corners. If the next snapshot is late, we extrapolate from the newest one for up to `MAX_EXTRAPOLATION`
+    seconds, and then hold the car still until it arrives.
+
+    ### Entries:
+    `(server time, [pos_x, pos_y], [vel_x, vel_y], physics)`, oldest first - `physics` is the decoded snapshot data.
+    """
+
+    def __init__(self, gamemap: 'GameMap') -> None:
+        self.gamemap = gamemap
+        self.snapshots: Deque[Tuple[float, list, list, dict]] = deque(maxlen=INTERPOLATION_BUFFER_LENGTH)
+
+    def push(self, server_time: float, physics: dict) -> None:
+        """
+        Adds a state from a snapshot. Out-of-order or repeated states are ignored.
+        """
+
+        if self.snapshots and server_time <= self.snapshots[-1][0]: return
+
+        # velocity vector, in the same (track-relative) coordinates as `pos` - see `step` in `./physics.py`
+        relative_angle = math.radians(physics["angle"] - (self.gamemap.angle_at(physics["pos"][0]) or 0))
+        velocity = [physics["vel"] * math.cos(relative_angle), physics["vel"] * math.sin(relative_angle)]
+
+        self.snapshots.append((server_time, list(physics["pos"]), velocity, physics))
+
+    def sample_into(self, entity: 'Entity', render_time: float) -> bool:
+        """
+        Sets `entity`'s state to where it was at `render_time` (server time).
+
+        Returns `False` (leaving `entity` untouched) if there are no snapshots yet.
+        """
+
+        if not self.snapshots: return False
+
+        # drop snapshots we won't need again (keep one before the render time to interpolate from)
+        while len(self.snapshots) >= 2 and self.snapshots[1][0] <= render_time:
+            self.snapshots.popleft()
+
+        t0, p0, v0, physics0 = self.snapshots[0]
+
+        if render_time <= t0 or len(self.snapshots) == 1:
+            # nothing newer: extrapolate from the newest state, for a bounded time
+            dt = max(0, min(render_time - t0, MAX_EXTRAPOLATION))
+            if physics0["is_crashed"]: dt = 0
+
+            self._apply(entity, physics0, [p0[0] + v0[0]*dt, p0[1] + v0[1]*dt], physics0["angle"], physics0["vel"])
+            return True
+
+        t1, p1, v1, physics1 = self.snapshots[1]
+
+        # a crash moves the car back onto the track - don't draw it sliding there
+        if physics0["is_crashed"] or physics1["is_crashed"]:
+            self._apply(entity, physics0, p0, physics0["angle"], physics0["vel"])
+            return True
+
+        h = t1 - t0
+        s = (render_time - t0) / h
+
+        # cubic hermite basis functions
+        h00 = 2*s**3 - 3*s**2 + 1
+        h10 = s**3 - 2*s**2 + s
+        h01 = -2*s**3 + 3*s**2
+        h11 = s**3 - s**2
+
+        pos = [h00*p0[i] + h10*h*v0[i] + h01*p1[i] + h11*h*v1[i] for i in range(2)]
+
+        # angles are kept in [0, 360), so interpolate across the shortest way around
+        angle_delta = (physics1["angle"] - physics0["angle"] + 180) % 360 - 180
+        angle = (physics0["angle"] + angle_delta*s) % 360
+
+        self._apply(entity, physics0, pos, angle, physics0["vel"] + (physics1["vel"] - physics0["vel"])*s)
+        return True
+
+    @staticmethod
+    def _apply(entity: 'Entity', physics: dict, pos: list, angle: float, vel: float) -> None:
+        entity.pos = pos
+        entity.angle = angle
+        entity.vel = vel
+        entity.acc = physics["acc"]
+        entity.key_presses = physics["keys"]
+        entity.is_crashed = physics["is_crashed"]
+        entity.last_update_timestamp = time_ns()
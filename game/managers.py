@@ -4,9 +4,11 @@ import math
 import socket
 import httpx
 import json
+import struct
 import threading
 import os
-from time import time_ns
+from time import time_ns, sleep
+from random import random
 from typing import Union, Dict, List, Callable, Any, TYPE_CHECKING
 from tkinter import *
 from tkinter import messagebox, simpledialog
@@ -16,6 +18,14 @@ from animator import RoadAnimator, SpriteStripAnim
 from elements.button import Button
 from elements.input import Input
 from world.world import World
+from snapshot import SnapshotDecoder
+from prediction import Predictor
+from interpolation import SnapshotBuffer
+from server_clock import ServerClock
+from socket_wrapper import (
+    pack_frame, FrameDecoder, pack_datagram, unpack_datagram,
+    MESSAGE_PACKET, MESSAGE_USERNAME, MESSAGE_CLIENT_ID, MESSAGE_INPUT, MESSAGE_ACK, MESSAGE_UDP_HELLO, MESSAGE_PING, MESSAGE_PONG, INPUT_RECORD
+)
 
 # this prevents a circular import
 # I NEED TYPE HINTS!!!!!!!!!!!!!!!!!!!!!!
@@ -46,6 +56,14 @@ class GameManager:
     """ 0 is stay, 1 is game ended, 2 is leave game (back to main menu) """
     leaderboard_data = None
     """ Set once game-end event is received. """
+    standings: list = []
+    """
+    Every entity's position along the track, leader first, from the server's periodic `standings` event.
+    The server only sends us full physics data for cars near ours, so this is how we know about the rest.
+    ```typescript
+    [slot: number, pos_x: number][]
+    ```
+    """
     
     # these will be set when we join/create a room
     room_id = None
@@ -355,6 +373,7 @@ class RenderingManager:
         {
           username: string,
           color: string,
+          slot: number,
           physics: {
             pos: [pos_x: number, pos_y: number],
             vel: number,
@@ -374,6 +393,14 @@ class RenderingManager:
         self.road_animator = RoadAnimator(self.world.gamemap)
         self.last_render_time = time_ns()
         
+        self.slot_to_username: Dict[int, str] = {}
+        """ Maps snapshot slot ids to usernames (binary snapshots don't carry usernames) """
+        
+        self.predictor = Predictor()
+        """ Reconciles our own car with the server's state (see `./prediction.py`) """
+        self.remote_buffers: Dict[str, SnapshotBuffer] = {}
+        """ Recent server states of every other car, by username (see `./interpolation.py`) """
+        
         for entity in init_entities:
             self.place_entity(entity)
 
@@ -407,9 +434,22 @@ class RenderingManager:
         Updates the internal physics engine by one tick
         
         This depends on the FPS of the client-side game. 24/s at the time of writing
+        
+        Our car is simulated (and corrected by `predictor`). Other cars are drawn `INTERPOLATION_DELAY` seconds
+        in the past, interpolated between the server's snapshots of them.
         """
         
-        self.world.update()
+        render_time = time_ns()/1e9 - INTERPOLATION_DELAY
+        
+        for username, entity in list(self.world.entities.items()):
+            buffer = self.remote_buffers.get(username)
+            
+            # our car, or one we have no snapshots of yet
+            if buffer is None or not buffer.sample_into(entity, render_time):
+                entity.update()
+        
+        if GameManager.our_username in self.world.entities:
+            self.predictor.smooth(GameManager.get_our_entity())
     
     def place_entity(self, entity_data: dict) -> bool:
         """
@@ -418,6 +458,7 @@ class RenderingManager:
         {
             username: string,
             color: string,
+            slot: number,
             physics: {
               pos: [pos_x: number, pos_y: number],
               vel: [vel_x: number, vel_y: number],
@@ -437,6 +478,8 @@ class RenderingManager:
         if entity_data['username'] in self.world.entities:
             return False
         
+        self.slot_to_username[entity_data['slot']] = entity_data['username']
+        
         self.world.create_entity(
             entity_data['username'],
             entity_data['color'],
@@ -446,38 +489,33 @@ class RenderingManager:
         # update world
         self.tick_world()
      
-    def set_physics(self, data: list):
+    def set_physics(self, data: list, server_time: float):
         """
         Updates the internal physics engine with the data the server sends us.
         
-        This depends on the broadcast frequency of the server. 1/s at the time of writing
+        This depends on the broadcast frequency of the server. 4/s at the time of writing
         
-        `data` should have the same schema as the `World.get_world_data` function, which looks like this:
-        ```typescript
-        [
-          {
-            username: string,
-            color: string,
-            physics: {
-              pos: [pos_x: number, pos_y: number],
-              vel: number,
-              acc: number,
-              angle: number, // in degrees
-              hitbox_radius: number,
-              keys: [forward: bool, backward: bool, left: bool, right: bool],
-          is_crashed: bool
-            }
-          },
-          ...
-        ]
-        ```
+        `data` should be a decoded binary snapshot (see `SocketManager.on_packet`), a list of `(slot, physics)`
+        where `physics` has the same format as `Entity.get_physics_data` (without `hitbox_radius`).
+        `server_time` is when the server captured it, converted to our clock (see `SocketManager.clock`).
         
-        (each one of those objects is an entity)
+        (each one of those pairs is an entity)
+        
+        Other entities are buffered and drawn a bit later (see `tick_world`). Our own is reconciled instead,
+        keeping the inputs the server hasn't seen yet.
         """
         
         # for each object in that list, update the corresponding entity.
-        for entity_data in data:
-            self.world.entities[entity_data['username']].set_physics(entity_data['physics'])
+        for slot, physics in data:
+            username = self.slot_to_username.get(slot)
+            if username is None: continue # not in our world (e.g. left before the game started)
+            
+            if username == GameManager.our_username:
+                self.predictor.reconcile(self.world.entities[username], physics, server_time)
+            else:
+                if username not in self.remote_buffers:
+                    self.remote_buffers[username] = SnapshotBuffer(self.world.gamemap)
+                self.remote_buffers[username].push(server_time, physics)
         
     def draw_all_other_entities(self, us: 'Entity'):
         sorted_by_dist = sorted(GameManager.get_all_other_entities(), key=lambda e: (e.pos[0] - us.pos[0])**2)
@@ -651,13 +689,36 @@ class SocketManager:
         """
     
         self._listen_stopped = True
+        self._moving = False
+        """ Set while we move to another server (see `move_to`) """
+        self._handshake_leftover = []
+        self.snapshot_decoder = SnapshotDecoder()
+        """ Rebuilds physics snapshots from the server's deltas. Reset when a game starts. """
+        self._packet_lock = threading.Lock()
+        """ Snapshots can arrive on the TCP and UDP listener threads """
+        self._send_lock = threading.Lock()
+        """ Frames are sent from the main, listener and clock sync threads - each must be written whole """
+        self.clock = ServerClock()
+        """ Converts the server's timestamps to our clock (see `./server_clock.py`) """
+        
+        self.udp_socket: socket.socket = None
+        """ Only set once the UDP channel is negotiated (see `open_udp`) """
+        self.udp_seq_in = 0
+        self.udp_seq_out = 0
+        self.key_state = 0
+        """ Bitmask of the keys we currently hold (bit 0 = forward, ..., bit 3 = right) """
+        self.sent_key_state = 0
+        """ The key state the server has (as far as we know) """
+        self.input_seq = 0
+        self.last_input: bytes = None
+        """ Our latest `MESSAGE_INPUT` payload. Resent over UDP with every ack, in case it was lost. """
         self.registered_events = {}
         #: Dict[str, Callable[[Dict], Any]]
         """ Should be a dict mapping event names to callback functions. """
         
         return
     
-    def connect(self, username: str):
+    def connect(self, username: str, host: str = SOCKET_HOST, port: int = SOCKET_PORT, udp_port: int = UDP_PORT):
         #-> Union[str, None]
         """
         Creates a socket connection with the server. **Because this contains `socket.recv` calls, it WILL BLOCK THE MAIN THREAD.**
@@ -665,25 +726,169 @@ class SocketManager:
         Returns None if connection failed, else returns the client id.
         
         This function also begins the listening thread.
+        
+        `host`, `port` and `udp_port` (`None` for no UDP) are only given when a server sends us to another one (see `move_to`).
         """
         try:
+            self.username = username
+            self.host, self.udp_port = host, udp_port
+            
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((SOCKET_HOST, SOCKET_PORT))
+            self.socket.connect((host, port))
             
-            # IMPORTANT: see server/server.py: we need to send the server a username immediately
-            self.socket.send(username.encode('utf-8'))
+            # IMPORTANT: see server/reactor.py: we need to send the server a username frame immediately
+            self.socket.sendall(pack_frame(MESSAGE_USERNAME, username.encode('utf-8')))
             
             # Receive client id - special event that is sent on connection
-            res = self.socket.recv(1024)
-            self.client_id = res.decode('utf-8')
+            # (any frames after it stay buffered in the decoder for the listener)
+            self.decoder = FrameDecoder()
+            frames = []
+            while not frames:
+                data = self.socket.recv(65536)
+                if not data: raise ConnectionResetError("Server closed the connection during the handshake")
+                frames = self.decoder.feed(data)
+            
+            msg_type, payload = frames.pop(0)
+            if msg_type != MESSAGE_CLIENT_ID: raise ConnectionError(f"Expected a client id, got message type {msg_type}")
+            self.client_id = payload.decode('utf-8')
+            self._handshake_leftover = frames
+            
+            if USE_UDP and udp_port is not None: self.open_udp()
             
             self.listen() # now we begin listening for the general format
+            threading.Thread(target=self.sync_clock, daemon=True).start()
             
             return self.client_id
         except Exception as e:
             print(f"\x1b[31mError connecting to server: {e}\x1b[0m")
             return None
+    
+    def move_to(self, endpoint: dict):
+        #-> Union[str, None]
+        """
+        Disconnects, and connects to another server instead (when several servers run together and one sends us
+        to another, see `HTTPManager.follow_redirect`), with the same username. Registered events are kept.
+        
+        `endpoint` is the other server, as sent by the server: `{host, port, udp_port, http_url}`.
+        Blocks like `connect`, and returns the new client id (or None if connecting failed).
+        """
+        
+        print(f"\x1b[36mMoving to server {endpoint['host']}:{endpoint['port']}\x1b[0m")
+        
+        old_socket, old_udp_socket = self.socket, self.udp_socket
+        self.udp_socket = None
+        self._moving = True
+        
+        # the listener threads of the old connection notice it closing, and stop quietly (see `listen`)
+        old_socket.shutdown(socket.SHUT_RDWR)
+        old_socket.close()
+        if old_udp_socket is not None: old_udp_socket.close()
+        
+        self.snapshot_decoder = SnapshotDecoder()
+        self.clock = ServerClock()
+        self.udp_seq_in = self.udp_seq_out = 0
+        try:
+            return self.connect(self.username, endpoint["host"], endpoint["port"], endpoint["udp_port"])
+        finally:
+            self._moving = False
 
+    def open_udp(self) -> bool:
+        """
+        Tries to negotiate the UDP channel (see `MESSAGE_UDP_HELLO` in `./socket_wrapper.py`), which the server
+        then uses for physics snapshots, and we use for acks and key state. Blocks for up to
+        `UDP_HELLO_ATTEMPTS * UDP_HELLO_TIMEOUT` seconds.
+        
+        Returns `True` if the channel is up. Otherwise everything keeps going over TCP.
+        """
+        
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp_socket.connect((self.host, self.udp_port))
+        udp_socket.settimeout(UDP_HELLO_TIMEOUT)
+        
+        for _ in range(UDP_HELLO_ATTEMPTS):
+            try:
+                if random() >= UDP_SIMULATED_LOSS:
+                    udp_socket.send(pack_datagram(MESSAGE_UDP_HELLO, 0, self.client_id.encode('utf-8')))
+                
+                msg_type, seq, _ = unpack_datagram(udp_socket.recv(65536))
+            except (socket.timeout, ConnectionRefusedError, ValueError):
+                continue
+            
+            if msg_type != MESSAGE_UDP_HELLO: continue
+            
+            self.udp_seq_in = seq
+            self.udp_socket = udp_socket
+            udp_socket.settimeout(None)
+            
+            # tell the server it can start sending us snapshots over UDP
+            self.send_frame(MESSAGE_UDP_HELLO, b"")
+            print("\x1b[36mUDP channel open\x1b[0m")
+            
+            threading.Thread(target=self.listen_udp, daemon=True).start()
+            return True
+        
+        print("\x1b[33mNo UDP reply from server, using TCP only\x1b[0m")
+        udp_socket.close()
+        return False
+    
+    def listen_udp(self) -> None:
+        """
+        Receives datagrams until the UDP socket is closed. Datagrams that arrive after a newer one
+        (or twice) are dropped - a newer snapshot already replaced them.
+        """
+        
+        udp_socket = self.udp_socket # this connection's, even if we move to another server (see `move_to`)
+        while True:
+            try:
+                data = udp_socket.recv(65536)
+            except ConnectionRefusedError:
+                continue
+            except OSError:
+                return
+            
+            if random() < UDP_SIMULATED_LOSS: continue
+            
+            try:
+                msg_type, seq, payload = unpack_datagram(data)
+            except ValueError:
+                continue
+            
+            if seq <= self.udp_seq_in: continue
+            self.udp_seq_in = seq
+            
+            if msg_type == MESSAGE_PACKET:
+                self.handle_frame(msg_type, payload)
+    
+    def send_frame(self, msg_type: int, payload: bytes) -> None:
+        with self._send_lock:
+            self.socket.sendall(pack_frame(msg_type, payload))
+    
+    def send_datagram(self, msg_type: int, payload: bytes) -> None:
+        self.udp_seq_out += 1
+        if random() < UDP_SIMULATED_LOSS: return
+        
+        try:
+            self.udp_socket.send(pack_datagram(msg_type, self.udp_seq_out, payload))
+        except OSError:
+            pass # as good as lost
+    
+    def sync_clock(self) -> None:
+        """
+        Pings the server (see `./server_clock.py`) until the connection closes: `CLOCK_SYNC_BURST` times in quick
+        succession, then every `CLOCK_SYNC_INTERVAL` seconds. Runs on its own thread, started by `connect`.
+        """
+        
+        pings = 0
+        sock = self.socket
+        while sock is self.socket: # until we move to another server (see `move_to`)
+            try:
+                self.send_frame(MESSAGE_PING, self.clock.make_ping())
+            except OSError:
+                return
+            
+            pings += 1
+            sleep(CLOCK_SYNC_BURST_INTERVAL if pings < CLOCK_SYNC_BURST else CLOCK_SYNC_INTERVAL)
+    
     def listen(self) -> None:
         """
         Starts a thread that purely listens for messages from the server.
@@ -698,37 +903,29 @@ class SocketManager:
         
         self._listen_stopped = False
         
+        # this connection's, even if we move to another server (see `move_to`)
+        sock, decoder = self.socket, self.decoder
+        
         def listen_inner():
             try:
+                # frames that arrived together with our client id
+                for msg_type, payload in self._handshake_leftover:
+                    self.handle_frame(msg_type, payload)
+                self._handshake_leftover = []
+                
                 while True:
                     
                     if self._listen_stopped: break
 
-                    raw_data = self.socket.recv(1024)
-                    
-                    try:
-                        payload = json.loads(raw_data[1:].decode('utf-8'))
-                    except json.decoder.JSONDecodeError as e:
-                        print(f"\x1b[31mError decoding JSON (skipping): {e}\x1b[0m")
-                        continue
-                    
-                    # prefixing: first byte will be a '0' for events, '1' for packet data
-                    if raw_data[0] == 1: 
-                        self.on_packet(payload)
-                        continue
-
-                    event_name = payload.get('type')
-                    data = payload.get('data')
-                    
-                    # data could be a list or dict, depending on the event (since its JSON)
+                    raw_data = sock.recv(65536)
+                    if not raw_data: raise ConnectionResetError("Server closed the connection")
                     
-                    _callable = self.registered_events.get(event_name)
-                    if not (_callable is None): 
-                        print(f"\x1b[35mHandling Event \x1b[33m{event_name}\x1b[0m")
-                        _callable(data)
-                    else:
-                        print(f"\x1b[2mIgnoring Unhandled event \x1b[0m\x1b[33m{event_name}\x1b[0m")
-            except (ConnectionAbortedError, ConnectionResetError) as e:
+                    # one read can hold any number of frames (or only part of one)
+                    for msg_type, payload in decoder.feed(raw_data):
+                        self.handle_frame(msg_type, payload)
+            except (ConnectionAbortedError, ConnectionResetError, ValueError, OSError) as e:
+                if self._moving or sock is not self.socket: return # we closed it to move to another server
+                
                 print(f"\x1b[31mConnection to server disrupted!\x1b[0m")
                 
                 # show a popup using tkinter
@@ -739,37 +936,87 @@ class SocketManager:
         self.listen_thread = threading.Thread(target=listen_inner)
         self.listen_thread.start()
     
+    def handle_frame(self, msg_type: int, payload: bytes) -> None:
+        """
+        Handles one complete frame from the server: either physics data or an event.
+        """
+        
+        if msg_type == MESSAGE_PACKET: 
+            with self._packet_lock:
+                try:
+                    seq, server_time, world_data = self.snapshot_decoder.decode(payload)
+                except ValueError as e:
+                    print(f"\x1b[31mError decoding snapshot (skipping): {e}\x1b[0m")
+                    return
+                
+                # let the server know it can send deltas against this snapshot
+                if self.udp_socket is None:
+                    self.send_frame(MESSAGE_ACK, struct.pack("!I", seq))
+                else:
+                    self.send_datagram(MESSAGE_ACK, struct.pack("!I", seq))
+                    
+                    # same seq, so the server ignores it unless the original was lost
+                    if self.last_input is not None: self.send_datagram(MESSAGE_INPUT, self.last_input)
+                
+                self.on_packet(world_data, self.clock.to_local(server_time))
+            return
+        
+        if msg_type == MESSAGE_PONG:
+            self.clock.handle_pong(payload)
+            return
+        
+        try:
+            payload = json.loads(payload.decode('utf-8'))
+        except json.decoder.JSONDecodeError as e:
+            print(f"\x1b[31mError decoding JSON (skipping): {e}\x1b[0m")
+            return
+
+        event_name = payload.get('type')
+        data = payload.get('data')
+        
+        # data could be a list or dict, depending on the event (since its JSON)
+        
+        _callable = self.registered_events.get(event_name)
+        if not (_callable is None): 
+            print(f"\x1b[35mHandling Event \x1b[33m{event_name}\x1b[0m")
+            _callable(data)
+        else:
+            print(f"\x1b[2mIgnoring Unhandled event \x1b[0m\x1b[33m{event_name}\x1b[0m")
+    
     def stop_listening(self) -> None:
         """
         Stops the listening thread. Registered events stay, but won't be called until `listen()` is called again.
         """
         self._listen_stopped = True
     
-    def on_packet(self, world_data: list) -> None:
+    def on_packet(self, world_data: list, server_time: float) -> None:
         """       
         Handles a received physics packet from the server.
         
-        The data should tell us the physics of every entity in the world. It has the following schema:
+        The data should tell us the physics of every entity in the world. 
+        It is a decoded binary snapshot (see `./snapshot.py`), a list of `(slot, physics)`:
         ```typescript
         [
-          {
-            username: string,f
-            color: string,
-            physics: {
+          [
+            slot: number, // see RenderingManager.slot_to_username
+            {
               pos: [number, number],
-              vel: [number, number],
-              acc: [number, number],
+              vel: number,
+              acc: number,
               angle: number,
-              hitbox_radius: number,
-              keys: [bool, bool, bool, bool]
+              keys: [bool, bool, bool, bool],
+              is_crashed: bool,
+              input_seq: number // the latest of that player's inputs the server has applied
             }
-          },
+          ],
           ...
         ]
         ```
+        
+        `server_time` is when the server captured the snapshot, converted to our clock.
         """
         
-        GameManager.game_renderer.set_physics(world_data)
+        GameManager.game_renderer.set_physics(world_data, server_time)
                 
     def on(self, event_name, callback) -> None:
         """
@@ -793,46 +1040,59 @@ class SocketManager:
         - W, A, S, D
         - Up, Down, Left, Right arrows
         
-        On keyDown or keyUp event, prepares a packet to upload to server
-        
-        ### Packet encoding table:
-        
-        #### Leftmost bit: 1=keydown, 0=keyup
-        
-        #### Bits 2 and 3: 00=forward, 01=backward, 10=left, 11=right
-        
-        - `000` - forward keyup
-        - `001` - backward keyup
-        - `010` - left keyup
-        - `011` - right keyup
-        - `100` - forward keydown
-        - `101` - backward keydown
-        - `110` - left keydown
-        - `111` - right keydown
+        On keyDown or keyUp event, updates `key_state`. Nothing is sent here: `send_input` sends
+        the resulting state once per frame, so pressing several keys at once costs one message.
         """
         
-        # if timestamp < GameManager.crash_end_timestamp, ignore all keys
-        if time_ns()/1e9 < GameManager.crash_end_timestamp:
-            return
-        
         if event.type == pygame.KEYDOWN or event.type == pygame.KEYUP:
             keyid = id_map.get(event.key)
             if keyid is None: return
             
+            keydown = event.type == pygame.KEYDOWN
+            if keydown: self.key_state |= 1 << keyid
+            else: self.key_state &= ~(1 << keyid)
+            
+            # if timestamp < GameManager.crash_end_timestamp, our keys have no effect
+            if time_ns()/1e9 < GameManager.crash_end_timestamp:
+                return
+            
             # Also update our physics on the client side, so that its more smooth
             us = GameManager.get_our_entity()
-            us.key_presses[keyid] = event.type == pygame.KEYDOWN
-            
-            keydown = event.type == pygame.KEYDOWN
-            self.send_packet(keyid, keydown)
+            us.key_presses[keyid] = keydown
 
-    def send_packet(self, keyid: int, keydown: bool) -> None:
+    def send_input(self) -> None:
         """
-        Creates and sends a keyinfo packet to the server.
-        Each packet should have a payload size of 3 bits.
+        Sends our key state to the server as a `MESSAGE_INPUT` (see `INPUT_RECORD` in `./socket_wrapper.py`),
+        if it changed since the last one we sent. Call once per frame, after handling events.
+        
+        Nothing is sent while we are crashed (the server ignores our keys then anyway).
         """
-        keydata = keyid | (keydown << 2)
-        self.socket.send(keydata.to_bytes(1, 'big'))
+        
+        if self.key_state == self.sent_key_state: return
+        if time_ns()/1e9 < GameManager.crash_end_timestamp: return
+        
+        self.sent_key_state = self.key_state
+        self.input_seq += 1
+        sent_at = time_ns()/1e9
+        self.last_input = INPUT_RECORD.pack(self.input_seq, sent_at, self.key_state)
+        
+        # remember it, to replay it on top of server states that don't include it yet (see `./prediction.py`)
+        if GameManager.game_renderer is not None:
+            GameManager.game_renderer.predictor.record_input(self.input_seq, sent_at, self.key_state)
+        
+        if self.udp_socket is not None:
+            self.send_datagram(MESSAGE_INPUT, self.last_input)
+        else:
+            self.send_frame(MESSAGE_INPUT, self.last_input)
+    
+    def reset_input(self) -> None:
+        """
+        Forgets our key state (all keys up), like the server does at the start of a game and after crashes.
+        """
+        
+        self.key_state = 0
+        self.sent_key_state = 0
+        self.last_input = None
     
 class HTTPManager:
     """
@@ -844,6 +1104,30 @@ class HTTPManager:
     
     def __init__(self, client_id: str) -> None:
         self.client_id = client_id
+        self.http_url = HTTP_URL
+        """ The server we are connected to. Only changes if we are sent to another one (see `follow_redirect`). """
+    
+    def follow_redirect(self, res: dict, endpoint: str) -> dict:
+        """
+        When several servers run together, a server replies to `createroom`/`joinroom` with another server's `endpoint`
+        if the room is (or should be) there. Then we move our socket to that server (see `SocketManager.move_to`),
+        and make the request again there, with our new client id. `endpoint` is the request, with `{client_id}` in it.
+        
+        Returns the response to use: the new one, or `res` if it wasn't a redirect.
+        """
+        
+        if res.get("success") or not res.get("endpoint"):
+            return res
+        
+        client_id = GameManager.socket_man.move_to(res["endpoint"])
+        if not client_id:
+            return {"success": False, "message": "Could not connect to the server that has this room. Please try again later."}
+        
+        self.client_id = client_id
+        self.http_url = res["endpoint"]["http_url"]
+        
+        # only once - servers never send us back
+        return HTTPManager.api_call(endpoint.format(client_id=self.client_id), http_url=self.http_url)
     
     def create_room(self) -> dict:
         """
@@ -859,7 +1143,8 @@ class HTTPManager:
         }
         ```
         """
-        room_data = HTTPManager.api_call(f"/createroom/{self.client_id}")
+        room_data = HTTPManager.api_call(f"/createroom/{self.client_id}", http_url=self.http_url)
+        room_data = self.follow_redirect(room_data, "/createroom/{client_id}")
         print(f"Create room response: {room_data}")
         return room_data
 
@@ -880,7 +1165,8 @@ class HTTPManager:
         if not room_id.isalnum():
             return {"success": False, "message": "Room code must be alphanumeric."}
         
-        res = HTTPManager.api_call(f"/joinroom/{self.client_id}/{room_id}")
+        res = HTTPManager.api_call(f"/joinroom/{self.client_id}/{room_id}", http_url=self.http_url)
+        res = self.follow_redirect(res, "/joinroom/{client_id}/" + room_id)
         print(f"Join room response: {res}")
         return res
 
@@ -898,7 +1184,7 @@ class HTTPManager:
         }
         ```
         """
-        res = HTTPManager.api_call(f"/startgame/{self.client_id}/{room_id}")
+        res = HTTPManager.api_call(f"/startgame/{self.client_id}/{room_id}", http_url=self.http_url)
         print(f"Start game response: {res}")
         return res
     
@@ -914,17 +1200,18 @@ class HTTPManager:
         }
         ```
         """
-        res = HTTPManager.api_call(f"/leaveroom/{self.client_id}")
+        res = HTTPManager.api_call(f"/leaveroom/{self.client_id}", http_url=self.http_url)
         print(f"Leave room response: {res}")
         return res
     
     @staticmethod
-    def api_call(endpoint: str, query_params: dict = None) -> dict:
+    def api_call(endpoint: str, query_params: dict = None, http_url: str = HTTP_URL) -> dict:
         """
         (internal) Makes a GET request to the server.
         
         @param endpoint: the endpoint to call, e.g. `createroom` (no leading slash)
         @param query_params: a `dict` of query parameters to pass to the endpoint.
+        @param http_url: the server to call (see `follow_redirect`)
         
         @returns: a JSON/`dict` containing the response data
         """
@@ -933,7 +1220,7 @@ class HTTPManager:
         if query_params:
             query_params_string = "?" + "&".join([f"{key}={val}" for key, val in query_params.items()])
         try:
-            res = httpx.get(f"{HTTP_URL}/{endpoint}{query_params_string}")
+            res = httpx.get(f"{http_url}/{endpoint}{query_params_string}")
             return res.json()
         except Exception as e:
             print(f"\x1b[31mError making API call: {e}\x1b[0m")
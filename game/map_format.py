@@ -0,0 +1,180 @@
+"""
+The compiled map format: one binary file per map (`.pmap`), written by the map compiler (`server/map_compiler.py`)
+after validating the map, and loaded by the server and the client.
+
+Loading a compiled map reads nothing up front: the file is memory-mapped, and the segment table and the compiled tracks
+(see `./track.py`) are used straight from it, as read-only `memoryview`s - no parsing, and no copying, however long the track.
+Only the pages that lookups actually touch are loaded, so on a long track, only the geometry around the cars is in memory.
+
+### Layout (little-endian, every section starts at a multiple of 8 bytes):
+| section | contents |
+| --- | --- |
+| header | `HEADER` |
+| metadata | the map's `MAPS` entry, as UTF-8 JSON |
+| segments | `int32` x 4 per segment: `start_x, mid_x, end_x, theta_f` |
+| angle track | `float64` knots x, `float64` knots y, `int32` bucket table (see `CompiledTrack`) |
+| vanishing point track | same as the angle track |
+
+### This file must be identical on the server and client side (`server/map_format.py` and `game/map_format.py`)
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Any, Callable, Sequence, Tuple
+
+from track import CompiledTrack
+
+MAGIC = b"PPMAP\0\0\0"
+VERSION = 2
+
+HEADER = struct.Struct("<8sIIIIIIIdd")
+"""
+`magic, version, metadata bytes, segment count, angle knots, angle buckets, vanishing knots, vanishing buckets,
+angle resolution, vanishing resolution` (each track's buckets are as wide as it needs, see `CompiledTrack`)
+"""
+
+COMPILED_EXTENSION = ".pmap"
+
+def compiled_file_for(map_file: str) -> str:
+    """
+    The compiled file name for a `.map` file (`Curvy.map` -> `Curvy.pmap`).
+    """
+    return os.path.splitext(map_file)[0] + COMPILED_EXTENSION
+
+def _padded(size: int) -> int:
+    """ `size` rounded up to a multiple of 8 """
+    return size + (-size % 8)
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\0" * (_padded(len(data)) - len(data))
+
+def write_compiled_map(
+    path: str, map_data: dict, segments: Sequence[Tuple[int, int, int, int]],
+    angle_track: CompiledTrack, vanishing_track: CompiledTrack
+    ) -> int:
+    """
+    Writes a compiled map file (to a temporary file first, then moved into place, so a server that has the old
+    version mapped keeps it). `segments` are `(start_x, mid_x, end_x, theta_f)`, already validated.
+
+    Returns the size of the file in bytes.
+    """
+
+    metadata = json.dumps(map_data).encode()
+    sections = [
+        HEADER.pack(
+            MAGIC, VERSION, len(metadata), len(segments),
+            len(angle_track.knots_x), len(angle_track.bucket_knots),
+            len(vanishing_track.knots_x), len(vanishing_track.bucket_knots),
+            angle_track.resolution, vanishing_track.resolution,
+        ),
+        metadata,
+        struct.pack(f"<{4*len(segments)}i", *[value for segment in segments for value in segment]),
+    ]
+
+    for track in (angle_track, vanishing_track):
+        sections.append(struct.pack(f"<{len(track.knots_x)}d", *track.knots_x))
+        sections.append(struct.pack(f"<{len(track.knots_y)}d", *track.knots_y))
+        sections.append(struct.pack(f"<{len(track.bucket_knots)}i", *track.bucket_knots))
+
+    data = b"".join(_pad(section) for section in sections)
+
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+    return len(data)
+
+class SegmentTable(Sequence):
+    """
+    The segments of a compiled map, read from its `int32` table when indexed.
+    `make(start_x, mid_x, end_x, theta_f)` builds each segment (`CurveSegment` on either side).
+    """
+
+    def __init__(self, table: memoryview, make: Callable[[int, int, int, int], Any]) -> None:
+        self.table = table
+        self.make = make
+        self.starts = table[0::4]
+        """ `start_x` of every segment (a strided view, for binary searches) """
+
+    def __len__(self) -> int:
+        return len(self.table) // 4
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError("segment index out of range")
+        return self.make(*self.table[4*i:4*i+4].tolist())
+
+class CompiledMapFile:
+    """
+    A memory-mapped compiled map file.
+
+    The `memoryview`s it hands out stay valid for as long as they (or this object) are referenced,
+    even if the file is replaced by a newer version in the meantime.
+
+    Raises `ValueError` if the file isn't a compiled map of this version.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # lookups only read the few pages around each car's position (see `TrackCursor`), so there's no point
+        # in the OS reading ahead - on a long track, most of the file is never needed at once
+        if hasattr(mmap, "MADV_RANDOM"):
+            self._mmap.madvise(mmap.MADV_RANDOM)
+
+        view = memoryview(self._mmap)
+        if len(view) < HEADER.size:
+            raise ValueError(f"{path} is too short to be a compiled map")
+
+        (
+            magic, version, metadata_size, segment_count,
+            angle_knots, angle_buckets, vanishing_knots, vanishing_buckets, angle_resolution, vanishing_resolution
+        ) = HEADER.unpack_from(view)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} compiled map")
+
+        self._view = view
+        self._offset = _padded(HEADER.size)
+
+        self.metadata: dict = json.loads(bytes(self._take(metadata_size, "B")))
+        """ The `MAPS` entry the map was compiled with """
+        self.segment_table = self._take(4 * segment_count, "i")
+
+        self.angle_track = CompiledTrack(
+            self._take(angle_knots, "d"), self._take(angle_knots, "d"), angle_resolution, self._take(angle_buckets, "i")
+        )
+        self.vanishing_track = CompiledTrack(
+            self._take(vanishing_knots, "d"), self._take(vanishing_knots, "d"), vanishing_resolution, self._take(vanishing_buckets, "i")
+        )
+
+        if self._offset != len(view):
+            raise ValueError(f"{path} has the wrong size for its header")
+
+    def _take(self, count: int, fmt: str) -> memoryview:
+        """
+        The next section: `count` items of `fmt` (a `struct` format character) as a read-only view.
+        """
+
+        size = count * struct.calcsize(fmt)
+        if self._offset + size > len(self._view):
+            raise ValueError("compiled map is truncated")
+
+        section = self._view[self._offset:self._offset + size]
+        self._offset += _padded(size)
+
+        if fmt == "B": return section
+        if sys.byteorder != "little":
+            # only little-endian machines can use the file as it is
+            return memoryview(struct.pack(f"={count}{fmt}", *struct.unpack(f"<{count}{fmt}", section))).cast(fmt)
+        return section.cast(fmt)
+
+    def segments(self, make: Callable[[int, int, int, int], Any]) -> SegmentTable:
+        return SegmentTable(self.segment_table, make)
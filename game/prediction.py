@@ -0,0 +1,94 @@
+from collections import deque
+from time import time_ns
+from typing import Deque, Tuple, TYPE_CHECKING
+
+from CONSTANTS import INPUT_HISTORY_LENGTH, RECONCILE_SMOOTHING, RECONCILE_SNAP_DISTANCE
+from snapshot import unpack_keys
+
+if TYPE_CHECKING:
+    from world.entity import Entity
+
+class Predictor:
+    """
+    Client-side prediction and server reconciliation for our own car.
+
+    Our car is simulated locally every frame with the keys we are holding (prediction), so it reacts immediately.
+    The server's state of our car is always a bit old: it was captured at `server time`, and only includes
+    the inputs up to the `input_seq` it reports. Overwriting our car with it would undo every input since
+    (the car visibly snaps back). Instead, `reconcile`:
+
+    1. Drops every input the server has already applied from the input history
+    2. Rewinds our car to the server's state
+    3. Replays the remaining (unacknowledged) inputs on top of it, each from the time it was sent,
+       with the same fixed-step physics as every other frame and the server (`Entity.advance`, see `./physics.py`)
+    4. Blends the difference between where we were drawn and where we should be over the next few frames
+       (see `smooth`), unless it is bigger than `RECONCILE_SNAP_DISTANCE`
+
+    ### Input history entries:
+    `(input seq, time sent: seconds, key bitmask)` - a ring buffer of the last `INPUT_HISTORY_LENGTH` inputs.
+    """
+
+    def __init__(self) -> None:
+        self.inputs: Deque[Tuple[int, float, int]] = deque(maxlen=INPUT_HISTORY_LENGTH)
+
+        self.correction = [0.0, 0.0]
+        """ Position error still to be blended away, `[x, y]` (drawn position - corrected position). Drawn as the car's `render_offset`. """
+
+    def record_input(self, seq: int, sent_at: float, keys: int) -> None:
+        """
+        Adds an input we just sent to the history.
+        """
+        self.inputs.append((seq, sent_at, keys))
+
+    def reconcile(self, entity: 'Entity', physics: dict, server_time: float) -> None:
+        """
+        Corrects our car (`entity`) with its `physics` from a server snapshot captured at `server_time`.
+        """
+
+        now = time_ns()/1e9
+
+        while self.inputs and self.inputs[0][0] <= physics["input_seq"]:
+            self.inputs.popleft()
+
+        drawn_pos = entity.pos.copy()
+        entity.set_physics(physics)
+
+        # while crashed, the server ignores our inputs and doesn't move us - nothing to replay
+        if entity.crash_end_timestamp > now or physics["is_crashed"]:
+            self.correction = [0.0, 0.0]
+            return
+
+        t = min(server_time, now)
+        for _, sent_at, keys in self.inputs:
+            if sent_at > t:
+                entity.advance(sent_at - t)
+                t = sent_at
+
+            entity.key_presses = unpack_keys(keys)
+
+        entity.advance(now - t)
+        entity.last_update_timestamp = time_ns()
+
+        error = [drawn_pos[0] - entity.pos[0], drawn_pos[1] - entity.pos[1]]
+        if (error[0]**2 + error[1]**2)**0.5 > RECONCILE_SNAP_DISTANCE:
+            self.correction = [0.0, 0.0] # too far off to hide, just snap
+            return
+
+        # start drawing from where we were, and move towards the corrected position over the next frames
+        entity.set_render_offset(error)
+        self.correction = error
+
+    def smooth(self, entity: 'Entity') -> None:
+        """
+        Removes part of the remaining correction from our car's position. Call once per frame.
+        """
+
+        if self.correction == [0.0, 0.0]: return
+
+        keep = 1 - RECONCILE_SMOOTHING
+        self.correction = [self.correction[0] * keep, self.correction[1] * keep]
+
+        if abs(self.correction[0]) + abs(self.correction[1]) < 1e-3:
+            self.correction = [0.0, 0.0]
+
+        entity.set_render_offset(self.correction)
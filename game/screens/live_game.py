@@ -36,15 +36,22 @@ def live_game() -> bool:
     def _crash(crash_data):
         # set our new physics
         GameManager.last_y_pos = us.pos[1] # save this for the crash animation
-        GameManager.crash_end_timestamp = crash_data['crash_end_timestamp']
-        us.crash_end_timestamp = crash_data['crash_end_timestamp']
+        GameManager.crash_end_timestamp = GameManager.socket_man.clock.to_local(crash_data['crash_end_timestamp'])
+        us.crash_end_timestamp = GameManager.crash_end_timestamp
         us.set_physics(crash_data['new_physics'])
         crash_sound.play()
         
+        # the server released all our keys. once the crash is over, send whatever we're holding again
+        GameManager.socket_man.sent_key_state = 0
+        
+    def _standings(standings):
+        GameManager.standings = standings
+        
     # create new event handler
     GameManager.socket_man.on('leave', _leave)
     GameManager.socket_man.on('game-end', _proceed)
     GameManager.socket_man.on('crash', _crash)
+    GameManager.socket_man.on('standings', _standings)
     
     while True:
 
@@ -60,11 +67,21 @@ def live_game() -> bool:
                 
             GameManager.socket_man.handle_game_keypresses(event)
         
+        # at most one input message per frame, and only if our keys changed
+        GameManager.socket_man.send_input()
+        
         # Speed text
         velocity_mph = ms_to_mph(us.vel)
         speedometer_text = FONT_LARGE.render(f"{velocity_mph:.1f} mph", True, (255, 255, 255))
         GameManager.screen.blit(speedometer_text, (20, 20))
         
+        # race position, from the latest standings (see `GameManager.standings`)
+        our_slot = next((slot for slot, username in GameManager.game_renderer.slot_to_username.items() if username == GameManager.our_username), None)
+        place = next((i+1 for i, (slot, _) in enumerate(GameManager.standings) if slot == our_slot), None)
+        if place is not None:
+            place_text = FONT_LARGE.render(f"P{place}/{len(GameManager.standings)}", True, (255, 255, 255))
+            GameManager.screen.blit(place_text, (20, 70))
+        
         # make the rev sound louder as we go faster
         rev_sound.set_volume(0.6+0.002*us.vel) # 60% at 0mph, 100% at 200mph, linear
         
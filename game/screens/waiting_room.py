@@ -23,6 +23,7 @@ def waiting_room(is_leader = False, connected_players: list = []) -> bool:
     {
         "username": "their username",
         "color": "a car color",
+        "livery": 0, # tells apart players with the same color, in rooms with more than 8
         "is_host": True || False,
     }
     ```
@@ -89,12 +90,15 @@ def waiting_room(is_leader = False, connected_players: list = []) -> bool:
     #####################################
     # Register player leave/join events #
     #####################################
-    GameManager.socket_man.on('player-join', lambda data: main_panel.add_player(data['username'], data['color']))
+    GameManager.socket_man.on('player-join', lambda data: main_panel.add_player(data['username'], data['color'], livery=data.get('livery', 0)))
     GameManager.socket_man.on('player-leave', lambda data: main_panel.remove_player(data['username']))
     
     def _init_start(data): 
         print(f"Initializing Live Game: The consensus start timestamp is \x1b[33m{data['start_timestamp']}\x1b[0m")
-        GameManager.start_timestamp = data['start_timestamp']
+        GameManager.start_timestamp = GameManager.socket_man.clock.to_local(data['start_timestamp'])
+        GameManager.socket_man.snapshot_decoder.reset()
+        GameManager.socket_man.reset_input()
+        GameManager.standings = []
         
         # Create our RenderingManager (game is about to start)
         GameManager.game_renderer = RenderingManager(data['init_world_data'])
@@ -0,0 +1,78 @@
+import threading
+from collections import deque
+from time import time_ns
+from typing import Deque, Tuple
+
+from CONSTANTS import CLOCK_SAMPLE_COUNT
+from socket_wrapper import PING_RECORD, PONG_RECORD
+
+class ServerClock:
+    """
+    Estimates the difference between the server's clock and ours, so timestamps from the server
+    (the game start time, crash end times, snapshot capture times) can be compared with our own clock.
+    The two clocks can easily be seconds apart, which would otherwise start the game, or end crashes,
+    at a different moment for every player.
+
+    Uses the same exchange as NTP. We send a ping at `t0` (our clock), the server receives it at `t1`
+    and replies at `t2` (its clock), and we receive the reply at `t3` (our clock). Assuming the trip there
+    took as long as the trip back:
+    - round trip time = `(t3 - t0) - (t2 - t1)`
+    - offset (server clock - our clock) = `((t1 - t0) + (t2 - t3)) / 2`
+
+    The assumption is worst for samples that were queued somewhere along the way, and those have the longest
+    round trip times, so the offset is taken from the sample with the lowest round trip time among the last
+    `CLOCK_SAMPLE_COUNT` (like NTP's clock filter).
+
+    ### Samples:
+    `(round trip time, offset)`, in seconds.
+    """
+
+    def __init__(self) -> None:
+        self.samples: Deque[Tuple[float, float]] = deque(maxlen=CLOCK_SAMPLE_COUNT)
+
+        self.offset = 0.0
+        """ Server clock - our clock, in seconds (0 until the first pong) """
+        self.rtt: float = None
+        """ Round trip time of the latest sample, in seconds (`None` until the first pong) """
+
+        self._last_pong: Tuple[float, float] = None
+        """ `(server send time, our receive time)` of the latest pong, echoed in the next ping """
+        self._lock = threading.Lock()
+
+    def make_ping(self) -> bytes:
+        """
+        Returns the payload of a `MESSAGE_PING` to send now.
+        """
+
+        now = time_ns()/1e9
+
+        with self._lock:
+            if self._last_pong is None:
+                return PING_RECORD.pack(now, 0, 0)
+
+            server_sent, received = self._last_pong
+            return PING_RECORD.pack(now, server_sent, now - received)
+
+    def handle_pong(self, payload: bytes) -> None:
+        """
+        Adds a sample from a `MESSAGE_PONG` payload.
+        """
+
+        t3 = time_ns()/1e9
+        if len(payload) != PONG_RECORD.size: return
+        t0, t1, t2 = PONG_RECORD.unpack(payload)
+
+        rtt = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+
+        with self._lock:
+            self._last_pong = (t2, t3)
+            self.samples.append((max(rtt, 0), offset))
+            self.rtt = max(rtt, 0)
+            self.offset = min(self.samples)[1]
+
+    def to_local(self, server_timestamp: float) -> float:
+        """
+        Converts a timestamp from the server (seconds) to our clock.
+        """
+        return server_timestamp - self.offset
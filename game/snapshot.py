@@ -0,0 +1,112 @@
+import struct
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+SNAPSHOT_HEADER = struct.Struct("!IIdH")
+"""
+`[seq: uint32][baseline seq: uint32][server time: f64 seconds][number of entity records: uint16]`
+
+If `baseline seq` is 0 the snapshot is a keyframe, otherwise it only contains what changed since snapshot `baseline seq`.
+`server time` is when the server captured the snapshot.
+
+### This must be the same as on the server side (see `server/snapshot.py`)
+"""
+
+ENTITY_RECORD = struct.Struct("!B5fBBI")
+"""
+The full state of one entity (27 bytes):
+
+`[slot: uint8][pos_x: f32][pos_y: f32][vel: f32][acc: f32][angle: f32][keys: uint8 bitmask][is_crashed: uint8][input seq: uint32]`
+
+`input seq` is the latest of that entity's client's inputs the server has applied (see `./prediction.py`).
+
+### This must be the same as on the server side (see `server/snapshot.py`)
+"""
+
+FIELD_SLICES = [(1, 5), (5, 9), (9, 13), (13, 17), (17, 21), (21, 22), (22, 23), (23, 27)]
+""" Byte ranges of each field inside an `ENTITY_RECORD`. Bit `i` of a record's field mask says whether field `i` is present. """
+
+REMOVED = 0x00
+""" Field mask of an entity that was in the baseline but no longer exists. """
+
+SNAPSHOT_HISTORY_LENGTH = 64
+""" How many decoded snapshots to keep as possible baselines. Must be at least the server's `SNAPSHOT_HISTORY_LENGTH`. """
+
+def unpack_keys(bitmask: int) -> List[bool]:
+    """
+    Unpacks a key bitmask (bit 0 = forward, ..., bit 3 = right) into `[forward, backward, left, right]`.
+    """
+    return [bool(bitmask & (1 << i)) for i in range(4)]
+
+class SnapshotDecoder:
+    """
+    Rebuilds full snapshots from the server's keyframes and deltas (see `SnapshotEncoder` on the server side).
+    
+    Keeps the raw `ENTITY_RECORD` bytes of recent snapshots so deltas can be applied byte-for-byte
+    onto the baseline they were encoded against. Should be `reset()` when a new game starts.
+    """
+    
+    def __init__(self) -> None:
+        self.history: OrderedDict[int, Dict[int, bytes]] = OrderedDict()
+        """ seq -> {slot: ENTITY_RECORD bytes} """
+        
+    def reset(self) -> None:
+        self.history.clear()
+        
+    def decode(self, data: bytes) -> Tuple[int, float, List[Tuple[int, dict]]]:
+        """
+        Decodes a binary snapshot from the server into `(seq, server time, [(slot, physics), ...])`,
+        where `physics` has the same format as `Entity.get_physics_data`, minus `hitbox_radius` (it never changes),
+        plus `input_seq`.
+        
+        Only the entities this snapshot updated are returned. The server leaves out entities that are far from our car
+        (and unchanged ones from deltas), so the stored state of those may be old - it's only kept to apply later deltas to.
+        
+        Raises `ValueError` if the snapshot is a delta against a baseline we don't have.
+        """
+        
+        seq, baseline_seq, server_time, count = SNAPSHOT_HEADER.unpack_from(data, 0)
+        
+        if baseline_seq == 0:
+            records = {}
+        elif baseline_seq in self.history:
+            records = dict(self.history[baseline_seq])
+        else:
+            raise ValueError(f"Snapshot {seq} is a delta against unknown snapshot {baseline_seq}")
+        
+        updated = []
+        offset = SNAPSHOT_HEADER.size
+        for _ in range(count):
+            slot, mask = data[offset], data[offset+1]
+            offset += 2
+            
+            if mask == REMOVED:
+                records.pop(slot, None)
+                continue
+            
+            record = bytearray(records.get(slot, bytes(ENTITY_RECORD.size)))
+            record[0] = slot
+            for i, (start, end) in enumerate(FIELD_SLICES):
+                if mask & (1 << i):
+                    record[start:end] = data[offset:offset + end - start]
+                    offset += end - start
+            records[slot] = bytes(record)
+            updated.append(slot)
+        
+        self.history[seq] = records
+        while len(self.history) > SNAPSHOT_HISTORY_LENGTH:
+            self.history.popitem(last=False)
+        
+        entities = []
+        for slot, pos_x, pos_y, vel, acc, angle, keys, is_crashed, input_seq in (ENTITY_RECORD.unpack(records[slot]) for slot in updated):
+            entities.append((slot, {
+                "pos": [pos_x, pos_y],
+                "vel": vel,
+                "acc": acc,
+                "angle": angle,
+                "keys": unpack_keys(keys),
+                "is_crashed": bool(is_crashed),
+                "input_seq": input_seq,
+            }))
+        
+        return seq, server_time, entities
@@ -1,6 +1,8 @@
 from typing import List, TYPE_CHECKING
 from time import time_ns
-import math
+
+import physics
+from track import TrackCursor
 
 if TYPE_CHECKING:
     from game_map import GameMap
@@ -46,8 +48,20 @@ class Entity:
         self.angle = angle%360
         self.hitbox_radius = hitbox_radius
         
+        self.track_cursor = TrackCursor(gamemap.track)
+        """ Follows this car along the track, for the track angle lookups of its physics steps (see `track.py`) """
+        
         self.last_update_timestamp = time_ns()
         
+        # fixed-step simulation (see ../physics.py). pos, vel, acc and angle are what's drawn:
+        # the state at the latest whole tick, advanced by the time since (less than a tick), plus `render_offset`
+        self.tick_state: physics.State = (pos[0], pos[1], vel, acc, self.angle)
+        """ `(pos_x, pos_y, vel, acc, angle)` at the latest whole tick """
+        self.unsimulated = 0.0
+        """ Seconds since the latest whole tick (always less than `physics.DT`) """
+        self.render_offset = [0.0, 0.0]
+        """ Added to the drawn position, to blend out corrections from the server (see `Predictor.smooth`) """
+        
         self.is_crashed = is_crashed # used to render explosion animation for enemies
         
         self.crash_end_timestamp = 0 # only used for the us entity
@@ -60,23 +74,9 @@ class Entity:
         
     def update(self):
         """
-        Updates physics, including position, velocity, acceleration, and angle.
-        
-        If the track is curved at this entity's x-position, 
-        then position is updated with the entity's relative angle (`self.angle - track_angle`)
-        
-        For example, if the entity has an angle of -10 degrees (turned left), 
-        but the track is curved at 30 degrees (going right) at that x-pos,
-        then position is updated similar to as follows:
-        
-        ```python
-        x_position += velocity * cos(radians(-10-30)) * delta_time_s   
-        y_position += velocity * sin(radians(-10-30)) * delta_time_s
-        ```    
-        
-        which would result in them drifting to the left side of the track.
+        Advances physics by the time since the last update (see `advance`).
         
-        Should be run on every server tick (for now, 24tps) - see `../CONSTANTS.py`
+        Should be run every frame.
         """
         
         # if we are in a crash, don't update
@@ -89,45 +89,46 @@ class Entity:
             self.last_update_timestamp = time_ns()
             return
         
-        delta_time_s = (time_ns() - self.last_update_timestamp) / 1e9
-        
-        # update angle
-        turn_resistance_factor = -(0.01*self.vel-1)**2 + 1
-        self.angle += (self.key_presses[3] - self.key_presses[2]) * 50 * turn_resistance_factor * delta_time_s
-        self.angle %= 360
-        
-        # clamp angle to 270-360 and 0-90 only
-        if self.angle>=180 and self.angle<270:
-            self.angle = 270
-        elif self.angle<180 and self.angle>90:
-            self.angle = 90
-        
-        # if w is held down, set x acceleration to 10- sqrt vel <- ensures no acc at v=100m/s
-        # if s is held down, set x acceleration to -10, other handling ensures that velocity will stay between 0 and 100 m/s
-        # if neither or both, set x acceleration to - sqrt vel <- simulates drag and high air resistance at higher speeds
-        if self.key_presses[1] and not self.key_presses[0]:
-            self.acc = -10 
-        elif self.key_presses[0] and not self.key_presses[1]:
-            self.acc = 10 - math.sqrt(self.vel)
-        else:
-            self.acc = -math.sqrt(self.vel)
-
-        # update velocity with with methods to guarantee it's within the ranges of 0-100
-        self.vel = max(0, min(self.vel + self.acc * delta_time_s, 100))
-        
-        #adjusting angular accel value to slow turning at higher speeds
-        denominator = 0.4 * self.vel + 2.22 
-        #value that changes how much a person can turn based on speed 
-        angular_accel = 10/denominator + .5 
-        # update positions
-        #angle change now involves speed with mod 360 to reset angle 
-        relative_angle = (self.angle + angular_accel * delta_time_s - self.gamemap.angle_at(self.pos[0])) % 360
-        self.pos[0] += self.vel * math.cos(math.radians(relative_angle)) * delta_time_s
-        self.pos[1] += self.vel * math.sin(math.radians(relative_angle)) * delta_time_s
+        self.advance((time_ns() - self.last_update_timestamp) / 1e9)
         
         # update timestamp
         self.last_update_timestamp = time_ns()
     
+    def advance(self, duration: float) -> None:
+        """
+        Advances physics by `duration` seconds with the current `key_presses`, ignoring crashes and timestamps.
+        
+        The simulation itself only moves in whole ticks of `physics.DT` (exactly like the server's, see `../physics.py`).
+        Whatever is left over is carried to the next call, and only used to draw the car a bit further along,
+        so it moves smoothly at any frame rate.
+        
+        `update()` uses this with the time since the last update. Prediction uses it directly,
+        to replay our inputs on top of the server's state (see `../prediction.py`).
+        """
+        
+        self.unsimulated += duration
+        
+        pos_x, pos_y, vel, _, angle = self.tick_state
+        while self.unsimulated >= physics.DT:
+            pos_x, pos_y, vel, acc, angle = self.tick_state = physics.step(pos_x, pos_y, vel, angle, self.key_presses, self.track_cursor.value_at)
+            self.unsimulated -= physics.DT
+        
+        if self.unsimulated > 0:
+            pos_x, pos_y, vel, acc, angle = physics.step(pos_x, pos_y, vel, angle, self.key_presses, self.track_cursor.value_at, self.unsimulated)
+        else:
+            acc = self.tick_state[3]
+        
+        self.pos = [pos_x + self.render_offset[0], pos_y + self.render_offset[1]]
+        self.vel, self.acc, self.angle = vel, acc, angle
+    
+    def set_render_offset(self, offset: List[float]) -> None:
+        """
+        Moves the drawn position by the difference between `offset` and the current `render_offset`. The simulation is unaffected.
+        """
+        
+        self.pos = [self.pos[0] - self.render_offset[0] + offset[0], self.pos[1] - self.render_offset[1] + offset[1]]
+        self.render_offset = list(offset)
+    
     def get_physics_data(self) -> dict:
         """
         Return all physical data in a dict of the following format:
@@ -168,7 +169,8 @@ class Entity:
         """
         Set and override the current physics data. This should only be used with server data (or for testing)
         
-        `data` must be a dict in the same format as the one returned by `get_physics_data()`, which looks like this:
+        `data` must be a dict in the same format as the one returned by `get_physics_data()` 
+        (`hitbox_radius` is optional), which looks like this:
         
         ```typescript
         {
@@ -187,7 +189,12 @@ class Entity:
         self.vel = data["vel"]
         self.acc = data["acc"]
         self.angle = data["angle"]%360
-        self.hitbox_radius = data["hitbox_radius"]
+        self.hitbox_radius = data.get("hitbox_radius", self.hitbox_radius) # not included in binary snapshots
         self.key_presses = data["keys"]
         self.is_crashed = data["is_crashed"]
-        self.last_update_timestamp = time_ns()
\ No newline at end of file
+        self.last_update_timestamp = time_ns()
+        
+        # the server's state is always at a whole tick
+        self.tick_state = (self.pos[0], self.pos[1], self.vel, self.acc, self.angle)
+        self.unsimulated = 0.0
+        self.render_offset = [0.0, 0.0]
\ No newline at end of file
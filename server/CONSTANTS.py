@@ -1,7 +1,72 @@
 TICK_SPEED = 24
-TICKS_PER_BROADCAST = 6
+""" Physics ticks per second (see `./scheduler.py`). Must equal `TICK_RATE` in `./physics.py`, which every tick advances by `DT`. """
+VECTOR_PHYSICS = False
+""" Whether new worlds step their entities with the vectorized NumPy engine (see `./vector_physics.py`). Also set by `--vector-physics`. """
+MAX_CATCH_UP_TICKS = 5
+""" Most physics ticks run back to back when the server falls behind. Any more missed ticks are skipped. """
+LATE_TICK_TOLERANCE = 0.1
+""" Scheduled runs that start more than this fraction of their period after their deadline are counted as late. """
+JITTER_WINDOW = 256
+""" How many recent runs of each scheduled task the jitter statistics cover. """
+
+BROADCAST_RATE_MAX = 20
+""" Most physics broadcasts per second a room (or client) gets, when the server isn't busy (see `./broadcast_rate.py`). Also the rate rooms are checked for due broadcasts. """
+BROADCAST_RATE_MIN = 4
+""" Fewest physics broadcasts per second, however loaded the server or congested the client. """
+BROADCAST_RATE_STEP = 1
+""" How much (Hz) a client's broadcast rate grows with each snapshot it is sent without being congested. """
+LOAD_LOW = 0.5
+""" Tick loop load (fraction of time spent running physics ticks and broadcasts) up to which rooms get `BROADCAST_RATE_MAX` """
+LOAD_HIGH = 0.9
+""" Tick loop load at and above which rooms get `BROADCAST_RATE_MIN` """
+LOAD_SMOOTHING = 0.05
+""" Weight of each scheduler wake-up in the smoothed tick loop load """
+RTT_INFLATION_THRESHOLD = 0.1
+""" A client counts as congested if its smoothed RTT is this many seconds above its lowest recent sample. """
+STATUS_PRINT_INTERVAL = 1
+""" Seconds between each room's status lines in the server console. """
+
+SNAPSHOT_HISTORY_LENGTH = 32
+""" How many past snapshots each room keeps as possible delta baselines. Must not exceed the client's history length. """
+KEYFRAME_INTERVAL = 40
+""" Every client is sent a full snapshot (keyframe) at least once every this many broadcasts. """
+
+RELEVANCE_AHEAD = 350
+""" Entities up to this many meters ahead of a client's car are sent to it every broadcast (see `./interest.py`). """
+RELEVANCE_BEHIND = 50
+""" Entities up to this many meters behind a client's car are sent to it every broadcast. """
+RELEVANCE_FAR = 1000
+""" Entities up to this many meters away (either way) are sent to a client every `RELEVANCE_FAR_INTERVAL` broadcasts. """
+RELEVANCE_FAR_INTERVAL = 4
+""" How often (in broadcasts) far-away entities are included in a client's snapshot. """
+STANDINGS_INTERVAL = 8
+""" How often (in broadcasts) every client is sent the `standings` event (every entity's position along the track). """
+
+OUTBOUND_QUEUE_MAX_BYTES = 256 * 1024
+""" Most unsent data the server will hold for one client (see `./outbound.py`). Clients past this are disconnected. """
+SLOW_CONSUMER_TIMEOUT = 5
+""" Clients whose outbound queue hasn't fully drained for this many seconds are disconnected. """
+RTT_SAMPLE_COUNT = 16
+""" How many recent round trip time samples (from clock sync pings) are kept per client. """
+RTT_SMOOTHING = 0.125
+""" Weight of each new round trip time sample in a client's smoothed RTT (same as TCP's SRTT). """
 HOST, PORT = "localhost", 3999
+UDP_PORT = PORT
+""" UDP port for the optional unreliable snapshot/input channel (see `./udp_channel.py`). UDP and TCP ports are separate namespaces. """
+UDP_SIMULATED_LOSS = 0
+""" Fraction (0-1) of datagrams to drop on purpose, in both directions, for testing. Can be set with `--udp-loss <fraction>`. """
+
+DIRECTORY_PORT = 3990
+""" Default port of the room directory service (`python server/room_directory.py`), for running several servers together. """
+DIRECTORY_PUBLISH_INTERVAL = 1
+""" Seconds between each server publishing its load to the room directory (see `./room_directory.py`). """
+DIRECTORY_NODE_TIMEOUT = 5
+""" Servers that haven't published their load for this many seconds are considered gone (and so are their rooms). """
+DIRECTORY_REBALANCE_MARGIN = 8
+""" New rooms are only sent to another server if it has at least this many fewer connected clients than this one. """
 
+MAPS_DIR = "./server/maps"
+""" Where the .map files in `MAPS` are, relative to where the server is started from (the repository root) """
 MAPS = {
     "Touch Grass": {
         "map_name": "Touch Grass",
@@ -30,5 +95,17 @@ OOB_LENIENCY = 10
 
 CRASH_DURATION = 5
 """ Penalty in seconds for crashing. """
+CRASH_TICKS = CRASH_DURATION * TICK_SPEED
+""" `CRASH_DURATION` in physics ticks - crashes are timed in ticks, so they last the same amount of simulated time however the server runs """
+
+CAR_COLORS = ["red", "orange", "yellow", "green", "blue", "purple", "pink", "white"]
+""" Every car color the client has images for. In rooms with more players than this, colors repeat (see `LiveryPool` in `./lobby.py`). """
 
-CAR_COLORS = set(["red", "orange", "yellow", "green", "blue", "purple", "pink", "white"])
\ No newline at end of file
+ROOM_CAPACITY = 8
+""" Most players a room can have. Also set by `--room-capacity <n>`, up to `MAX_ROOM_CAPACITY`. """
+MAX_ROOM_CAPACITY = 256
+""" Entity slots are a single byte in snapshots (see `./snapshot.py`), so no room can have more entities than this. """
+SPAWN_GRID_COLUMNS = 8
+""" Cars side by side in each row of the starting grid (see `SpawnGrid` in `./lobby.py`). """
+SPAWN_ROW_SPACING = 30
+""" Meters between rows of the starting grid. """
\ No newline at end of file
@@ -0,0 +1,251 @@
+import asyncio
+import functools
+import json
+import re
+import typing
+from uuid import uuid4
+
+import endpoints
+from client_room import Client
+from udp_channel import UDPChannel
+from mainloop import schedule_rooms, scheduler
+
+def call_on_loop(loop: asyncio.AbstractEventLoop, callback: typing.Callable[..., typing.Any], *args) -> None:
+    """
+    Runs `callback(*args)` right away when called on `loop`'s thread, and schedules it there from any other thread.
+
+    The HTTP views run in the loop's executor (see `handle_http`), and the transports they end up writing to are not thread-safe.
+    """
+
+    try:
+        if asyncio.get_running_loop() is loop:
+            callback(*args)
+            return
+    except RuntimeError: # no loop running in this thread
+        pass
+
+    loop.call_soon_threadsafe(callback, *args)
+
+class StreamSocket:
+    """
+    Adapts an `asyncio.StreamWriter` to the small part of the `socket.socket` interface that `Client` uses
+    (`send`, `fileno`, `shutdown`, `close`), so rooms and clients work the same in both runtimes.
+
+    Writes never block: they are appended to the transport's buffer and flushed by the event loop.
+    Like a non-blocking socket, `send` raises `BlockingIOError` once that buffer is over its high-water mark,
+    so the rest stays in the client's bounded outbound queue (see `./outbound.py`) instead of growing the transport's buffer forever.
+
+    Writes from other threads (the HTTP views) are handed to the event loop (see `call_on_loop`).
+    """
+
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+
+    def send(self, data: bytes) -> int:
+        if self.writer.is_closing():
+            raise ConnectionResetError("Stream is closed")
+
+        transport = self.writer.transport
+        if transport.get_write_buffer_size() > transport.get_write_buffer_limits()[1]:
+            raise BlockingIOError("Transport buffer is full")
+
+        call_on_loop(self.loop, self.writer.write, data)
+        return len(data)
+
+    def fileno(self) -> int:
+        if self.writer.is_closing():
+            return -1
+
+        return self.writer.get_extra_info('socket').fileno()
+
+    def shutdown(self, how: int) -> None:
+        # drop whatever is still buffered - this is only used to disconnect slow clients
+        call_on_loop(self.loop, self.writer.transport.abort)
+
+    def close(self) -> None:
+        call_on_loop(self.loop, self.writer.close)
+
+async def drain_backlog(cli: Client, writer: asyncio.StreamWriter) -> None:
+    """
+    Flushes `cli`'s outbound queue each time the transport's buffer drains, until the queue is empty.
+    """
+
+    while cli.outbound.pending() and cli.sock is not None:
+        try:
+            await writer.drain()
+        except (ConnectionAbortedError, ConnectionResetError, BrokenPipeError):
+            return
+
+        if not cli.flush(): return
+
+def compile_route(rule: str) -> re.Pattern:
+    """
+    Converts a flask-style rule (e.g. `/joinroom/<string:client_id>/<string:room_id>`) to a regex with named groups.
+    """
+
+    return re.compile("^" + re.sub(r"<string:(\w+)>", r"(?P<\1>[^/]+)", rule) + "$")
+
+ROUTES = [(compile_route(rule), view_func) for rule, view_func in endpoints.ROUTES]
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    Feeds every read into the client's `FrameDecoder`. The first frame completes the handshake
+    (see `Client.complete_handshake`), every later one goes to `Client.handle_message`,
+    until the client disconnects.
+    """
+
+    address = writer.get_extra_info('peername')
+    print(f"\x1b[36mConnection established\x1b[0m from: \x1b[33m{address}\x1b[0m")
+
+    cli = Client(StreamSocket(writer), host=address[0], port=address[1], id=uuid4().hex)
+
+    drain_task: asyncio.Task = None
+    def start_draining() -> None:
+        nonlocal drain_task
+        if drain_task is None or drain_task.done():
+            drain_task = asyncio.ensure_future(drain_backlog(cli, writer))
+
+    loop = asyncio.get_running_loop()
+    cli.on_backlog = lambda cli: call_on_loop(loop, start_draining)
+
+    while True:
+        try:
+            data = await reader.read(65536)
+        except (ConnectionAbortedError, ConnectionResetError):
+            print(f"\x1b[34mClient\x1b[33m {cli.id}\x1b[31m: Connection aborted!\x1b[0m")
+            data = None
+
+        if not data: break
+
+        try:
+            frames = cli.decoder.feed(data)
+        except ValueError as e:
+            print(f"\x1b[34mClient\x1b[33m {cli.id}\x1b[31m: Corrupt stream ({e})\x1b[0m")
+            break
+
+        for msg_type, payload in frames:
+            if cli.username is None:
+                if not cli.complete_handshake(msg_type, payload): break
+                endpoints.id_to_client[cli.id] = cli
+                continue
+
+            cli.handle_message(msg_type, payload)
+
+        if cli.username is None and frames: break # handshake failed
+
+    writer.close()
+    cli.sock = None
+    if cli.udp is not None: cli.udp.forget(cli)
+    print(f"\x1b[34mStopped receiving from Client \x1b[33m{cli.id}\x1b[0m!\x1b[0m")
+
+class DatagramHandler(asyncio.DatagramProtocol):
+    """
+    Passes every datagram received on the UDP port to a `UDPChannel` (see `./udp_channel.py`).
+    """
+
+    def __init__(self, channel: UDPChannel) -> None:
+        self.channel = channel
+
+    def connection_made(self, transport: asyncio.DatagramTransport) -> None:
+        self.channel.sendto = transport.sendto
+
+    def datagram_received(self, data: bytes, addr: tuple) -> None:
+        self.channel.handle_datagram(data, addr)
+
+    def error_received(self, exc: Exception) -> None:
+        pass # e.g. ICMP port unreachable from an earlier send
+
+async def handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    A minimal HTTP/1.1 server for the room system's GET endpoints (see `endpoints.ROUTES`).
+
+    Every response is JSON and the connection is closed after it is sent.
+    The views run in the loop's default executor, since some of them wait on the room directory (see `./room_directory.py`).
+    """
+
+    try:
+        request_line = await reader.readline()
+
+        # skip headers - none of the endpoints read them
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+    except (ConnectionAbortedError, ConnectionResetError):
+        writer.close()
+        return
+
+    status, payload = "404 Not Found", {"success": False, "message": "Not found"}
+
+    parts = request_line.decode('latin-1').split()
+    if len(parts) >= 2 and parts[0] == "GET":
+        path = parts[1].split("?")[0]
+        for pattern, view_func in ROUTES:
+            match = pattern.match(path)
+            if match:
+                payload = await asyncio.get_running_loop().run_in_executor(None, functools.partial(view_func, **match.groupdict()))
+                status = "200 OK"
+                break
+    elif len(parts) >= 2:
+        status, payload = "405 Method Not Allowed", {"success": False, "message": "Method not allowed"}
+
+    body = json.dumps(payload).encode('utf-8')
+    writer.write(
+        f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1')
+        + body
+    )
+
+    try:
+        await writer.drain()
+    except (ConnectionAbortedError, ConnectionResetError):
+        pass
+    writer.close()
+
+async def tick_loop() -> None:
+    """
+    The asyncio version of `broadcast_mainloop` - runs the physics ticks and broadcasts
+    of every room (see `schedule_rooms`), sleeping until the next deadline in between.
+    """
+
+    schedule_rooms(endpoints.id_to_room)
+
+    while True:
+        await asyncio.sleep(scheduler.run_due())
+
+async def serve(host: str, port: int, handle_command: typing.Callable[[str], bool], udp_channel: UDPChannel = None, udp_port: int = None) -> None:
+    """
+    Runs the whole server on one event loop: socket accept + per-client input, HTTP endpoints (on `port+1`),
+    the UDP channel (on `udp_port`, if given a `udp_channel`), the tick loop, and countdown timers.
+
+    `handle_command` is called with each line typed into the server's console, and should return `False` to shut down.
+    Reading the console (`input()` has no non-blocking version) and the HTTP views (see `handle_http`) are the only things that happen off the loop.
+    """
+
+    loop = asyncio.get_running_loop()
+    endpoints.countdown_scheduler = lambda delay, callback: call_on_loop(loop, loop.call_later, delay, callback)
+
+    socket_server = await asyncio.start_server(handle_client, host, port, reuse_address=True)
+    print(f"Socket server listening on {host}:{port}")
+
+    http_server = await asyncio.start_server(handle_http, host, port+1, reuse_address=True)
+    print(f"HTTP server (asyncio) running at {host}:{port+1}")
+
+    udp_transport = None
+    if udp_channel is not None:
+        udp_transport, _ = await loop.create_datagram_endpoint(lambda: DatagramHandler(udp_channel), local_addr=(host, udp_port))
+        print(f"UDP channel listening on {host}:{udp_port}")
+
+    ticker = asyncio.create_task(tick_loop())
+
+    try:
+        while True:
+            try:
+                cmd = await loop.run_in_executor(None, input)
+            except EOFError:
+                # no console attached, just keep serving
+                await asyncio.Future()
+            if not handle_command(cmd): break
+    finally:
+        ticker.cancel()
+        socket_server.close()
+        http_server.close()
+        if udp_transport is not None: udp_transport.close()
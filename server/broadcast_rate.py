@@ -0,0 +1,63 @@
+from typing import TYPE_CHECKING
+
+from CONSTANTS import (
+    BROADCAST_RATE_MAX, BROADCAST_RATE_MIN, BROADCAST_RATE_STEP,
+    LOAD_LOW, LOAD_HIGH, LOAD_SMOOTHING, RTT_INFLATION_THRESHOLD,
+)
+
+if TYPE_CHECKING:
+    from client_room import Client
+
+class ServerLoad:
+    """
+    How busy the tick loop is: the fraction of time spent actually updating and broadcasting,
+    smoothed over the last few wake-ups. 1 means there is no idle time left, and ticks are starting to run late.
+
+    Recorded by the tick scheduler (see `TickScheduler` in `./scheduler.py`).
+    """
+
+    def __init__(self) -> None:
+        self.load = 0.0
+
+    def record(self, busy_s: float, elapsed_s: float) -> None:
+        self.load += LOAD_SMOOTHING * (busy_s / elapsed_s - self.load)
+
+    def room_rate(self) -> float:
+        """
+        The broadcast rate (Hz) every room can have at the current load: `BROADCAST_RATE_MAX` up to `LOAD_LOW`,
+        falling linearly to `BROADCAST_RATE_MIN` at `LOAD_HIGH` and above.
+        """
+
+        if self.load <= LOAD_LOW: return BROADCAST_RATE_MAX
+        if self.load >= LOAD_HIGH: return BROADCAST_RATE_MIN
+
+        fraction = (self.load - LOAD_LOW) / (LOAD_HIGH - LOAD_LOW)
+        return BROADCAST_RATE_MAX - fraction * (BROADCAST_RATE_MAX - BROADCAST_RATE_MIN)
+
+def is_congested(client: 'Client') -> bool:
+    """
+    Whether `client`'s connection looks like it is falling behind: its outbound queue (see `./outbound.py`)
+    has a backlog, or its round trip time has grown well past the lowest recent sample (data is queueing
+    somewhere along the way, even if not on our side).
+    """
+
+    if client.outbound.pending(): return True
+
+    samples = list(client.rtt_samples)
+    return client.rtt is not None and bool(samples) and client.rtt - min(samples) > RTT_INFLATION_THRESHOLD
+
+def update_client_rate(client: 'Client', room_rate: float) -> None:
+    """
+    Adapts `client.broadcast_rate` after it is sent a snapshot, like TCP's congestion control
+    (additive increase, multiplicative decrease): each snapshot sent while the client isn't congested
+    raises its rate by `BROADCAST_RATE_STEP`, and congestion halves it.
+
+    A client never gets more snapshots than its room sends, or fewer than `BROADCAST_RATE_MIN`.
+    """
+
+    if is_congested(client):
+        rate = client.broadcast_rate / 2
+    else:
+        rate = client.broadcast_rate + BROADCAST_RATE_STEP
+
+    client.broadcast_rate = max(BROADCAST_RATE_MIN, min(rate, room_rate))
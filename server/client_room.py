@@ -1,13 +1,17 @@
 import array
-from typing import List
-from socket import socket
+from collections import OrderedDict, deque
+from typing import List, Callable, Any, FrozenSet, Set
+from socket import socket, SHUT_RDWR
 import time
-from random import shuffle
 import threading
-import json
 
-from socket_wrapper import _send
-from key_decoder import decode_packet
+from socket_wrapper import wrap_message, pack_frame, FrameDecoder, MESSAGE_USERNAME, MESSAGE_CLIENT_ID, MESSAGE_INPUT, MESSAGE_ACK, MESSAGE_UDP_HELLO, MESSAGE_PING, MESSAGE_PONG, MESSAGE_PACKET, INPUT_RECORD, PING_RECORD, PONG_RECORD
+from snapshot import SnapshotEncoder
+from interest import RelevanceIndex
+from broadcast_rate import update_client_rate
+from lobby import LiveryPool, SpawnGrid
+from outbound import OutboundQueue
+from udp_channel import UDPChannel
 from world.entity import Entity
 from world.world import World
 from CONSTANTS import *
@@ -30,64 +34,173 @@ class Client:
         self.entity: Entity = None # The entity that this client controls. If not in game, this should be None
         self.hosting: Room = None # If this client is the owner of a room, this field should point to that room 
         
+        self.receiving = False
+        """ Whether key input from this client is currently applied to its entity. See `Room.start_game`. """
         self.stop_receiving = False
         
-    def start_recv_thread(self):
+        self.decoder = FrameDecoder()
+        """ Reassembles frames from this client's socket reads (see `./socket_wrapper.py`) """
+        
+        self.outbound = OutboundQueue()
+        """ Frames waiting to be written to `sock`. See `send_data` and `flush`. """
+        self.on_backlog: Callable[['Client'], Any] = None
+        """
+        Set by the runtime that owns `sock`. Called (possibly from another thread) whenever `flush` leaves data
+        in `outbound`, so the runtime can call `flush` again once the socket is writable.
+        """
+        
+        self.latest_input = (0, 0, 0)
+        """ `(seq, client timestamp, key bitmask)` of the newest `MESSAGE_INPUT` received (see `INPUT_RECORD`) """
+        self.applied_input = 0
+        """ seq of the latest input applied to the entity """
+        
+        # optional UDP channel (see ./udp_channel.py)
+        self.udp: UDPChannel = None
+        self.udp_addr: tuple = None
+        """ Address this client's datagrams come from, once it has sent a `MESSAGE_UDP_HELLO` datagram """
+        self.udp_active = False
+        """ Whether the client confirmed (over TCP) that it receives our datagrams. Snapshots only go over UDP if so. """
+        self.udp_seq_in = 0
+        self.udp_seq_out = 0
+        
+        # round trip times, measured from the client's clock sync pings (see `MESSAGE_PING`)
+        self.rtt_samples = deque(maxlen=RTT_SAMPLE_COUNT)
+        """ The latest round trip time samples, in seconds, oldest first """
+        self.rtt: float = None
+        """ Smoothed round trip time in seconds, or `None` until the first sample """
+        
+        self.broadcast_rate: float = BROADCAST_RATE_MIN
+        """ Physics snapshots per second this client currently gets (see `./broadcast_rate.py`). Starts low and grows. """
+        self.snapshot_credit = 0.0
+        """ Snapshots this client is owed: grows by its share of each room broadcast, and it is sent one whenever this reaches 1 """
+        
+        # delta snapshot bookkeeping (see ./snapshot.py). Reset by `reset_snapshots` when a game starts.
+        self.acked_snapshot = 0
+        """ seq of the latest snapshot this client has acknowledged """
+        self.last_keyframe_snapshot = 0
+        """ seq of the latest full snapshot sent to this client """
+        self.sent_slots: OrderedDict[int, FrozenSet[int]] = OrderedDict()
+        """ seq -> slots of the entities included in that snapshot, for the last `SNAPSHOT_HISTORY_LENGTH` snapshots sent """
+        
+    def reset_snapshots(self):
         """
-        Begins a new thread running recieve loop for the socket.
-        Updates the client's corresponding entity if it exists, otherwise does nothing.
+        Forgets which snapshots this client has, so the next one it is sent is a keyframe.
+        """
+        self.acked_snapshot = 0
+        self.last_keyframe_snapshot = 0
+        self.sent_slots.clear()
+        self.snapshot_credit = 1.0 # the first broadcast of a game goes to everyone
+        
+    def start_receiving(self):
+        """
+        Begins applying key input read from this client's socket to its entity.
         
-        This should be used only for in-game keypress packet logic.
-        All other requests from the client will be HTTP, not socketio-based. <- i think
+        The socket itself is always being read by the server's `NetworkReactor` (see `./reactor.py`);
+        input that arrives before this is called (or after `stop_receiving` is set) is discarded.
         
-        ^ Therefore, they shoudln't interfere with this loop.
-        """        
-            
-        print(f"\x1b[34mClient \x1b[33m{self.id}\x1b[0m: Starting recv loop...")
-        threading.Thread(target=self.recv_loop).start()
+        This should be used only for in-game key input logic.
+        All other requests from the client will be HTTP, not socketio-based.
+        """
+        
+        print(f"\x1b[34mClient \x1b[33m{self.id}\x1b[0m: Receiving keypresses...")
+        self.stop_receiving = False
+        self.receiving = True
      
-    def recv_loop(self):
-        while True:
-            
-            if self.stop_receiving: break
+    def complete_handshake(self, msg_type: int, payload: bytes) -> bool:
+        """
+        Handles the first frame sent on a new connection, which must be the client's username.
+        Replies with this client's id. (SPECIAL EVENT - it is sent before the client starts its event listener)
+        
+        Returns `True` if the handshake succeeded, `False` if the frame was not a (UTF-8) username.
+        """
+        
+        if msg_type != MESSAGE_USERNAME or not payload:
+            return False
+        
+        try:
+            self.username = payload.decode('utf-8')
+        except UnicodeDecodeError:
+            return False
+        
+        return self._queue(pack_frame(MESSAGE_CLIENT_ID, self.id.encode('utf-8')))
+     
+    def handle_message(self, msg_type: int, payload: bytes):
+        """
+        Handles one complete frame (after the handshake) read from this client's socket.
+        
+        The client sends its key state (`MESSAGE_INPUT`), snapshot acknowledgements (`MESSAGE_ACK`),
+        the confirmation of the UDP channel (`MESSAGE_UDP_HELLO`), and clock sync pings (`MESSAGE_PING`).
+        """
+        
+        if msg_type == MESSAGE_INPUT:
+            if len(payload) != INPUT_RECORD.size: return
             
-            # the client only sends keypress encodings, which are only 0-7 (representable in 1 byte)
-            data = None
-            try:
-                data = self.sock.recv(1)
-            except (ConnectionAbortedError, ConnectionResetError):
-                print(f"\x1b[34mClient\x1b[33m {self.id}\x1b[31m: Connection aborted!\x1b[0m")
-                self.sock.close()
-                self.sock = None
-                
-                print(f"\x1b[34mStopped receiving from Client \x1b[33m{self.id}\x1b[0m!\x1b[0m") 
-                del self
-                
-            if data is None: break
+            seq, timestamp, keys = INPUT_RECORD.unpack(payload)
+            if seq <= self.latest_input[0]: return # duplicate, or overtaken by a newer one
             
-            keydata = int.from_bytes(data, 'big')
+            if not self.receiving or self.stop_receiving: return
             
-            # key data should always be between 0 and 7. If not, ignore
-            if keydata < 0 or keydata > 7: 
-                print(f"\x1b[34mClient \x1b[33m{self.id}\x1b[0m: Ignoring ineligible packet \x1b[33m{keydata}\x1b[0m")
-                continue
+            # applied on the next tick (see `apply_input`), so a burst of inputs costs one update
+            self.latest_input = (seq, timestamp, keys)
+            return
+        
+        if msg_type == MESSAGE_ACK:
+            if len(payload) == 4:
+                self.acked_snapshot = max(self.acked_snapshot, int.from_bytes(payload, 'big'))
+            return
+        
+        if msg_type == MESSAGE_UDP_HELLO:
+            # the client received our hello reply, so datagrams get through both ways
+            self.udp_active = self.udp_addr is not None
+            print(f"\x1b[34mClient \x1b[33m{self.id}\x1b[0m: UDP channel {'active' if self.udp_active else 'not bound'}")
+            return
+        
+        if msg_type == MESSAGE_PING:
+            if len(payload) != PING_RECORD.size: return
+            received = time.time()
             
-            # Update keys
-            print(f"\x1b[34mClient \x1b[33m{self.id}\x1b[0m: Updating keys with code \x1b[33m{keydata}\x1b[0m")
+            client_sent, last_pong_sent, hold = PING_RECORD.unpack(payload)
+            if last_pong_sent:
+                self.record_rtt(received - last_pong_sent - hold)
             
-            if not self.entity is None: 
-                self.entity.update_keys(*decode_packet(keydata))
-            else:
-                print(f"\x1b[34mClient \x1b[33m{self.id}\x1b[0m: No entity to update keys on!")
+            # never dropped (see `OutboundQueue.push`), so the client gets a reply for every ping
+            self._queue(pack_frame(MESSAGE_PONG, PONG_RECORD.pack(client_sent, received, time.time())))
+            return
+        
+        print(f"\x1b[34mClient \x1b[33m{self.id}\x1b[0m: Ignoring unknown message type \x1b[33m{msg_type}\x1b[0m")
+    
+    def record_rtt(self, sample: float):
+        """
+        Adds a round trip time sample (seconds) and updates the smoothed `rtt`. Implausible samples are ignored.
+        """
+        
+        if not 0 <= sample < SLOW_CONSUMER_TIMEOUT: return
+        
+        self.rtt_samples.append(sample)
+        self.rtt = sample if self.rtt is None else self.rtt + RTT_SMOOTHING * (sample - self.rtt)
+    
+    def apply_input(self):
+        """
+        Updates this client's entity with the latest key state it sent, if it hasn't been applied yet.
+        Called once per tick, before physics are updated (see `Room.update_if_started`).
+        """
+        
+        # one tuple, since it is replaced from the reactor thread
+        seq, _, keys = self.latest_input
+        if seq <= self.applied_input or self.entity is None: return
+        self.applied_input = seq
+        
+        for keyid in range(4):
+            self.entity.update_keys(keyid, bool(keys & (1 << keyid)))
         
     def send_data(self, data, event_name: str = None) -> bool:
         """
-        Send a message payload to this Client's registered socket.
+        Queue a message payload for this Client's registered socket (see `./outbound.py`). Never blocks.
         
         ### Important data type notes:
         This function works if `data` is of type: `list`, `dict`, `str`, `bytes`, `bytearray`, `array.array`, `int`, `float`, `bool`
         
-        Returns `True` if the socket is still open and the message was sent, `False` if otherwise.
+        Returns `True` if the socket is still open and the message was sent or queued, `False` if otherwise.
         
         if `event_name` is specified, then the message will be sent as an event, and the data must be JSON-serializable.
         """
@@ -96,38 +209,89 @@ class Client:
             print(f"\x1b[31mClient \x1b[33m{self.id}\x1b[31m: No socket to send data to!\x1b[0m")
             return False
 
-        # Handle list[float] case, which will be the main use of this function (sending a packet)
+        # Handle list[float] case (a packet)
         if type(data) == list and event_name is None:
-            return _send(self.sock, array.array("f", data)) # no 'event' param, which causes `sock.send` to label the payload as a packet
+            data = array.array("f", data)
+        
+        # packets (physics snapshots) are superseded by the next one, so they can go over UDP (and may be lost),
+        # and may be dropped if the client falls behind
+        if event_name is None and self.udp_active and self.udp.send(self, MESSAGE_PACKET, bytes(data)):
+            return True
+        
+        return self._queue(wrap_message(data, event_name=event_name), droppable=event_name is None)
+    
+    def _queue(self, frame: bytes, droppable: bool = False) -> bool:
+        """
+        Adds a frame to this client's outbound queue and writes as much as the socket accepts right now.
+        
+        Returns `False` (after disconnecting the client) if the queue overflowed or the socket is closed.
+        """
+        
+        if not self.outbound.push(frame, droppable):
+            print(f"\x1b[31mClient \x1b[33m{self.id}\x1b[31m: Outbound queue full ({self.outbound.queued_bytes} bytes), disconnecting!\x1b[0m")
+            self.evict()
+            return False
+        
+        return self.flush()
+    
+    def flush(self) -> bool:
+        """
+        Writes queued frames to the socket until it would block. Never blocks.
+        
+        Returns `False` if the socket is closed, or if this client was disconnected
+        for not draining its queue within `SLOW_CONSUMER_TIMEOUT` seconds.
+        """
+        
+        sock = self.sock
+        if sock is None: return False
+        
+        try:
+            pending = self.outbound.write_to(sock)
+        except (ConnectionResetError, ConnectionAbortedError, BrokenPipeError, OSError):
+            print(f"\x1b[31mClient \x1b[33m{self.id}\x1b[31m: Could not send: Connection closed!\x1b[0m")
+            return False
+        
+        if pending:
+            if self.outbound.backlog_age() > SLOW_CONSUMER_TIMEOUT:
+                print(f"\x1b[31mClient \x1b[33m{self.id}\x1b[31m: Too slow to receive data, disconnecting!\x1b[0m")
+                self.evict()
+                return False
+            
+            if self.on_backlog is not None:
+                self.on_backlog(self)
+        
+        return True
+    
+    def evict(self):
+        """
+        Shuts this client's connection down. The runtime that owns the socket notices the closed connection
+        and cleans up as if the client had disconnected itself.
+        """
         
-        # other cases
-        return _send(self.sock, data, event_name=event_name)
+        sock = self.sock
+        if sock is None: return
+        
+        try:
+            sock.shutdown(SHUT_RDWR)
+        except OSError:
+            pass # already closed
         
     def __str__(self) -> str:
         return f"(Client\x1b[0m id=\x1b[33m{self.id}\x1b[0m, room=\x1b[33m{self.room_id}\x1b[0m)"
 
 class Room:
-    def __init__(self, host: Client, clients: List[Client], id: int):
-        
-        self.available_colors = CAR_COLORS.copy()
-        self.seen_usernames = []
+    
+    capacity = ROOM_CAPACITY
+    """ Most players a room can have (clients that disconnected still count until they are cleaned up) """
+    
+    def __init__(self, host: Client, clients: List[Client], id: int, map_name: str = None):
+        """
+        Creates a room on `map_name` (a random map if not given) with `clients` seated in it.
+        """
         
         self.clients = {}
-        
-        # Initialize clients. for each client passed in, give them a random color.
-        # Also, if their username is taken, add a number suffix to it.
-        for client in clients:
-            
-            # Handle repeat usernames (add a number suffix)
-            num_times_username_taken = self.seen_usernames.count(client.username)
-            new_client_username = client.username + (f"-{num_times_username_taken+1}" if num_times_username_taken > 0 else "")
-            self.seen_usernames.append(new_client_username)
-            
-            self.clients[client.id] = {
-                "client_obj": client,
-                "color": self.available_colors.pop(),
-                "username": new_client_username
-            }
+        """ `{client_id: {"client_obj": Client, "username": str, "color": str, "livery": int, "spawn": [x, y]}}` """
+        self.taken_usernames: Set[str] = set()
         
         self.id = id
         self.host = host
@@ -135,43 +299,86 @@ class Room:
         self.ended = False
         
         # Create the world
-        self.world = World()
-        
-        map_width_one_side = self.world.get_map_data("width")/2
-        self.spawn_locations = [
-            [90, -3*map_width_one_side/4],
-            [60, -2*map_width_one_side/4],
-            [30, -map_width_one_side/4],
-            [0, 0],
-            [30, map_width_one_side/4],
-            [60, 2*map_width_one_side/4],
-            [90, 3*map_width_one_side/4],
-            [120, 4*map_width_one_side/4]
-        ] 
-        shuffle(self.spawn_locations) # shuffle the spawning locs. First player gets [-1], then [-2], etc. (pop)
-        
-        # Add all clients to the world
-        # testing: put them at (100, 100), (100, 150), (100, 200), and so on.
-        # also they should have hitbox radius 10
-        for i, client in enumerate(self.clients.values()):
-            e = self.world.create_entity(client["username"], client["color"], client["client_obj"], self.spawn_locations.pop(), hitbox_radius=5)
-            client["client_obj"].entity = e
+        self.world = World(map_name)
+        self.snapshots = SnapshotEncoder()
+        self.broadcast_count = 0
+        """ Number of physics broadcasts so far, for things sent every few broadcasts """
+        self.broadcast_rate: float = BROADCAST_RATE_MAX
+        """ Physics broadcasts per second, set from the server's load (see `ServerLoad.room_rate`). Clients may get fewer. """
+        self.next_broadcast_at = 0.0
+        """ `perf_counter()` time at which the room is next due to broadcast (see `broadcast_rooms` in `./mainloop.py`) """
+        self.last_status_print = 0.0
+        
+        self.liveries = LiveryPool()
+        self.spawns = SpawnGrid(self.capacity, self.world.get_map_data("width"))
+        
+        # Add all clients to the room and the world
+        for client in clients:
+            self._seat(client)
+
+    def _seat(self, client: Client) -> dict:
+        """
+        Gives `client` a unique username, a color and a spot on the starting grid, and adds its entity to the world.
+        
+        Returns its entry in `self.clients`.
+        """
+        
+        # Handle repeat usernames (add a number suffix)
+        username = client.username
+        suffix = 1
+        while username in self.taken_usernames:
+            suffix += 1
+            username = f"{client.username}-{suffix}"
+        self.taken_usernames.add(username)
+        
+        color, livery = self.liveries.take()
+        spawn = self.spawns.take()
+        
+        self.clients[client.id] = {
+            "client_obj": client,
+            "username": username,
+            "color": color,
+            "livery": livery,
+            "spawn": spawn,
+        }
+        
+        client.entity = self.world.create_entity(username, color, client, list(spawn), hitbox_radius=5)
+        
+        return self.clients[client.id]
 
-    def start_game(self):
+    def lobby_players(self) -> List[dict]:
+        """
+        Returns `[{username, color, livery, is_host}, ...]` for every player in the room, for the waiting room display.
+        """
+        
+        return [{
+            "username": c["username"],
+            "color": c["color"],
+            "livery": c["livery"],
+            "is_host": c["client_obj"].hosting is not None,
+        } for c in list(self.clients.values())]
+
+    def start_game(self, scheduler: Callable[[float, Callable[[], None]], Any] = None):
         """
         Initiates game start.
         
+        `scheduler(delay_s, callback)` is used to run the end of the countdown.
+        If not provided, a timer thread is used (see `threading.Timer`).
+        
         ### Important game flow details:
             - On start request, the server will send a `game-init` event to all clients in the room.
             - This `game-init` also contains an exact timestamp for when the live game will begin.
             - Countdown will be 5 seconds, so the timestamp will be 5 seconds from the calling of this function.
-            - After the countdown is over, this function starts the receive loop for all clients, which will start listening for their keyboard inputs.
+            - After the countdown is over, this function marks all clients as receiving, so the reactor starts applying their keyboard inputs.
             - Also, AFTER countdown, marks the room as started, which will allow the mainloop to begin updating physics.
         """
         
         start_time = time.time() + 5
         
-        for client in self.clients.values():
+        for client in list(self.clients.values()):
+            client['client_obj'].reset_snapshots()
+            
+
             # see game/screens/waiting_room.py - game-init and leave events dont need extra data.
             send_result = client['client_obj'].send_data({
                 "start_timestamp": start_time,
@@ -185,88 +392,63 @@ class Room:
         print(f"Start game: Starting in approx {start_time - time.time()} seconds...")
         
         def delayed_start():
-            time.sleep(start_time - time.time())
-            
-            for client in self.clients.values():
-                client['client_obj'].start_recv_thread()  
+            for client in list(self.clients.values()):
+                client['client_obj'].start_receiving()
                 
             # also start the game
             self.started = True       
             
-            # thread will end here, and the mainloop will start updating physics
+            # the mainloop will start updating physics from here
         
         # At that time, clients SHOULD ALSO START SENDING KEYBOARD INPUTS.
-        # we dont start the loop on start-init otherwise clients can send keypresses before the game starts
-        threading.Thread(target=delayed_start).start()
+        # we dont start receiving on start-init otherwise clients can send keypresses before the game starts
+        delay = max(0, start_time - time.time())
+        if scheduler is None:
+            threading.Timer(delay, delayed_start).start()
+        else:
+            scheduler(delay, delayed_start)
 
     def add_client(self, client: Client) -> dict:
         """
-        Joins a client to the room. Returns their username and color in a dictionary.
+        Joins a client to the room. Returns their username, color and livery in a dictionary.
         """
         
-        num_times_username_taken = self.seen_usernames.count(client.username)
-        new_client_username = client.username + (f"-{num_times_username_taken+1}" if num_times_username_taken > 0 else "")
-        
-        self.clients[client.id] = {
-            "client_obj": client,
-            "color": self.available_colors.pop(),
-            "username": new_client_username
-        }
-        
-        # add their username to the taken list
-        self.seen_usernames.append(new_client_username)
+        seat = self._seat(client)
+        joined = { "username": seat["username"], "color": seat["color"], "livery": seat["livery"] }
         
         # send the 'player-join' event to all other clients in the room, with the new client's username and color
-        for client_id in self.clients:
+        for client_id, other in list(self.clients.items()):
             if client_id == client.id: continue
-            send_result = self.clients[client_id]['client_obj'].send_data({
-                "username": new_client_username,
-                "color": self.clients[client.id]['color']
-            }, "player-join")
+            send_result = other['client_obj'].send_data(joined, "player-join")
             
-            # if not send result, remove client from room
+            # if not send result, remove that client from room
             if not send_result:
-                self.remove_client(client)
-            
-        # add the new client to the world
-        e = self.world.create_entity(new_client_username, self.clients[client.id]['color'], client, self.spawn_locations.pop(), hitbox_radius=5)
-        client.entity = e
+                self.remove_client(other['client_obj'])
             
-        return { "username": new_client_username, "color": self.clients[client.id]['color'] }
+        return joined
         
     def remove_client(self, client: Client):
         
-        # Get that entity's location. (if game already started, then pos will be different, but at that point spawn loc doesnt matter)
-        loc = client.entity.pos
-        # add their spawn location back into the pool
-        self.spawn_locations.append(loc)
+        seat = self.clients.pop(client.id)
+        
+        # give their spawn location, color and username back to the pool
+        self.spawns.release(seat["spawn"])
+        self.liveries.release(seat["color"], seat["livery"])
+        self.taken_usernames.discard(seat["username"])
         
         # Delete the related entity from the world
         self.world.destroy_entity(client.id)
         
-        # add their color back into the pool
-        self.available_colors.add(self.clients[client.id]['color'])
-        
-        # remove their username from the taken list
-        leaving_player_username = self.clients[client.id]['username']
-        self.seen_usernames.remove(leaving_player_username)
-        
         # send the removed client a 'leave' event
         # see game/screens/waiting_room.py - game-init and leave events dont need extra data.
         client.send_data({}, "leave")
         
         # we dont actually care if the client is still connected or not, they get removed anyway
         
-        # remove them from the room
-        # note - the `Client` object shouldn't be destroyed because of Python's garbage collector maintaining a nonzero reference count
-        # We can try testing this out later, for now just be safe and set to None
-        # del self.clients[client.id]
-        self.clients.pop(client.id)
-
         # send the 'player-leave' event to all other clients in the room, with the client's username
-        for client_id in self.clients:
-            self.clients[client_id]['client_obj'].send_data({
-                "username": leaving_player_username
+        for other in list(self.clients.values()):
+            other['client_obj'].send_data({
+                "username": seat["username"]
             }, "player-leave")
         
     def num_connected(self):
@@ -278,7 +460,7 @@ class Room:
         
         marked_for_deletion = []
         
-        for c in self.clients.values():
+        for c in list(self.clients.values()):
             
             # if no sock attribute, remove (it was probably deleted by another check)
             if not hasattr(c["client_obj"], "sock") or c["client_obj"].sock is None:
@@ -304,6 +486,9 @@ class Room:
         
         if (not self.started) or self.ended: return
         
+        for client in list(self.clients.values()):
+            client["client_obj"].apply_input()
+        
         game_result = self.world.update()
         
         if game_result:
@@ -312,7 +497,7 @@ class Room:
             print(f"\x1b[32mRoom {self.id}'s game has ended!\x1b[0m")
             
             # stop sending packets to each client
-            for client in self.clients.values():
+            for client in list(self.clients.values()):
                 client["client_obj"].stop_receiving = True
             
             # the game-end event should have already been sent to all clients.
@@ -323,23 +508,62 @@ class Room:
         """
         If game not started yet, do nothing.
         
-        Otherwise, for each socket, send the client the physics data of every entity in the world.
+        Otherwise, for each socket, send the client the physics data of every entity in the world,
+        as a binary snapshot (see `./snapshot.py`). Clients get a delta against the latest snapshot they acknowledged,
+        or a keyframe if they have none (or haven't had one for `KEYFRAME_INTERVAL` broadcasts).
+        
+        Each client is only sent the entities relevant to it (see `./interest.py`): nearby ones every time,
+        far ones every `RELEVANCE_FAR_INTERVAL` broadcasts. Every `STANDINGS_INTERVAL` broadcasts, everyone
+        is sent the `standings` event instead, which covers every entity in a few bytes each.
+        
+        Clients whose `broadcast_rate` is below the room's (see `./broadcast_rate.py`) skip some broadcasts:
+        each broadcast owes a client `client rate / room rate` of a snapshot, and it is sent one once it's owed a whole one.
         
         It is assumed that this function will be called inside a tickloop, 
-        currently intended for use only in `./mainloop.py` and running once per second.
+        currently intended for use only in `./mainloop.py`, running `broadcast_rate` times per second.
         
         Returns whether or not data was sent.
         """
         
-        current_world_data = self.world.get_world_data()
-        
         if not self.started or self.ended: return
-        for client in self.clients.values():
-            # pre-encode data
-            send_result = client["client_obj"].send_data(json.dumps(current_world_data).encode('utf-8'))
+        
+        self.snapshots.capture(self.world.entities.values(), self.world.tick_timestamp)
+        self.broadcast_count += 1
+        
+        index = RelevanceIndex(self.world.entities.values())
+        include_far = self.broadcast_count % RELEVANCE_FAR_INTERVAL == 0
+        
+        for client in list(self.clients.values()):
+            c: Client = client["client_obj"]
+            
+            c.snapshot_credit = min(c.snapshot_credit + c.broadcast_rate / self.broadcast_rate, 1)
+            if c.snapshot_credit < 1: continue
+            c.snapshot_credit -= 1
+            
+            include = index.relevant_to(c.entity, include_far) if c.entity is not None else index.all()
+            
+            # send only what changed since the last snapshot this client acknowledged.
+            # clients that acknowledged the same snapshot and need the same entities share one encoding.
+            baseline = self.snapshots.choose_baseline(c.acked_snapshot, c.last_keyframe_snapshot)
+            if baseline not in c.sent_slots:
+                baseline = 0
+            if baseline == 0:
+                c.last_keyframe_snapshot = self.snapshots.seq
+            
+            c.sent_slots[self.snapshots.seq] = include
+            while len(c.sent_slots) > SNAPSHOT_HISTORY_LENGTH:
+                c.sent_slots.popitem(last=False)
+            
+            send_result = c.send_data(self.snapshots.encode(baseline, include, c.sent_slots.get(baseline)))
             
             if not send_result:
-                self.remove_client(client["client_obj"])
+                self.remove_client(c)
+                continue
+            
+            update_client_rate(c, self.broadcast_rate)
+        
+        if self.broadcast_count % STANDINGS_INTERVAL == 0:
+            self.broadcast_event(index.standings(), "standings")
 
     def broadcast_event(self, payload: dict, event_name: str):
         """
@@ -350,8 +574,9 @@ class Room:
         
         marked_deleted = []
         
-        for client_id in self.clients: # every c represents a client id
-            client_response = self.clients[client_id]["client_obj"].send_data(payload, event_name)
+        # a copy, since clients can join or leave (on other threads) while we send
+        for client_id, client in list(self.clients.items()):
+            client_response = client["client_obj"].send_data(payload, event_name)
             
             # if client is no longer connected, remove
             if not client_response:
@@ -359,7 +584,7 @@ class Room:
                 
         # Update clients
         for client_id in marked_deleted:
-            self.clients.pop(client_id)
+            self.clients.pop(client_id, None)
             
     def disband(self):
         """
@@ -368,7 +593,7 @@ class Room:
         print(f"\x1b[35mDisbanding room {self.id}...\x1b[0m")
         
         # "kick" all clients
-        for client in self.clients.values():
+        for client in list(self.clients.values()):
             print(f"\x1b[35m\tKicking client {client['client_obj'].id}\x1b[0m")
             client["client_obj"].send_data({}, "leave")
             client["client_obj"].room_id = None
@@ -0,0 +1,248 @@
+import typing
+import random
+from string import ascii_uppercase, digits
+
+import client_room
+from room_directory import RoomDirectory, InMemoryRoomDirectory, make_node
+from CONSTANTS import HOST, PORT, UDP_PORT
+
+# Room system setup - shared by both server runtimes (see ./server.py)
+id_to_client: typing.Dict[str, client_room.Client] = {} # maps id to Client objs
+"""
+Stores map from client id to Client object (containing socket, host, etc.) for all currently connected clients
+Schema: `{int client_id: client.Client client}`
+"""
+
+id_to_room: typing.Dict[str, client_room.Room] = {}
+"""
+Stores all currently open room IDs 
+Schema: `{str room_id: client.Room room}`
+"""
+
+countdown_scheduler: typing.Union[typing.Callable[[float, typing.Callable[[], None]], typing.Any], None] = None
+"""
+How `Room.start_game` schedules the end of a room's countdown - `scheduler(delay_s, callback)`.
+`None` uses a timer thread. The asyncio runtime (see `./async_server.py`) sets this to `loop.call_later`.
+"""
+
+ROOM_ID_CHARACTERS = ascii_uppercase + digits
+""" Characters allowed in room IDs """
+
+room_id_shard: typing.Tuple[int, int] = (0, 1)
+"""
+`(index, count)`: this process only creates room IDs that start with one of every `count` characters of
+`ROOM_ID_CHARACTERS`, from the `index`-th on. Set in each worker process when rooms are sharded (see `./sharding.py`),
+so workers never create the same room ID, and which worker owns a room can be told from its ID (see `room_shard`).
+"""
+
+directory: RoomDirectory = InMemoryRoomDirectory()
+"""
+Which server owns each room code (see `./room_directory.py`). Only this server, unless `server.py` was started with
+`--directory`, which replaces this with the shared directory service.
+"""
+
+this_node: dict = make_node(HOST, PORT, UDP_PORT)
+""" How clients reach this server (see `make_node`). Set by `server.py` from its command line. """
+
+def gen_room_id() -> str:
+    """
+    Generate a random room ID that is not currently in use, and claim it in the room `directory`.
+    Room IDs are 6-character long strings with the following characters allowed:
+    A-Z, 0-9
+    
+    Raises `OSError` if the directory can't be reached.
+    """
+    
+    characters = ROOM_ID_CHARACTERS
+    index, count = room_id_shard
+    first_characters = characters[index::count]
+    random_string = random.choice(first_characters) + ''.join(random.choice(characters) for i in range(5))
+    
+    try_count = 0
+    while random_string in id_to_room.keys() or not directory.claim_room(random_string, this_node["node_id"]):
+        try_count += 1
+        if try_count > 100:
+            return None
+        random_string = random.choice(first_characters) + ''.join(random.choice(characters) for i in range(5))
+
+    return random_string
+
+def room_shard(room_id: str, count: int) -> int:
+    """
+    The index of the worker that created `room_id`, out of `count` workers (see `room_id_shard`),
+    or `None` if it isn't a valid room ID.
+    """
+    
+    if not room_id or room_id[0] not in ROOM_ID_CHARACTERS:
+        return None
+    return ROOM_ID_CHARACTERS.index(room_id[0]) % count
+
+def release_room_id(room_id: str) -> None:
+    """
+    Gives a deleted room's ID back to the room `directory`.
+    """
+    
+    try:
+        directory.release_room(room_id, this_node["node_id"])
+    except OSError as e:
+        print(f"\x1b[31mCould not release room {room_id} in the room directory: {e}\x1b[0m")
+
+def redirect(node: dict, message: str) -> dict:
+    """
+    The response telling a client to reconnect to another server (see `make_node`) and send its request there.
+    """
+    endpoint = {key: value for key, value in node.items() if key != "load"}
+    return {"success": False, "message": message, "endpoint": endpoint}
+
+# REST API endpoints - for room system
+def checkroom(room_id: str):
+    if room_id in id_to_room.keys():
+        return {"available": False}
+    
+    try:
+        return {"available": directory.room_node(room_id) is None}
+    except OSError:
+        return {"available": False} # can't tell
+    
+def joinroom(client_id: str, room_id: str):
+    if room_id not in id_to_room.keys():
+        # the room might be on another server
+        try:
+            node = directory.room_node(room_id)
+        except OSError:
+            return {"success": False, "message": "The room directory is unavailable, please try again later."}
+        
+        if node is not None and node["node_id"] != this_node["node_id"]:
+            return redirect(node, f"Room {room_id} is on another server.")
+        
+        return {"success": False, "message": "The requested room does not exist."}
+
+    # Check if user is already connected and present in a room
+    if client_id in id_to_client.keys():
+        if id_to_client[client_id].room_id is not None:
+            return {"success": False, "message": f"You are already connected to room {id_to_client[client_id].room_id}!"}
+        
+        if id_to_room[room_id].started:
+            return {"success": False, "message": f"Room {room_id} has already started!"}
+        
+        room = id_to_room[room_id]
+        if len(room.clients) >= room.capacity: 
+            # "disconnected" clients still count towards the max 
+            return {"success": False, "message": f"Room {room_id} is full! ({room.capacity} max)"}
+        
+        else:
+            id_to_client[client_id].room_id = room_id
+            
+            this_player_info = room.add_client(id_to_client[client_id])
+            
+            return {
+                "success": True, 
+                "map_data": room.world.get_map_data(),
+                # every player in the room (including the user themselves), for the lobby display
+                "players": room.lobby_players(),
+                "code": room_id,
+                "username": this_player_info["username"],
+                "color": this_player_info["color"],
+                "livery": this_player_info["livery"],
+            }
+
+    else:
+        return {"success": False, "message": "Socket must be registered first (try restarting your game)."}
+
+def leaveroom(client_id: str):
+    client = id_to_client.get(client_id)
+    
+    if not client:
+        return {"success": False, "message": "Socket must be registered first (try restarting your game)."}
+    
+    room_id = client.room_id
+    if room_id == None:
+        return {"success": False, "message": "You are not currently in a room."}
+    
+    room = id_to_room.get(room_id)
+    
+    # If the client is the host, disband the room
+    if client.hosting is room or (room.num_connected() == 1):
+        room.disband()
+        del id_to_room[room_id] # use del to trigger the __del__ method of the room (which handles telling all clients to disconnect)
+        release_room_id(room_id)
+        return {"success": True, "message": f"Successfully disbanded room {room_id}."}
+    
+    room.remove_client(id_to_client[client_id])
+    
+    # if nobody is left in the room and room.ended is True, delete the room
+    if room.num_connected() == 0 and room.ended:
+        del id_to_room[room_id]
+        release_room_id(room_id)
+    
+    client.room_id = None
+    return {"success": True, "message": f"Successfully left room {room_id}."}
+
+def createroom(client_id: str):
+    # Required to have already completed initial handshake with socket
+    client: typing.Union[client_room.Client, None] = id_to_client.get(client_id)
+    if not client:
+        return {"success": False, "message": "Client has not completed initial socket handshake (try restarting your game)."}
+    
+    try:
+        # send the room to a less busy server, if there is one
+        node = directory.pick_node(this_node["node_id"])
+        if node is not None:
+            return redirect(node, "This server is busy, creating the room on another one.")
+        
+        # Generate room id
+        id = gen_room_id()
+    except OSError:
+        return {"success": False, "message": "The room directory is unavailable, please try again later."}
+
+    if id is None:
+        return {"success": False, "message": "Somehow, no rooms are available!"}
+    
+    # If client exists, set its room
+    client.room_id = id
+
+    # Create room object
+    room = client_room.Room(client, [client], id)
+    id_to_room[id] = room    
+    client.hosting = room # mark this client as the host of this room
+
+    # Return the code
+    return {
+        "success": True, 
+        "code": f"{id}",
+        "map_data": room.world.get_map_data(),
+        "player_data": { # return the user themselves
+            "username": room.clients[client_id]["username"],
+            "color": room.clients[client_id]["color"],
+            "livery": room.clients[client_id]["livery"],
+            "is_host": True
+        }
+    }
+
+def startgame(client_id: str, room_id: str):
+    # First, verify that client_id is currently in AND IS THE HOST of room_id
+    client = id_to_client.get(client_id)
+    
+    if not client or not client.hosting.id == room_id:
+        # error unauthenticated
+        return {"success": False, "message": "Unauthorized attempt to start game"}
+    
+    # They are the host of the room, Mark the room as started
+    room = id_to_room.get(room_id)
+    if not room:
+        return {"success": False, "message": f"Room {room_id} does not exist."}
+    
+    room.start_game(countdown_scheduler)
+    return {"success": True, "message": f"Room {room_id} marked as started and recv loops initiated."}
+
+ROUTES = [
+    ("/checkroom/<string:room_id>", checkroom),
+    ("/joinroom/<string:client_id>/<string:room_id>", joinroom),
+    ("/leaveroom/<string:client_id>", leaveroom),
+    ("/createroom/<string:client_id>", createroom),
+    ("/startgame/<string:client_id>/<string:room_id>", startgame),
+]
+"""
+Every HTTP endpoint of the room system, as `(rule, view function)`.
+Rules use flask's syntax. Every view function returns a JSON-serializable dict.
+"""
@@ -1,8 +1,10 @@
-from typing import List
-from CONSTANTS import MAPS
-import random
+from bisect import bisect_right
+from types import MappingProxyType
+from typing import NamedTuple, Sequence
+from track import CompiledTrack, compile_curves
+from map_format import SegmentTable
 
-class CurveSegment:
+class CurveSegment(NamedTuple):
     """
     A struct that represents a curved segment of the track
     
@@ -14,13 +16,14 @@ class CurveSegment:
     - When the player's `x` position reaches `end_x`, the track should be rendered straight again.
     
     Positive angles make the track curve to the right, and negative angles make the track curve to the left.
+    
+    Immutable, like the `GameMap` it belongs to.
     """
     
-    def __init__(self, start_x: int, mid_x: int, end_x: int, theta_f: int):
-        self.start_x = start_x
-        self.mid_x = mid_x
-        self.end_x = end_x
-        self.theta_f = theta_f
+    start_x: int
+    mid_x: int
+    end_x: int
+    theta_f: int
         
     def angle_at(self, pos_x: int) -> int:
         """
@@ -44,20 +47,22 @@ class GameMap:
     Represents a racetrack object and its information, such as length and world record time.
     """
     
-    def __init__(self, map_name: str = None):
-        """
-        Creates a new GameMap object. If no map name is provided, a random map is picked.
+    def __init__(self, map_name: str, map_data: dict, segments: Sequence[CurveSegment], track: CompiledTrack = None):
         """
+        Creates a new GameMap object from its entry in `MAPS` and its parsed (and validated) curve segments.
         
-        if map_name is None: map_name = random.choice(list(MAPS.keys()))
+        `segments` and `track` can come straight from a compiled map file (see `./map_format.py`).
+        Otherwise, the track is compiled from the segments.
         
-        elif not map_name in MAPS.keys():
-            raise ValueError(f"Map name {map_name} not found in maps list!")
+        Maps are only created by the map registry (see `./map_registry.py`), once per map, and every room playing
+        a map shares the same object - so a `GameMap` can never be changed after it is created.
+        Reloading a map creates a new object instead, and rooms already using the old one keep it.
+        """
         
         self.map_name = map_name
-        self.map_data = MAPS[map_name]
+        self.map_data = MappingProxyType(dict(map_data))
         """
-        Format:
+        Read-only. Format:
         ```typescript
         {
           map_name: string,
@@ -71,52 +76,33 @@ class GameMap:
         ```
         """
         
-        self.segments = self.parse_map_file()
-        
-    def parse_map_file(self) -> List[CurveSegment]:
-        """
-        Parses a .map file and returns a list of CurveSegments.
-        
-        A .map file is a text file where each line represents a CurveSegment.
-        These segments should be SORTED. Since no segments can overlap, this means that
-        the start_x of each segment should be greater than the end_x of the previous segment.
-        
-        The file should be formatted as follows:
-        
-        ```
-        1 | start_x,mid_x,end_x,theta_f
-        2 | start_x,mid_x,end_x,theta_f
-        3 | ...
-        ```
-        
-        Here is an example:
-        ```
-        400,600,800,30
-        1200,1600,2000,20
-        2400,2600,2800,-30
-        ```
-        """
+        if isinstance(segments, SegmentTable):
+            self.segments = segments
+            self.segment_starts = segments.starts
+        else:
+            self.segments = tuple(segments)
+            self.segment_starts = tuple(segment.start_x for segment in self.segments)
+            """ `start_x` of every segment, for binary searches """
+        self.track = compile_curves(self.segments) if track is None else track
         
-        segments = []
+        self._frozen = True
         
-        with open(f"./server/maps/{self.map_data['map_file']}", "r") as f:
-            for line in f.readlines():
-                start_x, mid_x, end_x, theta_f = line.split(",")
-                segments.append(CurveSegment(int(start_x), int(mid_x), int(end_x), int(theta_f)))
-                
-        return segments      
+    def __setattr__(self, name: str, value) -> None:
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f"GameMap {self.map_name} is shared between rooms and can't be changed")
+        super().__setattr__(name, value)
     
     def curvesegment_at(self, pos_x: float) -> CurveSegment | None:
         """
-        Returns the CurveSegment defined at a certain x position.
+        Returns the CurveSegment defined at a certain x position (a binary search, however many segments there are).
         
         If there is no segment at that position, returns None.
         """
         
-        # since there are a small number of segments, a linear search should be fine
-        for segment in self.segments:
-            if pos_x >= segment.start_x and pos_x <= segment.end_x:
-                return segment
+        # segments are sorted, so the only one that can contain pos_x is the last one starting at or before it
+        i = bisect_right(self.segment_starts, pos_x) - 1
+        if i >= 0 and pos_x <= self.segments[i].end_x:
+            return self.segments[i]
         
         return None
     
@@ -138,28 +124,10 @@ class GameMap:
         - For the period between `S` and `Q1`, the angle is calculated linearly from `0` to `theta_f`.
         - For the period between `Q1` and `Q3`, the angle is constant at `theta_f`.
         - For the period between `Q3` and `E`, the angle is calculated linearly from `theta_f` to `0`.
-        """
         
-        curr_curvesegment = self.curvesegment_at(x_pos)
+        Exactly at `S`, `Q1`, `Q3` and `E`, the angle is the value both sides meet at.
         
-        if curr_curvesegment is None:
-            # No curvature
-            return 0
-    
-        curvesegment_rampup_length = curr_curvesegment.mid_x - curr_curvesegment.start_x
-        curvesegment_rampdown_length = curr_curvesegment.end_x - curr_curvesegment.mid_x
+        Looked up in the compiled track (see `./track.py`), so this takes constant time however many curves there are.
+        """
         
-        start = curr_curvesegment.start_x
-        q1 = curr_curvesegment.mid_x - curvesegment_rampup_length/2
-        q3 = curr_curvesegment.mid_x + curvesegment_rampdown_length/2
-        end = curr_curvesegment.end_x
-
-        if x_pos > start and x_pos < q1:
-            self.curve_percentage = (x_pos - start) / (q1 - start)
-            return curr_curvesegment.theta_f * self.curve_percentage
-        elif x_pos > q1 and x_pos < q3:
-            # just return the full angle
-            return curr_curvesegment.theta_f
-        elif x_pos > q3 and x_pos < end:
-            self.curve_percentage = (x_pos - q3) / (end - q3)
-            return curr_curvesegment.theta_f * (1 - self.curve_percentage)
\ No newline at end of file
+        return self.track.value_at(x_pos)
\ No newline at end of file
@@ -0,0 +1,53 @@
+from bisect import bisect_left, bisect_right
+from typing import FrozenSet, Iterable, List, TYPE_CHECKING
+
+from CONSTANTS import RELEVANCE_AHEAD, RELEVANCE_BEHIND, RELEVANCE_FAR
+
+if TYPE_CHECKING:
+    from world.entity import Entity
+
+class RelevanceIndex:
+    """
+    Decides which entities each client needs to hear about, from how far along the track they are.
+
+    The client only draws cars up to 300m ahead and 20m behind its own (see `RenderingManager.draw_all_other_entities`
+    on the client side), so there is no point sending it the exact state of a car 2km away 4 times a second.
+    Relative to a client's car, other entities are:
+    - **near** (`RELEVANCE_BEHIND` behind to `RELEVANCE_AHEAD` ahead, which includes some margin): sent every broadcast
+    - **far** (within `RELEVANCE_FAR` either way): only sent on some broadcasts (see `Room.broadcast_physics`)
+    - anything else: only in the low-frequency `standings` event
+
+    Built once per broadcast. Entities are sorted by track position, so each client's set is
+    found with two binary searches per tier instead of checking every entity.
+    """
+
+    def __init__(self, entities: Iterable['Entity']) -> None:
+        ordered = sorted(entities, key=lambda e: e.pos[0])
+        self.positions: List[float] = [e.pos[0] for e in ordered]
+        self.slots: List[int] = [e.slot for e in ordered]
+
+    def _between(self, lo: float, hi: float) -> List[int]:
+        return self.slots[bisect_left(self.positions, lo):bisect_right(self.positions, hi)]
+
+    def relevant_to(self, entity: 'Entity', include_far: bool) -> FrozenSet[int]:
+        """
+        Returns the slots of every entity `entity`'s client should be sent (always including its own).
+        """
+
+        x = entity.pos[0]
+
+        if include_far:
+            slots = self._between(x - RELEVANCE_FAR, x + RELEVANCE_FAR)
+        else:
+            slots = self._between(x - RELEVANCE_BEHIND, x + RELEVANCE_AHEAD)
+
+        return frozenset(slots) | {entity.slot}
+
+    def all(self) -> FrozenSet[int]:
+        return frozenset(self.slots)
+
+    def standings(self) -> List[List[float]]:
+        """
+        Returns `[[slot, pos_x], ...]` for every entity, leader first.
+        """
+        return [[slot, round(pos, 1)] for slot, pos in zip(reversed(self.slots), reversed(self.positions))]
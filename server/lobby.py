@@ -0,0 +1,80 @@
+from heapq import heappop, heappush
+from random import shuffle
+from typing import List, Set, Tuple
+
+from CONSTANTS import CAR_COLORS, SPAWN_GRID_COLUMNS, SPAWN_ROW_SPACING
+
+class LiveryPool:
+    """
+    Hands out car colors to the players of a room.
+
+    There are only `len(CAR_COLORS)` car colors (the client has an image for each), so in bigger rooms colors repeat.
+    Every player gets a `(color, livery)` pair: the first player of each color gets livery 0,
+    the next one of that color livery 1, and so on - the client shows the livery number next to repeated colors.
+
+    Pairs are numbered (`index = livery * len(CAR_COLORS) + color index`), and freed numbers are reused first,
+    smallest first, so colors stay as spread out as possible. Taking and releasing a pair are both O(log n).
+    """
+
+    def __init__(self) -> None:
+        self.freed: List[int] = []
+        """ numbers given back by `release` (a heap), reused smallest first before new ones """
+        self.next_index = 0
+
+    def take(self) -> Tuple[str, int]:
+        index = heappop(self.freed) if self.freed else self._new_index()
+        return CAR_COLORS[index % len(CAR_COLORS)], index // len(CAR_COLORS)
+
+    def release(self, color: str, livery: int) -> None:
+        heappush(self.freed, livery * len(CAR_COLORS) + CAR_COLORS.index(color))
+
+    def _new_index(self) -> int:
+        self.next_index += 1
+        return self.next_index - 1
+
+class SpawnGrid:
+    """
+    The starting grid of a room: rows of `SPAWN_GRID_COLUMNS` spots spread across the track,
+    each row `SPAWN_ROW_SPACING` meters behind the one in front of it, with enough rows for `capacity` cars.
+
+    The front rows are filled first (in a random order within each row), so a half-empty room isn't spread out
+    down the track. Taking and releasing a spot are O(1).
+    """
+
+    def __init__(self, capacity: int, track_width: float) -> None:
+        rows = -(-capacity // SPAWN_GRID_COLUMNS) # ceil
+        lane_width = track_width / SPAWN_GRID_COLUMNS
+
+        self.free: List[Tuple[float, float]] = []
+        """ Free spots, with the front row at the end (taken first) """
+
+        # back row (x=0) first, so the front row ends up at the end
+        for row in range(rows):
+            spots = [
+                (row * SPAWN_ROW_SPACING, -track_width/2 + lane_width * (column + 0.5))
+                for column in range(SPAWN_GRID_COLUMNS)
+            ]
+            shuffle(spots)
+            self.free.extend(spots)
+
+        self.taken: Set[Tuple[float, float]] = set()
+
+    def take(self) -> List[float]:
+        """
+        Returns a free spot as `[pos_x, pos_y]` (a new list, so it can be given to an entity).
+        """
+
+        spot = self.free.pop()
+        self.taken.add(spot)
+        return list(spot)
+
+    def release(self, spot: Tuple[float, float]) -> None:
+        """
+        Frees a spot returned by `take` (pass the same position back, not where the car is now).
+        """
+
+        spot = tuple(spot)
+        if spot not in self.taken: return
+
+        self.taken.remove(spot)
+        self.free.append(spot)
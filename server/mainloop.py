@@ -1,56 +1,103 @@
+import traceback
 from socket import socket
-from time import sleep, time_ns
+from time import sleep, perf_counter
 from client_room import Room, Client
+from endpoints import release_room_id
+from broadcast_rate import ServerLoad
+from scheduler import TickScheduler
 from typing import Dict
 
-from CONSTANTS import TICK_SPEED, TICKS_PER_BROADCAST
+from CONSTANTS import TICK_SPEED, BROADCAST_RATE_MAX, MAX_CATCH_UP_TICKS, STATUS_PRINT_INTERVAL
 
-def broadcast_mainloop(id_to_room: Dict[str, Room], id_to_client: Dict[str, Client]) -> None:
+server_load = ServerLoad()
+""" How busy the tick loop is. Recorded by `scheduler`, and used to pick each room's broadcast rate. """
+
+scheduler = TickScheduler(server_load)
+""" Runs physics ticks and broadcasts, each at its own rate (see `schedule_rooms`) """
+
+def tick_rooms(id_to_room: Dict[str, Room]) -> None:
+    """
+    Updates the physics of every started room by one tick.
     """
-    Sends the specified packet to all specified addresses.
-    Likely usage will be to send a packet to both (or multiple) clients connected to a room
 
-    Args:
-    addresses: list of addresses to send to
-    packet: data to send
-    sock: socket object running on server
+    for room in list(id_to_room.values()):
+        try:
+            room.update_if_started()
+        except Exception:
+            # the other rooms keep running
+            print(f"\x1b[31mRoom {room.id}: physics update failed:\x1b[0m")
+            traceback.print_exc()
+
+def broadcast_rooms(id_to_room: Dict[str, Room]) -> None:
     """
+    Sends physics data to the clients of every room that is due to broadcast (each room broadcasts
+    `room.broadcast_rate` times per second, see `./broadcast_rate.py`), and disbands rooms that have no connected clients left.
 
-    # Run stuff here
+    Runs `BROADCAST_RATE_MAX` times per second (see `schedule_rooms`), so rooms can broadcast at any rate up to that.
+    """
 
-    counter = 0
+    now = perf_counter()
+    room_rate = server_load.room_rate()
 
-    while True:
-        sleep(1 / TICK_SPEED)
+    marked_disbanded = []
+    for room in list(id_to_room.values()):
 
-        for room in id_to_room.values():
-            room.update_if_started()
+        num_connected = room.num_connected()
+        if num_connected == 0:
+            print(f"\x1b[31mDisbanding room {room.id} because it has no connected clients.\x1b[0m")
+            # disband room
+            marked_disbanded.append(room.id)
+            continue
+
+        # due within half a check period - waiting for the next check would be later than this one is early
+        if now >= room.next_broadcast_at - 0.5 / BROADCAST_RATE_MAX:
+            room.broadcast_rate = room_rate
+
+            # keep to the rate on average, but don't burst to catch up after a stall
+            room.next_broadcast_at = max(room.next_broadcast_at + 1 / room_rate, now - 1 / room_rate)
+
+            if not room.ended:
+                try:
+                    room.broadcast_physics()
+                except Exception:
+                    print(f"\x1b[31mRoom {room.id}: broadcast failed:\x1b[0m")
+                    traceback.print_exc()
+
+        if now - room.last_status_print >= STATUS_PRINT_INTERVAL:
+            room.last_status_print = now
+            print(f"\x1b[35m{room.id}\x1b[0m: {num_connected} players, started={room.started}, ended={room.ended}, broadcast_rate={room.broadcast_rate:.1f}Hz")
 
-        counter += 1    
-        if counter == TICKS_PER_BROADCAST:
-            counter = 0
-            
-            marked_disbanded = []
-            for room in id_to_room.values():
-                
-                num_connected = room.num_connected()
-                if num_connected == 0:
-                    print(f"\x1b[31mDisbanding room {room.id} because it has no connected clients.\x1b[0m")
-                    # disband room
-                    marked_disbanded.append(room.id)
-                else:
-                    print(f"\x1b[35m{room.id}\x1b[0m: {num_connected} players, started={room.started}, ended={room.ended}")
-                    
-                    if not room.ended:
-                        room.broadcast_physics()
-                    
-                    # DEBUG: print short physics info
-                    for client in room.clients.values():
-                        c: Client = client["client_obj"]
-                        print(f"\t{c.entity.color}:\x1b[33m p=[{c.entity.pos[0]:.3f},{c.entity.pos[1]:.3f}] v={c.entity.vel:.3f} a={c.entity.acc:.3f}, theta={c.entity.angle:.3f}, is_crashed={c.entity.crash_end_timestamp > time_ns()/1e9}\x1b[0m")
-            
-            # disband rooms
-            for room_id in marked_disbanded:
-                del id_to_room[room_id]
-                print(f"\x1b[31mDisbanded (deleted) empty room {room_id}.\x1b[0m")
-                                   
\ No newline at end of file
+            # DEBUG: print short physics info
+            for client in list(room.clients.values()):
+                c: Client = client["client_obj"]
+                print(f"\t{c.entity.color}:\x1b[33m p=[{c.entity.pos[0]:.3f},{c.entity.pos[1]:.3f}] v={c.entity.vel:.3f} a={c.entity.acc:.3f}, theta={c.entity.angle:.3f}, is_crashed={c.entity.crash_ticks > 0}, rate={c.broadcast_rate:.1f}Hz\x1b[0m")
+
+    # disband rooms
+    for room_id in marked_disbanded:
+        del id_to_room[room_id]
+        release_room_id(room_id)
+        print(f"\x1b[31mDisbanded (deleted) empty room {room_id}.\x1b[0m")
+
+def schedule_rooms(id_to_room: Dict[str, Room]) -> None:
+    """
+    Adds the two tasks every runtime runs to `scheduler`:
+    - `simulation`: updates physics of every room, `TICK_SPEED` times per second,
+      catching up on at most `MAX_CATCH_UP_TICKS` missed ticks at a time
+    - `broadcast`: lets every room that is due broadcast the world to its clients, `BROADCAST_RATE_MAX` times per second.
+      Missed broadcasts are never caught up - the next one supersedes them anyway
+    """
+
+    scheduler.add("simulation", 1 / TICK_SPEED, lambda: tick_rooms(id_to_room), MAX_CATCH_UP_TICKS)
+    scheduler.add("broadcast", 1 / BROADCAST_RATE_MAX, lambda: broadcast_rooms(id_to_room))
+
+def broadcast_mainloop(id_to_room: Dict[str, Room], id_to_client: Dict[str, Client]) -> None:
+    """
+    Runs forever on its own thread (threaded runtime only - see `./async_server.py` for the asyncio one).
+
+    Runs the physics ticks and broadcasts of every room (see `schedule_rooms`), sleeping until the next deadline in between.
+    """
+
+    schedule_rooms(id_to_room)
+
+    while True:
+        sleep(scheduler.run_due())
@@ -0,0 +1,68 @@
+"""
+The map compiler: validates maps and compiles them into the binary format in `./map_format.py`.
+
+Run it from the repository root after changing a `.map` file or its `MAPS` entry:
+
+```
+python server/map_compiler.py            # every map in MAPS
+python server/map_compiler.py Curvy      # just these maps
+python server/map_compiler.py --check    # only validate, don't write anything
+```
+
+Each compiled map is written to both `server/maps` and `game/maps`, next to its `.map` file.
+The server and the client load the compiled file whenever it is up to date, and parse the `.map` file otherwise.
+"""
+
+import sys
+
+from CONSTANTS import MAPS, MAPS_DIR
+from map_format import compiled_file_for, write_compiled_map
+from map_registry import parse_map_file, validate_map
+from track import compile_curves, compile_vanishing_points
+
+OUTPUT_DIRS = [MAPS_DIR, "./game/maps"]
+""" Where compiled maps are written - the server's and the client's maps folders """
+
+def compile_map(map_name: str, check_only: bool = False) -> None:
+    """
+    Validates one map from `MAPS`, and (unless `check_only`) writes its compiled file.
+    Raises `ValueError` (or `OSError`) if the map is invalid.
+    """
+
+    map_data = MAPS[map_name]
+    segments = parse_map_file(f"{MAPS_DIR}/{map_data['map_file']}")
+    validate_map(map_data, segments)
+
+    if check_only:
+        print(f"\x1b[32m{map_name}\x1b[0m: OK ({len(segments)} segments)")
+        return
+
+    angle_track = compile_curves(segments)
+    vanishing_track = compile_vanishing_points(segments)
+
+    for output_dir in OUTPUT_DIRS:
+        path = f"{output_dir}/{compiled_file_for(map_data['map_file'])}"
+        size = write_compiled_map(path, map_data, segments, angle_track, vanishing_track)
+        print(f"\x1b[32m{map_name}\x1b[0m: {len(segments)} segments -> \x1b[33m{path}\x1b[0m ({size} bytes)")
+
+def main(args: list) -> int:
+    check_only = "--check" in args
+    map_names = [arg for arg in args if not arg.startswith("--")] or list(MAPS.keys())
+
+    failed = 0
+    for map_name in map_names:
+        if map_name not in MAPS:
+            print(f"\x1b[31m{map_name}\x1b[0m: not in MAPS")
+            failed += 1
+            continue
+
+        try:
+            compile_map(map_name, check_only)
+        except (ValueError, OSError) as e:
+            print(f"\x1b[31m{map_name}\x1b[0m: {e}")
+            failed += 1
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    exit(main(sys.argv[1:]))
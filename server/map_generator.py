@@ -0,0 +1,81 @@
+"""
+Generates random tracks, of any length - for endurance races, or just for something new.
+
+Run it from the repository root, with the name of the `.map` file to write and the track's length in meters:
+
+```
+python server/map_generator.py Endurance.map 120000            # a random track
+python server/map_generator.py Endurance.map 120000 --seed 42  # the same track every time
+```
+
+The `.map` file is written to both `server/maps` and `game/maps`. To play it, add an entry for it to `MAPS`
+(in `./CONSTANTS.py`, with the same `length`) and compile it with `./map_compiler.py` - long tracks should always
+be compiled, so the client doesn't have to parse them.
+"""
+
+import random
+import sys
+from typing import List
+
+from CONSTANTS import MAPS_DIR
+from game_map import CurveSegment
+
+OUTPUT_DIRS = [MAPS_DIR, "./game/maps"]
+""" Where generated maps are written - the server's and the client's maps folders """
+
+START_STRAIGHT = 400
+""" Meters of straight track after the start line """
+FINISH_STRAIGHT = 400
+""" Meters of straight track before the finish line """
+CURVE_LENGTH = (100, 600)
+""" Range of lengths of a curve, in meters """
+STRAIGHT_LENGTH = (100, 500)
+""" Range of lengths of the straights between curves, in meters """
+CURVE_ANGLE = (10, 70)
+""" Range of the sharpness of curves (`theta_f`), in degrees, either way """
+
+def generate_segments(length: int, seed: int = None) -> List[CurveSegment]:
+    """
+    A random, valid (see `validate_map`) list of curves for a track of `length` meters.
+    The same `seed` always gives the same curves.
+    """
+
+    rng = random.Random(seed)
+    segments = []
+    start_x = START_STRAIGHT
+
+    while True:
+        curve_length = rng.randint(*CURVE_LENGTH)
+        end_x = start_x + curve_length
+        if end_x > length - FINISH_STRAIGHT:
+            break
+
+        # the sharpest point can be anywhere in the middle of the curve
+        mid_x = start_x + rng.randint(curve_length // 5, curve_length * 4 // 5)
+        theta_f = rng.randint(*CURVE_ANGLE) * rng.choice([-1, 1])
+
+        segments.append(CurveSegment(start_x, mid_x, end_x, theta_f))
+        start_x = end_x + rng.randint(*STRAIGHT_LENGTH)
+
+    return segments
+
+def main(args: list) -> int:
+    if len(args) < 2:
+        print("\x1b[31musage: python server/map_generator.py <map file> <length> [--seed <seed>]\x1b[0m")
+        return 1
+
+    map_file, length = args[0], int(args[1])
+    seed = int(args[args.index("--seed") + 1]) if "--seed" in args else None
+
+    segments = generate_segments(length, seed)
+    text = "\n".join(",".join(str(value) for value in segment) for segment in segments)
+
+    for output_dir in OUTPUT_DIRS:
+        with open(f"{output_dir}/{map_file}", "w") as f:
+            f.write(text)
+        print(f"\x1b[32m{len(segments)} segments ({length}m)\x1b[0m -> \x1b[33m{output_dir}/{map_file}\x1b[0m")
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main(sys.argv[1:]))
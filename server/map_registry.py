@@ -0,0 +1,171 @@
+import os
+import random
+import threading
+from typing import Dict, Iterable, List
+
+from CONSTANTS import MAPS, MAPS_DIR
+from game_map import CurveSegment, GameMap
+from map_format import CompiledMapFile, compiled_file_for
+
+REQUIRED_MAP_FIELDS = ["map_name", "map_file", "preview_file", "backdrop_file", "length", "width", "oob_leniency"]
+""" Every field a `MAPS` entry must have (see `GameMap.map_data`) """
+
+def parse_map_file(path: str) -> List[CurveSegment]:
+    """
+    Parses a .map file and returns a list of CurveSegments.
+
+    A .map file is a text file where each line represents a CurveSegment.
+    These segments should be SORTED. Since no segments can overlap, this means that
+    the start_x of each segment should be greater than the end_x of the previous segment.
+
+    The file should be formatted as follows (blank lines are ignored):
+
+    ```
+    1 | start_x,mid_x,end_x,theta_f
+    2 | start_x,mid_x,end_x,theta_f
+    3 | ...
+    ```
+
+    Here is an example:
+    ```
+    400,600,800,30
+    1200,1600,2000,20
+    2400,2600,2800,-30
+    ```
+
+    Raises `ValueError` if a line isn't four integers.
+    """
+
+    segments = []
+
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f.readlines(), 1):
+            if not line.strip(): continue
+
+            try:
+                start_x, mid_x, end_x, theta_f = line.split(",")
+                segments.append(CurveSegment(int(start_x), int(mid_x), int(end_x), int(theta_f)))
+            except ValueError:
+                raise ValueError(f"{path}, line {line_number}: expected start_x,mid_x,end_x,theta_f but got {line.strip()!r}")
+
+    return segments
+
+def validate_map(map_data: dict, segments: List[CurveSegment]) -> None:
+    """
+    Checks that a map makes sense: its `MAPS` entry has every field, and its segments are sorted,
+    don't overlap, are in order inside (`start_x <= mid_x <= end_x`, with `start_x < end_x`), and are on the track.
+
+    Raises `ValueError` describing the first problem found.
+    """
+
+    missing = [field for field in REQUIRED_MAP_FIELDS if field not in map_data]
+    if missing:
+        raise ValueError(f"missing fields {missing}")
+
+    previous_end = None
+    for segment in segments:
+        if not (segment.start_x <= segment.mid_x <= segment.end_x and segment.start_x < segment.end_x):
+            raise ValueError(f"{segment} is not in order (start_x <= mid_x <= end_x)")
+        if previous_end is not None and segment.start_x <= previous_end:
+            raise ValueError(f"{segment} starts before the previous segment ends ({previous_end})")
+        if segment.start_x < 0 or segment.end_x > map_data["length"]:
+            raise ValueError(f"{segment} is not on the track (0 to {map_data['length']})")
+
+        previous_end = segment.end_x
+
+def load_map(map_name: str) -> GameMap:
+    """
+    Loads one map from `MAPS`. Raises `ValueError` (or `OSError`) if it can't be loaded.
+
+    Uses the compiled map file (see `./map_compiler.py`) if there is an up to date one: it was compiled from the
+    same `MAPS` entry, and isn't older than the `.map` file. Otherwise, the `.map` file is parsed and validated.
+    """
+
+    map_data = MAPS[map_name]
+    source_path = f"{MAPS_DIR}/{map_data['map_file']}"
+    compiled_path = f"{MAPS_DIR}/{compiled_file_for(map_data['map_file'])}"
+
+    if os.path.exists(compiled_path) and (
+        not os.path.exists(source_path) or os.path.getmtime(compiled_path) >= os.path.getmtime(source_path)
+    ):
+        compiled = CompiledMapFile(compiled_path)
+
+        # already validated by the compiler
+        if compiled.metadata == map_data:
+            return GameMap(map_name, map_data, compiled.segments(CurveSegment), compiled.angle_track)
+
+        print(f"\x1b[33m{compiled_path} was compiled with different map data, parsing {source_path} instead\x1b[0m")
+
+    segments = parse_map_file(source_path)
+    validate_map(map_data, segments)
+
+    return GameMap(map_name, map_data, segments)
+
+class MapRegistry:
+    """
+    Every map in `MAPS`, loaded once (at server start, see `./server.py`) and shared by every room.
+
+    Creating a room just picks one of these (see `World.__init__`), so it never reads or parses any files.
+
+    `reload` re-reads map files on demand (the `reloadmaps` console command). It builds new `GameMap` objects
+    and swaps them in all at once, so rooms created afterwards get the new version, while rooms already
+    running keep using the one they started with, without pausing.
+    """
+
+    def __init__(self) -> None:
+        self.maps: Dict[str, GameMap] = {}
+        """ Replaced as a whole by `reload`, never changed in place """
+        self._reload_lock = threading.Lock()
+
+    def reload(self, map_names: Iterable[str] = None) -> Dict[str, str]:
+        """
+        (Re)loads `map_names` (default: every map in `MAPS`).
+
+        A map that fails to load keeps its previous version, if it had one.
+        Returns `{map_name: error message}` for every map that failed.
+        """
+
+        with self._reload_lock:
+            maps = dict(self.maps)
+            errors = {}
+
+            for map_name in (MAPS.keys() if map_names is None else map_names):
+                if map_name not in MAPS:
+                    errors[map_name] = "not in MAPS"
+                    continue
+
+                try:
+                    maps[map_name] = load_map(map_name)
+                except (ValueError, OSError) as e:
+                    errors[map_name] = str(e)
+
+            self.maps = maps
+
+        for map_name, error in errors.items():
+            print(f"\x1b[31mCould not load map {map_name}: {error}\x1b[0m")
+
+        return errors
+
+    def get(self, map_name: str = None) -> GameMap:
+        """
+        Returns the shared `GameMap` for `map_name`. If no map name is provided, a random map is picked.
+
+        Maps are loaded on first use if `reload` hasn't been called yet (for scripts that don't start a server).
+        """
+
+        if not self.maps:
+            self.reload()
+
+        maps = self.maps
+
+        if map_name is None:
+            if not maps: raise ValueError("No maps could be loaded!")
+            return random.choice(list(maps.values()))
+
+        if map_name not in maps:
+            raise ValueError(f"Map name {map_name} not found in maps list!")
+
+        return maps[map_name]
+
+map_registry = MapRegistry()
+""" The maps of this server process """
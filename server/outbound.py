@@ -0,0 +1,137 @@
+import threading
+from collections import deque
+from time import perf_counter
+from typing import Deque, List
+
+from CONSTANTS import OUTBOUND_QUEUE_MAX_BYTES
+
+class OutboundQueue:
+    """
+    A bounded queue of frames waiting to be written to one client's socket.
+
+    Senders (the tick thread, HTTP handlers, the reactor) only ever append to the queue and then write
+    as much as the socket accepts *without blocking* (see `write_to`). Whatever the socket doesn't take
+    stays here until the runtime sees the socket become writable again, so a client with a full
+    TCP send buffer can't stall physics for everyone else.
+
+    ### Overflow policy:
+    - Physics snapshots are *droppable*: each one supersedes the last, so queueing a new one removes
+      any older snapshot that hasn't started sending yet (the client just misses a delta - see `./snapshot.py`)
+    - Events are never dropped
+    - If the queue is still over `max_bytes` after dropping every unsent snapshot, `push` returns `False`
+      and the client should be disconnected
+    """
+
+    def __init__(self, max_bytes: int = OUTBOUND_QUEUE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+
+        self.frames: Deque[List] = deque()
+        """ `[frame bytes, droppable]` in send order """
+        self.offset = 0
+        """ How many bytes of `frames[0]` have already been written """
+        self.queued_bytes = 0
+        """ Unwritten bytes across all queued frames (the queue's current depth) """
+
+        self.peak_bytes = 0
+        """ Largest `queued_bytes` seen so far """
+        self.dropped = 0
+        """ Number of stale snapshots dropped so far """
+        self.backlogged_since: float = None
+        """ `perf_counter()` time at which the queue last went from empty to non-empty after a write, or `None` if empty """
+
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def pending(self) -> bool:
+        return bool(self.frames)
+
+    def push(self, frame: bytes, droppable: bool = False) -> bool:
+        """
+        Queues a frame. If `droppable`, older droppable frames that haven't started sending are removed first.
+
+        Returns `False` if the queue overflowed (only undroppable frames are left and they exceed `max_bytes`).
+        """
+
+        with self.lock:
+            if droppable:
+                self._drop_stale()
+
+            self.frames.append([frame, droppable])
+            self.queued_bytes += len(frame)
+
+            if self.queued_bytes > self.max_bytes:
+                self._drop_stale()
+
+            self.peak_bytes = max(self.peak_bytes, self.queued_bytes)
+            return self.queued_bytes <= self.max_bytes
+
+    def _drop_stale(self) -> None:
+        # frames[0] may be partly written already, and must be finished to keep the stream intact
+        keep = deque()
+        for i, (frame, droppable) in enumerate(self.frames):
+            if droppable and not (i == 0 and self.offset):
+                self.queued_bytes -= len(frame)
+                self.dropped += 1
+            else:
+                keep.append([frame, droppable])
+        self.frames = keep
+
+    def write_to(self, sock) -> bool:
+        """
+        Writes queued frames to `sock` until it is empty or the socket would block. `sock` must be non-blocking.
+
+        Returns `True` if anything is still pending. Connection errors are raised to the caller.
+        """
+
+        with self.lock:
+            while self.frames:
+                frame = self.frames[0][0]
+                try:
+                    sent = sock.send(memoryview(frame)[self.offset:])
+                except (BlockingIOError, InterruptedError):
+                    break
+
+                self.offset += sent
+                self.queued_bytes -= sent
+                if self.offset < len(frame): break # socket buffer is full
+
+                self.frames.popleft()
+                self.offset = 0
+
+            if not self.frames:
+                self.backlogged_since = None
+            elif self.backlogged_since is None:
+                self.backlogged_since = perf_counter()
+
+            return bool(self.frames)
+
+    def take_unsent(self) -> bytes:
+        """
+        Empties the queue, and returns every byte that hasn't been written yet, in order
+        (for handing the connection over to another process, see `./sharding.py`).
+        """
+
+        with self.lock:
+            unsent = b"".join(bytes(frame) for frame, _ in self.frames)[self.offset:]
+            self.frames.clear()
+            self.offset = 0
+            self.queued_bytes = 0
+            self.backlogged_since = None
+            return unsent
+
+    def backlog_age(self) -> float:
+        """
+        How many seconds the queue has gone without fully draining (0 if it is empty).
+        """
+        since = self.backlogged_since
+        return 0 if since is None else perf_counter() - since
+
+    def stats(self) -> dict:
+        return {
+            "frames": len(self.frames),
+            "bytes": self.queued_bytes,
+            "peak_bytes": self.peak_bytes,
+            "dropped": self.dropped,
+        }
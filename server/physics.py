@@ -0,0 +1,89 @@
+"""
+The car physics, shared by the server and the client.
+
+Every step advances exactly `DT` seconds, however long it actually took to run, and only depends on its arguments
+(no clocks, no randomness), so the same start state and the same key presses on the same ticks always give
+bit-identical results. That's what lets the client replay its inputs on top of the server's state (prediction),
+and lets the server catch up on missed ticks.
+
+Python floats are IEEE 754 doubles, and the operations here always run in the same order. The only thing that can
+differ between machines is the last bit of `math.sin`/`math.cos`, which come from the platform's C library.
+
+### This file must be identical on the server and client side (`server/physics.py` and `game/physics.py`)
+"""
+
+import math
+from typing import Callable, Sequence, Tuple
+
+TICK_RATE = 24
+""" Physics steps per second (the server's `TICK_SPEED`) """
+DT = 1 / TICK_RATE
+""" Seconds advanced by every physics step """
+
+State = Tuple[float, float, float, float, float]
+""" `(pos_x, pos_y, vel, acc, angle)` """
+
+def step(
+    pos_x: float, pos_y: float, vel: float, angle: float,
+    keys: Sequence[bool], angle_at: Callable[[float], float], dt: float = DT
+    ) -> State:
+    """
+    Advances one car by `dt` seconds (one tick, unless given) with `keys` held, and returns its new `(pos_x, pos_y, vel, acc, angle)`.
+
+    `keys` is `[forward, backward, left, right]`, and `angle_at(pos_x)` is the track's angle at `pos_x` (see `GameMap.angle_at`).
+
+    If the track is curved at the car's x-position, then position is updated with the car's relative angle (`angle - track_angle`).
+    For example, if the car has an angle of -10 degrees (turned left), but the track is curved at 30 degrees
+    (going right) at that x-pos, then position is updated similar to as follows:
+
+    ```python
+    x_position += velocity * cos(radians(-10-30)) * dt
+    y_position += velocity * sin(radians(-10-30)) * dt
+    ```
+
+    which would result in them drifting to the left side of the track.
+    """
+
+    # update angle
+    # formula for turn resistance: factor = -(0.01*vel-1)**2 + 1 (0x at vel=0, 1x at vel=100, 0x at vel=200)
+    turn_resistance_factor = -(0.01*vel-1)**2 + 1
+    angle += (keys[3] - keys[2]) * 50 * turn_resistance_factor * dt
+    angle %= 360
+
+    # clamp angle to 270-360 and 0-90 only
+    if angle>=180 and angle<270:
+        angle = 270
+    elif angle<180 and angle>90:
+        angle = 90
+
+    # if w is held down, set x acceleration to 10- sqrt vel <- ensures no acc at v=100m/s
+    # if s is held down, set x acceleration to -10, other handling ensures that velocity will stay between 0 and 100 m/s
+    # if neither or both, set x acceleration to - sqrt vel <- simulates drag and high air resistance at higher speeds
+    if keys[1] and not keys[0]:
+        acc = -10
+    elif keys[0] and not keys[1]:
+        acc = 10 - math.sqrt(vel)
+    else:
+        acc = -math.sqrt(vel)
+
+    # update velocity with with methods to guarantee it's within the ranges of 0-100
+    vel = max(0, min(vel + acc * dt, 100))
+
+    #adjusting angular accel value to slow turning at higher speeds
+    denominator = 0.4 * vel + 2.22
+    #value that changes how much a person can turn based on speed
+    angular_accel = 10/denominator + .5
+
+    # update positions
+    #angle change now involves speed with mod 360 to reset angle
+    relative_angle = (angle + angular_accel * dt - (angle_at(pos_x) or 0)) % 360
+    pos_x += vel * math.cos(math.radians(relative_angle)) * dt
+    pos_y += vel * math.sin(math.radians(relative_angle)) * dt
+
+    return pos_x, pos_y, vel, acc, angle
+
+def ticks_for(seconds: float) -> int:
+    """
+    The number of whole ticks closest to `seconds`.
+    """
+    return round(seconds * TICK_RATE)
@@ -0,0 +1,302 @@
+import selectors
+import socket
+import threading
+import traceback
+from uuid import uuid4
+from typing import Callable, Dict, List, Set
+
+from client_room import Client
+from udp_channel import UDPChannel
+
+class NetworkReactor:
+    """
+    Multiplexes the listening socket and every connected client socket on a single thread.
+
+    This replaces the old setup of one accept thread plus one blocking `recv` thread per player.
+    The selector (epoll on linux) tells us which sockets are readable, so none of the reads below can block,
+    and the number of threads stays constant no matter how many clients are connected.
+
+    ### Connection lifecycle:
+    - The listening socket becomes readable -> `_on_accept` accepts the connection and creates a `Client` for it
+    - Every read is fed to that client's `FrameDecoder` (one read can hold any number of frames)
+    - The first frame must be a username -> `Client.complete_handshake` sends back its id, and the client is registered
+    - From then on, every frame is handed to `Client.handle_message`, which keeps the latest input for the next tick
+    - Sends are queued per client (see `./outbound.py`) and written without blocking. If a socket can't take
+      everything, `Client.on_backlog` asks the reactor to also wait for it to become writable, and the rest
+      is written from here (this is the only cross-thread call, so it wakes `select` through a socket pair)
+    - If the socket closes or errors, it is unregistered and `Client.sock` is set to `None`
+      (rooms will then clean the client up in `Room.num_connected`)
+
+    If given a UDP socket, every datagram it receives is passed to `udp_channel` (see `./udp_channel.py`).
+
+    Clients can also be moved between reactors (and processes) after their handshake, with `detach` and `adopt`
+    (see `./sharding.py`). A reactor without a listening socket only ever gets its clients that way.
+    """
+
+    def __init__(self, listen_sock: socket.socket, id_to_client: Dict[str, Client], udp_sock: socket.socket = None, udp_channel: UDPChannel = None) -> None:
+        self.selector = selectors.DefaultSelector()
+        self.listen_sock = listen_sock
+        self.id_to_client = id_to_client
+        """ Shared with `server.py` - every client that completes the handshake is added here. """
+
+        if listen_sock is not None:
+            self.listen_sock.setblocking(False)
+            self.selector.register(self.listen_sock, selectors.EVENT_READ, self._on_accept)
+
+        # other threads write a byte to `_wake_w` to interrupt `select` (see `want_write`)
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self.selector.register(self._wake_r, selectors.EVENT_READ, self._on_wake)
+
+        self.udp_channel = udp_channel
+        if udp_sock is not None:
+            udp_sock.setblocking(False)
+            udp_channel.sendto = udp_sock.sendto
+            self.selector.register(udp_sock, selectors.EVENT_READ, self._on_datagram)
+
+        self._want_write: Set[Client] = set()
+        """ Clients with a backlog whose sockets should also be watched for writability """
+        self._calls: List[Callable[[], None]] = []
+        """ Functions other threads asked to run on the reactor thread (see `_call`) """
+        self._want_write_lock = threading.Lock()
+
+        self._running = False
+
+    def run(self) -> None:
+        """
+        Runs the event loop forever (until `stop()` is called). Intended to be the target of a single thread.
+        """
+
+        self._running = True
+        while self._running:
+            for key, mask in self.selector.select(timeout=1):
+                # every registered fileobj carries its handler as `data`
+                try:
+                    key.data(key.fileobj, mask)
+                except Exception:
+                    # one misbehaving client must not take every other one down with this thread
+                    traceback.print_exc()
+                    self._drop(key.fileobj)
+
+    def _drop(self, conn) -> None:
+        """
+        Disconnects whichever client `conn` belongs to, after its handler raised. The reactor's own sockets are kept.
+        """
+
+        try:
+            handler = self.selector.get_key(conn).data
+        except (KeyError, ValueError):
+            return # the handler already let go of it
+
+        if conn in (self.listen_sock, self._wake_r) or handler == self._on_datagram:
+            return
+
+        cli = next((c for c in list(self.id_to_client.values()) if c.sock is conn), None)
+        if cli is not None:
+            print(f"\x1b[34mClient\x1b[33m {cli.id}\x1b[31m: Dropped after an error\x1b[0m")
+            self._disconnect(conn, cli)
+            return
+
+        # still in its handshake, so not in `id_to_client` yet
+        self.selector.unregister(conn)
+        conn.close()
+
+        self.selector.close()
+        self._wake_r.close()
+        self._wake_w.close()
+
+    def stop(self) -> None:
+        """
+        Stops the event loop after the current iteration (at most ~1 second later).
+        """
+        self._running = False
+
+    def want_write(self, cli: Client) -> None:
+        """
+        Asks the reactor to write the rest of `cli`'s outbound queue once its socket is writable.
+        Safe to call from any thread (this is each client's `on_backlog`).
+        """
+
+        with self._want_write_lock:
+            self._want_write.add(cli)
+
+        self._wake()
+
+    def adopt(self, cli: Client) -> None:
+        """
+        Starts handling a client that completed its handshake somewhere else (`cli.sock` must be open).
+        Any complete frames left in its decoder are handled first.
+
+        Safe to call from any thread: it waits until the reactor thread has registered the client,
+        so it is in `id_to_client` by the time this returns.
+        """
+
+        registered = threading.Event()
+
+        def register() -> None:
+            try:
+                cli.sock.setblocking(False)
+                cli.on_backlog = self.want_write
+                self.id_to_client[cli.id] = cli
+                self.selector.register(cli.sock, selectors.EVENT_READ, lambda c, mask: self._on_client_event(c, mask, cli))
+
+                for msg_type, payload in cli.decoder.feed(b""):
+                    cli.handle_message(msg_type, payload)
+
+                if cli.outbound.pending():
+                    self._set_writable_interest(cli, True)
+            finally:
+                registered.set()
+
+        self._call(register)
+        registered.wait()
+
+    def detach(self, cli: Client) -> socket.socket:
+        """
+        Stops handling `cli` without closing its connection, and returns its socket (or `None` if it already disconnected).
+        Anything it sent that was read but isn't a complete frame yet stays in `cli.decoder`.
+
+        Safe to call from any thread: it waits until the reactor thread has let go of the socket.
+        """
+
+        detached = threading.Event()
+        result = []
+
+        def unregister() -> None:
+            conn = cli.sock
+            if conn is not None:
+                try:
+                    self.selector.unregister(conn)
+                    result.append(conn)
+                except (KeyError, ValueError):
+                    pass
+                cli.sock = None
+
+            if self.id_to_client.get(cli.id) is cli:
+                del self.id_to_client[cli.id]
+            detached.set()
+
+        self._call(unregister)
+        detached.wait()
+        return result[0] if result else None
+
+    def _call(self, function: Callable[[], None]) -> None:
+        """
+        Runs `function` on the reactor thread, as soon as it wakes up.
+        """
+
+        with self._want_write_lock:
+            self._calls.append(function)
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            pass # plenty of wakeups are already pending
+
+    def _on_wake(self, wake_sock: socket.socket, mask: int) -> None:
+        try:
+            while wake_sock.recv(4096): pass
+        except BlockingIOError:
+            pass
+
+        with self._want_write_lock:
+            clients, self._want_write = self._want_write, set()
+            calls, self._calls = self._calls, []
+
+        for function in calls:
+            function()
+
+        for cli in clients:
+            self._set_writable_interest(cli, True)
+
+    def _set_writable_interest(self, cli: Client, interested: bool) -> None:
+        conn = cli.sock
+        if conn is None: return
+
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if interested else 0)
+        try:
+            key = self.selector.get_key(conn)
+            if key.events != events:
+                self.selector.modify(conn, events, key.data)
+        except (KeyError, ValueError):
+            pass # already disconnected
+
+    def _on_datagram(self, udp_sock: socket.socket, mask: int) -> None:
+        while True:
+            try:
+                data, addr = udp_sock.recvfrom(65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue # e.g. ICMP port unreachable from an earlier send, reported on linux as ECONNREFUSED
+
+            self.udp_channel.handle_datagram(data, addr)
+
+    def _on_accept(self, listen_sock: socket.socket, mask: int) -> None:
+        try:
+            conn, address = listen_sock.accept()
+        except BlockingIOError:
+            return # another wakeup already took this connection
+
+        print(f"\x1b[36mConnection established\x1b[0m from: \x1b[33m{address}\x1b[0m")
+
+        # sends must never block the thread they're called from (see `Client.flush`)
+        conn.setblocking(False)
+
+        # Create a Client object for the connection with a generated ID (sort of like an auth cookie).
+        # It has no username yet, and is only added to `id_to_client` once the handshake completes.
+        cli = Client(conn, host=address[0], port=address[1], id=uuid4().hex)
+        cli.on_backlog = self.want_write
+        self.selector.register(conn, selectors.EVENT_READ, lambda c, mask: self._on_client_event(c, mask, cli))
+
+    def _disconnect(self, conn: socket.socket, cli: Client) -> None:
+        self.selector.unregister(conn)
+        conn.close()
+        cli.sock = None
+        if cli.udp is not None: cli.udp.forget(cli)
+        print(f"\x1b[34mStopped receiving from Client \x1b[33m{cli.id}\x1b[0m!\x1b[0m")
+
+    def _on_client_event(self, conn: socket.socket, mask: int, cli: Client) -> None:
+        if mask & selectors.EVENT_WRITE:
+            cli.flush()
+            self._set_writable_interest(cli, cli.outbound.pending())
+
+        if mask & selectors.EVENT_READ:
+            self._on_client_readable(conn, cli)
+
+    def _on_client_readable(self, conn: socket.socket, cli: Client) -> None:
+        data = None
+        try:
+            data = conn.recv(65536)
+        except BlockingIOError:
+            return # spurious wakeup
+        except (ConnectionAbortedError, ConnectionResetError):
+            print(f"\x1b[34mClient\x1b[33m {cli.id}\x1b[31m: Connection aborted!\x1b[0m")
+
+        if not data:
+            # empty read means the peer closed the connection
+            self._disconnect(conn, cli)
+            return
+
+        try:
+            frames = cli.decoder.feed(data)
+        except ValueError as e:
+            print(f"\x1b[34mClient\x1b[33m {cli.id}\x1b[31m: Corrupt stream ({e})\x1b[0m")
+            self._disconnect(conn, cli)
+            return
+
+        for msg_type, payload in frames:
+            if cli.username is None:
+                # IMPORTANT - the client side's `socket_man.connect()` sends a username frame before anything else
+                if not cli.complete_handshake(msg_type, payload):
+                    print(f"\x1b[31mClient at \x1b[33m{cli.address}\x1b[31m did not start with a username\x1b[0m")
+                    self._disconnect(conn, cli)
+                    return
+
+                self.id_to_client[cli.id] = cli
+                continue
+
+            cli.handle_message(msg_type, payload)
@@ -0,0 +1,248 @@
+"""
+The room directory: which server owns each room code, and how busy each server is.
+
+With one server, this is just a dict (`InMemoryRoomDirectory`). To run several servers together (behind one HTTP
+entry point, or on several machines), they all share one directory service instead:
+
+```
+python server/room_directory.py                          # the directory service, on DIRECTORY_PORT
+python server/server.py --directory localhost:3990              # a server, on the default ports
+python server/server.py --directory localhost:3990 --port 4010  # another one (TCP 4010, HTTP 4011)
+```
+
+- Room codes are claimed in the directory before a room is created (see `gen_room_id`), so no two servers create the same one.
+- `joinroom` for a room on another server replies with that server's endpoint (see `make_node`) instead of joining,
+  and the client reconnects there.
+- Every server publishes its load every `DIRECTORY_PUBLISH_INTERVAL` seconds (see `publish_forever`), and `createroom`
+  sends clients to another server if it has at least `DIRECTORY_REBALANCE_MARGIN` fewer connected clients (see `pick_node`).
+
+Any other shared store can be plugged in by implementing `RoomDirectory`.
+"""
+
+import json
+import socket
+import socketserver
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List
+
+from CONSTANTS import DIRECTORY_PORT, DIRECTORY_PUBLISH_INTERVAL, DIRECTORY_NODE_TIMEOUT, DIRECTORY_REBALANCE_MARGIN
+
+def make_node(host: str, port: int, udp_port: int = None) -> dict:
+    """
+    Describes a server (a "node") as clients need to reach it:
+    ```typescript
+    {
+      node_id: string,
+      host: string,
+      port: number, // socket port
+      udp_port: number | null, // null if the server has no UDP channel
+      http_url: string, // where its HTTP endpoints are (always on port+1)
+    }
+    ```
+    """
+
+    return {
+        "node_id": f"{host}:{port}",
+        "host": host,
+        "port": port,
+        "udp_port": udp_port,
+        "http_url": f"http://{host}:{port+1}",
+    }
+
+class RoomDirectory(ABC):
+    """
+    The interface every room directory implements. Servers and rooms are identified by `node_id` and room code.
+
+    Methods can raise `OSError` if the directory can't be reached.
+    """
+
+    @abstractmethod
+    def publish(self, node: dict, load: dict) -> None:
+        """
+        Registers `node` (see `make_node`) if needed, and records its load: `{clients: number, rooms: number, tick_load: number}`.
+        """
+
+    @abstractmethod
+    def nodes(self) -> List[dict]:
+        """
+        Every live node (one that published within `DIRECTORY_NODE_TIMEOUT` seconds), with its latest load as `load`.
+        """
+
+    @abstractmethod
+    def claim_room(self, room_id: str, node_id: str) -> bool:
+        """
+        Reserves `room_id` for `node_id`. Returns `False` if another live node already has it.
+        """
+
+    @abstractmethod
+    def release_room(self, room_id: str, node_id: str) -> None:
+        """
+        Frees `room_id`, if `node_id` has it.
+        """
+
+    @abstractmethod
+    def room_node(self, room_id: str) -> dict:
+        """
+        The live node that has `room_id`, or `None`.
+        """
+
+    def pick_node(self, node_id: str) -> dict:
+        """
+        Where a new room should go: the least loaded live node, if it has at least `DIRECTORY_REBALANCE_MARGIN`
+        fewer connected clients than `node_id`. Otherwise `None` (keep it on `node_id`).
+        """
+
+        nodes = {node["node_id"]: node for node in self.nodes()}
+        if node_id not in nodes: return None
+
+        least_loaded = min(nodes.values(), key=lambda node: (node["load"]["clients"], node["load"]["tick_load"]))
+        if least_loaded["load"]["clients"] + DIRECTORY_REBALANCE_MARGIN <= nodes[node_id]["load"]["clients"]:
+            return least_loaded
+        return None
+
+class InMemoryRoomDirectory(RoomDirectory):
+    """
+    A room directory in this process's memory: enough for one server, and what the directory service keeps.
+    """
+
+    def __init__(self) -> None:
+        self.node_info: Dict[str, dict] = {}
+        """ `{node_id: node}`, each with its latest `load` and `last_seen` (`time.monotonic()`) """
+        self.room_owner: Dict[str, str] = {}
+        """ `{room_id: node_id}` """
+        self.lock = threading.Lock()
+
+    def _alive(self, node_id: str) -> bool:
+        node = self.node_info.get(node_id)
+        return node is not None and time.monotonic() - node["last_seen"] < DIRECTORY_NODE_TIMEOUT
+
+    def publish(self, node: dict, load: dict) -> None:
+        with self.lock:
+            self.node_info[node["node_id"]] = dict(node, load=load, last_seen=time.monotonic())
+
+    def nodes(self) -> List[dict]:
+        with self.lock:
+            return [
+                {key: value for key, value in node.items() if key != "last_seen"}
+                for node_id, node in self.node_info.items() if self._alive(node_id)
+            ]
+
+    def claim_room(self, room_id: str, node_id: str) -> bool:
+        with self.lock:
+            owner = self.room_owner.get(room_id)
+            if owner is not None and owner != node_id and self._alive(owner):
+                return False
+
+            self.room_owner[room_id] = node_id
+            return True
+
+    def release_room(self, room_id: str, node_id: str) -> None:
+        with self.lock:
+            if self.room_owner.get(room_id) == node_id:
+                del self.room_owner[room_id]
+
+    def room_node(self, room_id: str) -> dict:
+        with self.lock:
+            owner = self.room_owner.get(room_id)
+            if owner is None or not self._alive(owner):
+                return None
+            return {key: value for key, value in self.node_info[owner].items() if key not in ("load", "last_seen")}
+
+class RemoteRoomDirectory(RoomDirectory):
+    """
+    A room directory served by the directory service (see `DirectoryServer`), shared by every server using it.
+
+    Each call is one request: a line of JSON `{"method": ..., "args": [...]}`, answered by a line of JSON `{"result": ...}`.
+    The connection is opened on first use (so worker processes forked later each get their own, see `./sharding.py`),
+    and reopened after errors.
+    """
+
+    def __init__(self, host: str, port: int = DIRECTORY_PORT) -> None:
+        self.address = (host, port)
+        self.sock: socket.socket = None
+        self.reader = None
+        self.lock = threading.Lock()
+
+    def _request(self, method: str, *args):
+        with self.lock:
+            try:
+                if self.sock is None:
+                    self.sock = socket.create_connection(self.address, timeout=2)
+                    self.reader = self.sock.makefile("rb")
+
+                self.sock.sendall(json.dumps({"method": method, "args": args}).encode() + b"\n")
+                line = self.reader.readline()
+                if not line:
+                    raise ConnectionResetError("room directory closed the connection")
+                return json.loads(line)["result"]
+            except OSError:
+                if self.sock is not None: self.sock.close()
+                self.sock = None
+                raise
+
+    def publish(self, node: dict, load: dict) -> None:
+        self._request("publish", node, load)
+
+    def nodes(self) -> List[dict]:
+        return self._request("nodes")
+
+    def claim_room(self, room_id: str, node_id: str) -> bool:
+        return self._request("claim_room", room_id, node_id)
+
+    def release_room(self, room_id: str, node_id: str) -> None:
+        self._request("release_room", room_id, node_id)
+
+    def room_node(self, room_id: str) -> dict:
+        return self._request("room_node", room_id)
+
+class DirectoryServer(socketserver.ThreadingTCPServer):
+    """
+    The directory service: serves an `InMemoryRoomDirectory` to `RemoteRoomDirectory`s.
+    A stand-in for a real shared store - it keeps everything in memory, so restarting it forgets every room.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    METHODS = ["publish", "nodes", "claim_room", "release_room", "room_node"]
+
+    def __init__(self, host: str, port: int = DIRECTORY_PORT) -> None:
+        self.directory = InMemoryRoomDirectory()
+        super().__init__((host, port), DirectoryRequestHandler)
+
+class DirectoryRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            request = json.loads(line)
+            if request["method"] not in DirectoryServer.METHODS: return
+
+            result = getattr(self.server.directory, request["method"])(*request["args"])
+            self.wfile.write(json.dumps({"result": result}).encode() + b"\n")
+
+def publish_forever(directory: RoomDirectory, node: dict, get_load: Callable[[], dict]) -> None:
+    """
+    Publishes `get_load()` for `node` every `DIRECTORY_PUBLISH_INTERVAL` seconds. Runs forever, on its own thread.
+    """
+
+    reachable = True
+    while True:
+        try:
+            directory.publish(node, get_load())
+            if not reachable: print("\x1b[32mRoom directory reachable again\x1b[0m")
+            reachable = True
+        except OSError as e:
+            if reachable: print(f"\x1b[31mCould not publish to the room directory: {e}\x1b[0m")
+            reachable = False
+
+        time.sleep(DIRECTORY_PUBLISH_INTERVAL)
+
+if __name__ == "__main__":
+    # `python server/room_directory.py [--port <port>]` runs the directory service
+    port = int(sys.argv[sys.argv.index("--port")+1]) if "--port" in sys.argv else DIRECTORY_PORT
+
+    server = DirectoryServer("localhost", port)
+    print(f"Room directory listening on localhost:{port}")
+    server.serve_forever()
@@ -0,0 +1,147 @@
+import traceback
+from collections import deque
+from time import perf_counter
+from typing import Callable, Deque, List
+
+from broadcast_rate import ServerLoad
+from CONSTANTS import LATE_TICK_TOLERANCE, JITTER_WINDOW
+
+class FixedRateTask:
+    """
+    A function that should run once every `period` seconds, at fixed deadlines.
+
+    Deadlines are absolute (`perf_counter()` times, each one `period` after the last), not "`period` after the
+    last run finished", so time spent running doesn't push every later run back, and small delays don't accumulate.
+
+    If the task falls behind (a slow run, or the process was paused), the missed runs are made up back to back,
+    but at most `max_catch_up` of them - any more are skipped, so one long stall doesn't turn into a long burst.
+
+    ### Stats:
+    - `runs`: how many times the function ran
+    - `late`: runs that started more than `LATE_TICK_TOLERANCE` periods after their deadline
+    - `overruns`: runs that took longer than one period
+    - `skipped`: deadlines dropped instead of caught up
+    - `errors`: runs that raised an exception (printed, and otherwise ignored - the task keeps running)
+    - `lateness`: how late (seconds) each of the last `JITTER_WINDOW` runs started - the scheduling jitter
+    """
+
+    def __init__(self, name: str, period: float, func: Callable[[], None], max_catch_up: int = 1) -> None:
+        self.name = name
+        self.period = period
+        self.func = func
+        self.max_catch_up = max_catch_up
+
+        self.deadline = perf_counter()
+        """ `perf_counter()` time of the next run """
+
+        self.runs = 0
+        self.late = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.errors = 0
+        self.lateness: Deque[float] = deque(maxlen=JITTER_WINDOW)
+
+    def run(self, now: float) -> float:
+        """
+        Runs the task for its current deadline (which must have passed) and moves on to the next.
+
+        Returns how many seconds it took.
+        """
+
+        missed = int((now - self.deadline) / self.period)
+        if missed >= self.max_catch_up:
+            skip = missed - self.max_catch_up + 1
+            self.deadline += skip * self.period
+            self.skipped += skip
+
+        lateness = now - self.deadline
+        self.lateness.append(lateness)
+        if lateness > LATE_TICK_TOLERANCE * self.period:
+            self.late += 1
+
+        try:
+            self.func()
+        except Exception:
+            # one bad run (say, in one room) must not stop the task for the whole server
+            self.errors += 1
+            print(f"\x1b[31mTask {self.name} raised an exception:\x1b[0m")
+            traceback.print_exc()
+
+        took = perf_counter() - now
+        if took > self.period:
+            self.overruns += 1
+
+        self.runs += 1
+        self.deadline += self.period
+        return took
+
+    def stats(self) -> dict:
+        lateness = sorted(self.lateness)
+
+        return {
+            "period_ms": round(self.period * 1000, 2),
+            "runs": self.runs,
+            "late": self.late,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "jitter_mean_ms": round(sum(lateness) / len(lateness) * 1000, 3) if lateness else 0,
+            "jitter_p99_ms": round(lateness[int(len(lateness) * 0.99)] * 1000, 3) if lateness else 0,
+            "jitter_max_ms": round(lateness[-1] * 1000, 3) if lateness else 0,
+        }
+
+class TickScheduler:
+    """
+    Runs several `FixedRateTask`s, each at its own period, on one thread (or one event loop task).
+
+    Tasks never run concurrently, so none of them has to lock the world state against the others -
+    the physics simulation and the broadcasts (see `./mainloop.py`) each keep their own rate, but a snapshot is
+    never taken halfway through a physics tick. When several deadlines have passed, the earliest runs first.
+
+    The runtime just calls `run_due` in a loop, sleeping for however long it returns in between.
+    """
+
+    def __init__(self, load: ServerLoad = None) -> None:
+        self.tasks: List[FixedRateTask] = []
+
+        self.load = load
+        """ If set, given the fraction of time spent running tasks after every `run_due` """
+        self._last_wake = perf_counter()
+
+    def add(self, name: str, period: float, func: Callable[[], None], max_catch_up: int = 1) -> FixedRateTask:
+        task = FixedRateTask(name, period, func, max_catch_up)
+        self.tasks.append(task)
+        return task
+
+    def run_due(self) -> float:
+        """
+        Runs every task whose deadline has passed, earliest first - but each task at most once per call: a task that
+        takes longer than its period is due again as soon as it finishes, so this would otherwise never return.
+        Catch-up runs (see `FixedRateTask`) happen over the next calls instead.
+
+        Returns how many seconds until the next deadline, or 0 if a task is already due again, so the runtime
+        gets to do whatever else it has to (like the event loop in `./async_server.py`) before calling this again.
+        """
+
+        busy = 0.0
+        pending = list(self.tasks)
+
+        try:
+            while pending:
+                task = min(pending, key=lambda t: t.deadline)
+                now = perf_counter()
+                if task.deadline > now: break
+
+                busy += task.run(now)
+                pending.remove(task)
+        finally:
+            # recorded even if a task raised, so an overloaded server always shows its load
+            now = perf_counter()
+            if self.load is not None and now > self._last_wake:
+                self.load.record(busy, now - self._last_wake)
+            self._last_wake = now
+
+        return max(0, min(task.deadline for task in self.tasks) - now)
+
+    def stats(self) -> dict:
+        return {task.name: task.stats() for task in self.tasks}
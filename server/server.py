@@ -1,252 +1,243 @@
 import socket
-import typing
+import sys
 import threading
-import random
+import asyncio
 import flask
-from string import ascii_uppercase, digits
-from uuid import uuid4
 
-from socket_wrapper import _send
-import client_room
-from CONSTANTS import HOST, PORT
-from mainloop import broadcast_mainloop
+import endpoints
+from endpoints import id_to_client, id_to_room, ROUTES
+from CONSTANTS import HOST, PORT, UDP_PORT, UDP_SIMULATED_LOSS, MAX_ROOM_CAPACITY
+from mainloop import broadcast_mainloop, server_load, scheduler
+from reactor import NetworkReactor
+from udp_channel import UDPChannel
+from world.world import World
+from map_registry import map_registry
+from client_room import Room
+from sharding import ShardRouter
+from room_directory import InMemoryRoomDirectory, RemoteRoomDirectory, make_node, publish_forever
 
 app = flask.Flask(__name__)
 # CORS(app)
 
-#######################################################################
+router: ShardRouter = None
+""" The router of the sharded runtime (see `run_sharded`), if it is the one running """
 
-# Room system setup
-id_to_client: typing.Dict[str, client_room.Client] = {} # maps id to Client objs
-"""
-Stores map from client id to Client object (containing socket, host, etc.) for all currently connected clients
-Schema: `{int client_id: client.Client client}`
-"""
-
-id_to_room: typing.Dict[str, client_room.Room] = {}
-"""
-Stores all currently open room IDs 
-Schema: `{str room_id: client.Room room}`
-"""
-
-def gen_room_id() -> str:
+def register_routes(routes: list) -> None:
     """
-    Generate a random room ID that is not currently in use.
-    Room IDs are 6-character long strings with the following characters allowed:
-    A-Z, 0-9
+    Serves the REST API endpoints of the room system (`(rule, view function)` pairs, see ./endpoints.py) from the flask app.
     """
-    
-    characters = ascii_uppercase + digits
-    random_string = ''.join(random.choice(characters) for i in range(6))
-    
-    try_count = 0
-    while random_string in id_to_room.keys():
-        if try_count > 100:
-            return None
-        random_string = ''.join(random.choice(characters) for i in range(6))
-
-    return random_string
-
-# REST API endpoints - for room system
-@app.route('/checkroom/<string:room_id>')
-def checkroom(room_id: str):
-    return {"available": room_id not in id_to_room.keys()}
-
-@app.route('/joinroom/<string:client_id>/<string:room_id>')
-def joinroom(client_id: str, room_id: str):
-    if room_id not in id_to_room.keys():
-        return {"success": False, "message": "The requested room does not exist."}
-
-    # Check if user is already connected and present in a room
-    if client_id in id_to_client.keys():
-        if id_to_client[client_id].room_id is not None:
-            return {"success": False, "message": f"You are already connected to room {id_to_client[client_id].room_id}!"}
-        
-        if id_to_room[room_id].started:
-            return {"success": False, "message": f"Room {room_id} has already started!"}
-        
-        if len(id_to_room[room_id].clients) >= 8: 
-            # "disconnected" clients still count towards the 8 max 
-            return {"success": False, "message": f"Room {room_id} is full! (8 max)"}
-        
-        else:
-            id_to_client[client_id].room_id = room_id
-            
-            this_player_info = id_to_room[room_id].add_client(id_to_client[client_id])
-            
-            player_details = [] 
-            # send a list of {username: str, color: str, is_host: bool} to the client for lobby display
-            # this is a list of all players in the room, including the user themselves
-            for client_id in id_to_room[room_id].clients:
-                player_details.append({
-                    "username": id_to_room[room_id].clients[client_id]["username"],
-                    "color": id_to_room[room_id].clients[client_id]["color"],
-                    "is_host": not (id_to_room[room_id].clients[client_id]["client_obj"].hosting is None)
-                })
-            
-            return {
-                "success": True, 
-                "map_data": id_to_room[room_id].world.get_map_data(),
-                "players": player_details,
-                "code": room_id,
-                "username": this_player_info["username"],
-                "color": this_player_info["color"],
-            }
+    for rule, view_func in routes:
+        app.add_url_rule(rule, view_func=view_func)
 
-    else:
-        return {"success": False, "message": "Socket must be registered first (try restarting your game)."}
+def handle_command(cmd: str) -> bool:
+    """
+    Runs a command typed into the server console.
 
-@app.route('/leaveroom/<string:client_id>')
-def leaveroom(client_id: str):
-    client = id_to_client.get(client_id)
-    
-    if not client:
-        return {"success": False, "message": "Socket must be registered first (try restarting your game)."}
-    
-    room_id = client.room_id
-    if room_id == None:
-        return {"success": False, "message": "You are not currently in a room."}
-    
-    room = id_to_room.get(room_id)
-    
-    # If the client is the host, disband the room
-    if client.hosting is room or (room.num_connected() == 1):
-        room.disband()
-        del id_to_room[room_id] # use del to trigger the __del__ method of the room (which handles telling all clients to disconnect)
-        return {"success": True, "message": f"Successfully disbanded room {room_id}."}
-    
-    room.remove_client(id_to_client[client_id])
-    
-    # if nobody is left in the room and room.ended is True, delete the room
-    if room.num_connected() == 0 and room.ended:
-        del id_to_room[room_id]
-    
-    client.room_id = None
-    return {"success": True, "message": f"Successfully left room {room_id}."}
+    Returns `False` if the server should shut down, `True` otherwise.
+    """
+    if cmd in ["exit", "quit", "stop"]:
 
-@app.route('/createroom/<string:client_id>')
-def createroom(client_id: str):
-    # Generate room id
-    id = gen_room_id()
+        # disband all rooms
+        for room_id in id_to_room:
+            id_to_room[room_id].disband()
+        if router is not None:
+            router.stop()
 
-    if id is None:
-        return {"success": False, "message": "Somehow, no rooms are available!"}
+        return False
+    elif cmd == "clients":
+        print(id_to_client)
+    elif cmd == "rooms":
+        print(id_to_room)
+    elif cmd == "queues":
+        for client_id, client in list(id_to_client.items()):
+            print(f"\x1b[33m{client_id}\x1b[0m {client.outbound.stats()}")
+    elif cmd == "rates":
+        print(f"tick load \x1b[33m{server_load.load:.2f}\x1b[0m")
+        for room_id, room in list(id_to_room.items()):
+            print(f"\x1b[35m{room_id}\x1b[0m {room.broadcast_rate:.1f}Hz")
+            for client in list(room.clients.values()):
+                c = client["client_obj"]
+                print(f"\t\x1b[33m{c.id}\x1b[0m {c.broadcast_rate:.1f}Hz")
+    elif cmd == "ticks":
+        for name, stats in scheduler.stats().items():
+            print(f"\x1b[35m{name}\x1b[0m {stats}")
+    elif cmd == "rtt":
+        for client_id, client in list(id_to_client.items()):
+            rtt = "no samples" if client.rtt is None else f"{client.rtt*1000:.1f}ms (last {len(client.rtt_samples)}: min {min(client.rtt_samples)*1000:.1f}ms, max {max(client.rtt_samples)*1000:.1f}ms)"
+            print(f"\x1b[33m{client_id}\x1b[0m {rtt}")
+    elif cmd == "shards":
+        if router is None:
+            print("\x1b[2mNot sharded (start the server with --shards <n>)\x1b[0m")
+        else:
+            router.refresh_status()
+            for worker in router.workers:
+                print(f"\x1b[35mworker {worker.index}\x1b[0m pid={worker.process.pid} alive={worker.process.is_alive()} {worker.status}")
+            print(f"Routing \x1b[33m{len(router.client_worker)}\x1b[0m clients to workers")
+    elif cmd == "reloadmaps":
+        errors = map_registry.reload()
+        print(f"Reloaded maps, \x1b[33m{len(errors)}\x1b[0m failed (new rooms use the new versions, running rooms keep theirs)")
+    elif cmd == "help":
+        print("\x1b[33mexit\x1b[0m - exit the server")
+        print("\x1b[33mclients\x1b[0m - print all currently connected clients")
+        print("\x1b[33mrooms\x1b[0m - print all currently open rooms")
+        print("\x1b[33mqueues\x1b[0m - print each client's outbound queue depth (frames, bytes, peak bytes, dropped snapshots)")
+        print("\x1b[33mrates\x1b[0m - print the tick loop load, and the current physics broadcast rate of each room and client")
+        print("\x1b[33mticks\x1b[0m - print timing stats of the physics and broadcast loops (late ticks, overruns, skipped ticks, jitter)")
+        print("\x1b[33mrtt\x1b[0m - print each client's smoothed round trip time (measured by clock sync pings)")
+        print("\x1b[33mshards\x1b[0m - print the rooms, connected clients and tick load of each worker process (with --shards)")
+        print("\x1b[33mreloadmaps\x1b[0m - re-read and validate every map file (rooms created afterwards use the new versions)")
+    else:
+        print("\x1b[2mUnknown command. Type 'help' for a list of commands.\x1b[0m")
 
-    # Required to have already completed initial handshake with socket
-    client: typing.Union[client_room.Client, None] = id_to_client.get(client_id)
-    if not client:
-        return {"success": False, "message": "Client has not completed initial socket handshake (try restarting your game)."}
-    
-    # If client exists, set its room
-    client.room_id = id
+    return True
+
+def node_load() -> dict:
+    """
+    This server's load, as published to the room directory (see ./room_directory.py).
+    """
+    connected = sum(1 for client in list(id_to_client.values()) if client.sock is not None)
 
-    # Create room object
-    room = client_room.Room(client, [client], id)
-    id_to_room[id] = room    
-    client.hosting = room # mark this client as the host of this room
+    if router is None:
+        return {"clients": connected, "rooms": len(id_to_room), "tick_load": server_load.load}
 
-    # Return the code
+    # sharded: every worker's, plus the clients the router hasn't handed over yet
+    router.refresh_status()
+    statuses = [worker.status for worker in router.workers]
     return {
-        "success": True, 
-        "code": f"{id}",
-        "map_data": room.world.get_map_data(),
-        "player_data": { # return the user themselves
-            "username": room.clients[client_id]["username"],
-            "color": room.clients[client_id]["color"],
-            "is_host": True
-        }
+        "clients": connected + sum(status["clients"] for status in statuses),
+        "rooms": sum(status["rooms"] for status in statuses),
+        "tick_load": max(status["load"] for status in statuses),
     }
 
-@app.route('/startgame/<string:client_id>/<string:room_id>')
-def startgame(client_id: str, room_id: str):
-    # First, verify that client_id is currently in AND IS THE HOST of room_id
-    client = id_to_client.get(client_id)
-    
-    if not client or not client.hosting.id == room_id:
-        # error unauthenticated
-        return {"success": False, "message": "Unauthorized attempt to start game"}
-    
-    # They are the host of the room, Mark the room as started
-    room = id_to_room.get(room_id)
-    if not room:
-        return {"success": False, "message": f"Room {room_id} does not exist."}
-    
-    room.start_game()
-    return {"success": True, "message": f"Room {room_id} marked as started and recv loops initiated."}
-
-sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-sock.bind((HOST, PORT))
-sock.listen()   
-
-print(f"Socket server listening on {HOST}:{PORT}")
-
-def accept_socket(): 
+def start_publishing() -> None:
     """
-    This handles the initial handshake between the client and the server.
-    Registers the socket and assigns a client id to the connection.
+    From now on, publishes this server's load to the room directory, if it is shared with other servers (`--directory`).
     """
-    while True:
-        conn, address = sock.accept()
-        print(f"\x1b[36mConnection established\x1b[0m from: \x1b[33m{address}\x1b[0m")
-        
-        # Send the client a generated ID (sort of like an auth cookie)
-        client_id = uuid4().hex
-
-        # Create a Client object for the connection. Currently HAS NO USERNAME (see below)
-        cli = client_room.Client(conn, host=address[0], port=address[1], id=client_id)
-        id_to_client[client_id] = cli
-        
-        # IMPORTANT - the client side's `socket_man.connect()` must handle this (send a username!!!)
-        # ALSO IMPORATNT - we call this recv before sending the client id, since the client
-        # sends data before recv'ing. its 3 am and i cant think clearly but im guessing the order of these
-        # lines must corresponsd (recv on server <-> send on client and vice versa) because of thread blocking
-        username = conn.recv(1024)
-        
-        if not username:
-            # client disconnected before sending username
-            print(f"\x1b[31mClient \x1b[33m{client_id}\x1b[31m disconnected before sending username\x1b[0m")
-        
-        username = username.decode('utf-8') # wait for client to send back their username
-        
-        # we created an id for them, now emit their id back
-        # THIS IS A SPECIAL EVENT - does not get handled by event listener
-        # since the client SHOULD NOT HAVE BEGUN THE EVENT LISTENER YET. (it happens immediately after recv. this)
-        conn.send(client_id.encode('utf-8'))
-        
-        cli.username = username
+    if isinstance(endpoints.directory, InMemoryRoomDirectory): return
+    threading.Thread(target=publish_forever, args=(endpoints.directory, endpoints.this_node, node_load), daemon=True).start()
 
 def apprun(host, port):
     print(f"Flask server running at {host}:{port+1}")
     app.run(host, port+1)
 
-# Create multiprocess to continuously send data to clients, every tick
-thread_accept = threading.Thread(target=accept_socket, daemon=True)
-thread_accept.start()
+def run_threaded(udp_channel: UDPChannel = None, port: int = PORT, udp_port: int = UDP_PORT):
+    """
+    The default runtime: one reactor thread for all sockets, one flask thread, and one tick thread.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1) # allow restarting while old connections are in TIME_WAIT
+    sock.bind((HOST, port))
+    sock.listen(socket.SOMAXCONN)
 
-thread_flask = threading.Thread(target=apprun, args=(HOST, PORT), daemon=True)
-thread_flask.start()
+    print(f"Socket server listening on {HOST}:{port}")
 
-thread_loop = threading.Thread(target=broadcast_mainloop, args=(id_to_room, id_to_client), daemon=True)
-thread_loop.start()
+    udp_sock = None
+    if udp_channel is not None:
+        udp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp_sock.bind((HOST, udp_port))
+        print(f"UDP channel listening on {HOST}:{udp_port}")
 
-# cli
-while True:
-    cmd = input()
-    if cmd in ["exit", "quit", "stop"]:
-        
-        # disband all rooms
-        for room_id in id_to_room:
-            id_to_room[room_id].disband()   
-        
-        sock.close()
-        exit(0)
-    elif cmd == "clients":
-        print(id_to_client)
-    elif cmd == "rooms":
-        print(id_to_room)
-    elif cmd == "help":
-        print("\x1b[33mexit\x1b[0m - exit the server")
-        print("\x1b[33mclients\x1b[0m - print all currently connected clients")
-        print("\x1b[33mrooms\x1b[0m - print all currently open rooms")
+    # A single reactor thread handles the handshake and keypress input for every socket (see ./reactor.py)
+    reactor = NetworkReactor(sock, id_to_client, udp_sock, udp_channel)
+    thread_reactor = threading.Thread(target=reactor.run, daemon=True)
+    thread_reactor.start()
+
+    register_routes(ROUTES)
+    thread_flask = threading.Thread(target=apprun, args=(HOST, port), daemon=True)
+    thread_flask.start()
+
+    thread_loop = threading.Thread(target=broadcast_mainloop, args=(id_to_room, id_to_client), daemon=True)
+    thread_loop.start()
+
+    start_publishing()
+
+    # cli
+    while handle_command(input()):
+        pass
+
+    reactor.stop()
+    sock.close()
+    if udp_sock is not None: udp_sock.close()
+
+def run_sharded(worker_count: int, port: int = PORT):
+    """
+    The sharded runtime: rooms are spread over `worker_count` processes, and this one only routes clients
+    and HTTP requests to them (see ./sharding.py).
+    """
+    global router
+
+    # the workers are forked first, so they don't inherit any sockets or threads
+    router = ShardRouter(worker_count)
+    router.start()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((HOST, port))
+    sock.listen(socket.SOMAXCONN)
+
+    print(f"Socket server listening on {HOST}:{port}, routing rooms to \x1b[33m{worker_count}\x1b[0m worker processes")
+
+    # the router's reactor only does handshakes, then clients are handed over to workers
+    router.reactor = NetworkReactor(sock, id_to_client)
+    thread_reactor = threading.Thread(target=router.reactor.run, daemon=True)
+    thread_reactor.start()
+
+    register_routes(router.routes())
+    thread_flask = threading.Thread(target=apprun, args=(HOST, port), daemon=True)
+    thread_flask.start()
+
+    start_publishing()
+
+    # cli
+    while handle_command(input()):
+        pass
+
+    router.reactor.stop()
+    sock.close()
+
+if __name__ == "__main__":
+    # load every map up front, so creating a room never touches the disk
+    map_registry.reload()
+    print(f"Loaded maps: \x1b[33m{', '.join(map_registry.maps)}\x1b[0m")
+    
+    # `--no-udp` disables the optional UDP channel (clients then use TCP for everything, see ./udp_channel.py)
+    # `--udp-loss <fraction>` drops that fraction of datagrams on purpose, for testing
+    udp_channel = None
+    if "--no-udp" not in sys.argv:
+        udp_loss = float(sys.argv[sys.argv.index("--udp-loss")+1]) if "--udp-loss" in sys.argv else UDP_SIMULATED_LOSS
+        udp_channel = UDPChannel(id_to_client, simulated_loss=udp_loss)
+
+    # `--port <n>` runs this server on other ports (socket and UDP on n, HTTP on n+1), to run several on one machine
+    port, udp_port = PORT, UDP_PORT
+    if "--port" in sys.argv:
+        port = udp_port = int(sys.argv[sys.argv.index("--port")+1])
+
+    # `--directory <host:port>` shares room codes and load with other servers through the room directory service
+    # (see ./room_directory.py). Without it, this server's rooms are only known to itself
+    has_udp = udp_channel is not None and "--shards" not in sys.argv
+    endpoints.this_node = make_node(HOST, port, udp_port if has_udp else None)
+    if "--directory" in sys.argv:
+        directory_host, directory_port = sys.argv[sys.argv.index("--directory")+1].split(":")
+        endpoints.directory = RemoteRoomDirectory(directory_host, int(directory_port))
+
+    # `--room-capacity <n>` lets rooms have up to n players (8 by default)
+    if "--room-capacity" in sys.argv:
+        Room.capacity = min(int(sys.argv[sys.argv.index("--room-capacity")+1]), MAX_ROOM_CAPACITY)
+
+    # `--vector-physics` steps every room's entities with the NumPy engine (see ./vector_physics.py)
+    if "--vector-physics" in sys.argv:
+        World.vectorized = True
+
+    # `--shards <n>` spreads rooms over n worker processes (see ./sharding.py). There's no UDP channel in this mode
+    if "--shards" in sys.argv:
+        run_sharded(int(sys.argv[sys.argv.index("--shards")+1]), port)
+
+    # `python server/server.py --async` runs everything on a single asyncio event loop instead (see ./async_server.py)
+    elif "--async" in sys.argv:
+        from async_server import serve
+        start_publishing()
+        asyncio.run(serve(HOST, port, handle_command, udp_channel, udp_port))
     else:
-        print("\x1b[2mUnknown command. Type 'help' for a list of commands.\x1b[0m")
\ No newline at end of file
+        run_threaded(udp_channel, port, udp_port)
+
+    exit(0)
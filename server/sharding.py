@@ -0,0 +1,381 @@
+"""
+The sharded runtime (`python server/server.py --shards <n>`): rooms are spread over `n` worker processes,
+so physics can use `n` cores instead of one.
+
+### Processes:
+- The router (the main process) accepts every connection and does the handshake, like the threaded runtime,
+  and serves the HTTP endpoints. It never has rooms of its own, and doesn't run physics.
+- Each worker runs the threaded runtime's reactor and tick loop (see `./reactor.py` and `./mainloop.py`) for its own
+  rooms and clients, with its own `id_to_room` and `id_to_client` (see `./endpoints.py`). It has no listening socket:
+  the router hands it the sockets of its clients.
+
+### Routing:
+- `createroom` goes to the least loaded worker (the one with the fewest connected clients, see `ShardRouter.least_loaded`)
+- `joinroom`, `checkroom` and `startgame` go to the worker that owns the room, told apart by the room's ID (see `room_shard`)
+- `leaveroom` goes to the client's worker
+
+Before a request is forwarded, the client's socket is handed over to that worker if it isn't there yet: its file descriptor
+is sent over a unix socket (see `send_message`), along with everything the router knows about the client (see `client_state`).
+Clients stay with their worker after leaving a room, and are only moved again (through the router) to join a room on another one.
+
+The UDP channel isn't available in this mode (clients then use TCP for everything, see `./udp_channel.py`).
+"""
+
+import json
+import multiprocessing
+import signal
+import socket
+import threading
+import traceback
+from typing import Callable, Dict, List, Tuple
+
+import endpoints
+from endpoints import id_to_client, id_to_room, room_shard, ROUTES
+from client_room import Client
+from mainloop import broadcast_mainloop, server_load
+from reactor import NetworkReactor
+
+MAX_MESSAGE_SIZE = 1 << 20
+""" Largest control message between the router and a worker (replies include player lists, so they can be a few KB) """
+
+ENDPOINTS = {view_func.__name__: view_func for _, view_func in ROUTES}
+""" The room system's endpoints by name, as the router asks workers to run them """
+
+def send_message(sock: socket.socket, message: dict, fds: List[int] = ()) -> None:
+    """
+    Sends `message` (as JSON) over a unix `SOCK_SEQPACKET` socket, with any file descriptors in `fds`
+    (the receiving process gets its own copies of them).
+    """
+    socket.send_fds(sock, [json.dumps(message).encode()], list(fds))
+
+def recv_message(sock: socket.socket) -> Tuple[dict, List[int]]:
+    """
+    Receives a message sent with `send_message`, as `(message, file descriptors)`. Raises `EOFError` if the other side is gone.
+    """
+
+    data, fds, _, _ = socket.recv_fds(sock, MAX_MESSAGE_SIZE, 1)
+    if not data:
+        raise EOFError("control socket closed")
+    return json.loads(data), fds
+
+def client_state(cli: Client) -> dict:
+    """
+    What another process needs to take over `cli`'s connection (after `NetworkReactor.detach`), besides its socket:
+    its identity, the start of any frame it was in the middle of sending, and anything not yet written to it.
+    """
+
+    return {
+        "id": cli.id,
+        "username": cli.username,
+        "host": cli.address[0],
+        "port": cli.address[1],
+        "received": bytes(cli.decoder.buffer).hex(),
+        "unsent": cli.outbound.take_unsent().hex(),
+        "input_seq": cli.latest_input[0],
+    }
+
+def client_from_state(conn: socket.socket, state: dict) -> Client:
+    """
+    Rebuilds a client handed over with `client_state`. It has already completed its handshake.
+    """
+
+    cli = Client(conn, host=state["host"], port=state["port"], id=state["id"])
+    cli.username = state["username"]
+    cli.decoder.buffer += bytes.fromhex(state["received"])
+    cli.latest_input = (state["input_seq"], 0, 0)
+
+    unsent = bytes.fromhex(state["unsent"])
+    if unsent: cli.outbound.push(unsent)
+
+    return cli
+
+class ShardWorker:
+    """
+    Runs in a worker process: answers the router's requests, read from `control`, one at a time.
+
+    ### Requests (`op`):
+    - `adopt`: take over the client in `client` (see `client_state`), whose socket comes with the message
+    - `call`: run `endpoint` (see `ENDPOINTS`) with `args`, and reply with its result
+    - `release`: hand the client `client_id` back to the router, with its socket (only if it isn't in a room)
+    - `status`: just reply with `status()`
+    - `stop`: disband every room and exit
+
+    Every reply is `{result, status, gone}`: `gone` are the clients that disconnected since the last reply,
+    which the worker has forgotten (see `forget_disconnected`), so the router can forget them too.
+    """
+
+    def __init__(self, reactor: NetworkReactor, control: socket.socket) -> None:
+        self.reactor = reactor
+        self.control = control
+
+    def status(self) -> dict:
+        return {
+            "rooms": len(id_to_room),
+            "clients": sum(1 for cli in list(id_to_client.values()) if cli.sock is not None),
+            "load": server_load.load,
+        }
+
+    def forget_disconnected(self) -> List[str]:
+        """
+        Removes every disconnected client from `id_to_client` (rooms clean up after their own, see `Room.num_connected`),
+        and returns their IDs.
+        """
+
+        gone = []
+        for client_id, cli in list(id_to_client.items()):
+            if cli.sock is None and id_to_client.get(client_id) is cli:
+                del id_to_client[client_id]
+                gone.append(client_id)
+        return gone
+
+    def serve(self) -> None:
+        while True:
+            try:
+                request, fds = recv_message(self.control)
+            except (EOFError, OSError):
+                return # the router is gone
+
+            result, reply_fds = None, []
+            try:
+                result, reply_fds = self.handle(request, fds)
+            except Exception:
+                traceback.print_exc()
+                result = {"error": f"{request.get('op')} {request.get('endpoint', '')} failed on this worker"}
+
+            send_message(self.control, {"result": result, "status": self.status(), "gone": self.forget_disconnected()}, reply_fds)
+            for fd in reply_fds:
+                socket.close(fd) # the router has its own copy now
+
+            if request["op"] == "stop":
+                return
+
+    def handle(self, request: dict, fds: List[int]) -> Tuple[object, List[int]]:
+        op = request["op"]
+
+        if op == "adopt":
+            self.reactor.adopt(client_from_state(socket.socket(fileno=fds[0]), request["client"]))
+            return None, []
+
+        if op == "call":
+            return ENDPOINTS[request["endpoint"]](*request["args"]), []
+
+        if op == "release":
+            cli = id_to_client.get(request["client_id"])
+            if cli is None or cli.room_id is not None:
+                return {"room_id": cli and cli.room_id}, []
+
+            conn = self.reactor.detach(cli)
+            if conn is None:
+                return {"room_id": None}, [] # disconnected
+
+            state = client_state(cli)
+            fd = conn.detach()
+            return {"client": state}, [fd]
+
+        if op == "stop":
+            for room in list(id_to_room.values()):
+                room.disband()
+            return None, []
+
+        return None, [] # status
+
+def run_worker(index: int, count: int, control: socket.socket) -> None:
+    """
+    The main function of worker `index` (out of `count`). Never returns until the router stops it.
+    """
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # the router stops the workers (see `ShardRouter.stop`)
+    endpoints.room_id_shard = (index, count)
+
+    reactor = NetworkReactor(None, id_to_client)
+    threading.Thread(target=reactor.run, daemon=True).start()
+    threading.Thread(target=broadcast_mainloop, args=(id_to_room, id_to_client), daemon=True).start()
+
+    print(f"\x1b[36mWorker {index}\x1b[0m running")
+    ShardWorker(reactor, control).serve()
+    reactor.stop()
+
+class WorkerHandle:
+    """
+    The router's end of one worker process.
+    """
+
+    def __init__(self, index: int, control: socket.socket, process: multiprocessing.Process, on_gone: Callable[['WorkerHandle', str], None]) -> None:
+        self.index = index
+        self.control = control
+        self.process = process
+        self.on_gone = on_gone
+        """ Called with each client the worker reports as disconnected (see `ShardWorker`) """
+        self.status = {"rooms": 0, "clients": 0, "load": 0.0}
+        """ The worker's `ShardWorker.status`, as of its latest reply """
+        self.lock = threading.Lock()
+        """ One request at a time (HTTP requests are handled on several threads) """
+
+    def request(self, message: dict, fds: List[int] = ()) -> Tuple[object, List[int]]:
+        """
+        Sends `message` to the worker and waits for its reply. Returns `(result, file descriptors)`.
+        """
+
+        with self.lock:
+            send_message(self.control, message, fds)
+            reply, reply_fds = recv_message(self.control)
+
+        self.status = reply["status"]
+        for client_id in reply["gone"]:
+            self.on_gone(self, client_id)
+
+        return reply["result"], reply_fds
+
+    def call(self, endpoint: str, *args) -> dict:
+        """
+        Runs one of the room system's endpoints on the worker, and returns its result.
+        """
+
+        result, _ = self.request({"op": "call", "endpoint": endpoint, "args": args})
+        if isinstance(result, dict) and "error" in result and len(result) == 1:
+            raise RuntimeError(result["error"])
+        return result
+
+class ShardRouter:
+    """
+    Runs in the main process: starts the workers, and routes the room system's endpoints to them (see `routes`).
+
+    `reactor` is the router's own reactor, which accepts connections and does handshakes. Clients stay in its
+    `id_to_client` until they are handed over to a worker.
+    """
+
+    def __init__(self, worker_count: int) -> None:
+        self.reactor: NetworkReactor = None
+        """ Set once the workers are started (see `start`) """
+        self.worker_count = worker_count
+        self.workers: List[WorkerHandle] = []
+
+        self.client_worker: Dict[str, WorkerHandle] = {}
+        """ The worker each handed over client is on """
+        self.move_lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Starts the worker processes. Call this before opening any sockets or starting any threads: the workers are
+        forked from this process (so they also get its loaded maps, and the settings from the command line).
+        """
+
+        context = multiprocessing.get_context("fork")
+        for index in range(self.worker_count):
+            router_end, worker_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+
+            process = context.Process(target=run_worker, args=(index, self.worker_count, worker_end), daemon=True)
+            process.start()
+            worker_end.close()
+
+            self.workers.append(WorkerHandle(index, router_end, process, self.forget_client))
+
+    def stop(self) -> None:
+        """
+        Disbands every room on every worker, and stops them.
+        """
+
+        for worker in self.workers:
+            try:
+                worker.request({"op": "stop"})
+            except (EOFError, OSError):
+                pass
+            worker.process.join(timeout=5)
+
+    def forget_client(self, worker: WorkerHandle, client_id: str) -> None:
+        """
+        Stops routing `client_id` to `worker`, once it is no longer there (it disconnected).
+        Called from inside `WorkerHandle.request`, so it can't take `move_lock`.
+        """
+
+        if self.client_worker.get(client_id) is worker:
+            self.client_worker.pop(client_id, None)
+
+    def refresh_status(self) -> None:
+        for worker in self.workers:
+            worker.request({"op": "status"})
+
+    def least_loaded(self) -> WorkerHandle:
+        """
+        The worker with the fewest connected clients (then, the least busy tick loop), with up to date numbers.
+        """
+
+        self.refresh_status()
+        return min(self.workers, key=lambda worker: (worker.status["clients"], worker.status["load"]))
+
+    def room_worker(self, room_id: str) -> WorkerHandle:
+        shard = room_shard(room_id, self.worker_count)
+        return None if shard is None else self.workers[shard]
+
+    def move_client(self, client_id: str, worker: WorkerHandle) -> dict:
+        """
+        Hands the connection of `client_id` over to `worker`, from the router or from another worker.
+
+        Returns an error response if the client can't be moved (because it is in a room on another worker), otherwise `None`.
+        If the client doesn't exist, nothing happens, and the endpoint itself replies that it isn't registered.
+        """
+
+        with self.move_lock:
+            current = self.client_worker.get(client_id)
+            if current is worker:
+                return None
+
+            if current is None:
+                cli = self.reactor.id_to_client.get(client_id)
+                if cli is None: return None
+
+                conn = self.reactor.detach(cli)
+                if conn is None: return None
+                state, fd = client_state(cli), conn.detach()
+            else:
+                result, fds = current.request({"op": "release", "client_id": client_id})
+                if "client" not in result:
+                    if result["room_id"] is not None:
+                        return {"success": False, "message": f"You are already connected to room {result['room_id']}!"}
+
+                    self.forget_client(current, client_id)
+                    return None # disconnected
+
+                state, fd = result["client"], fds[0]
+
+            try:
+                worker.request({"op": "adopt", "client": state}, [fd])
+            finally:
+                socket.close(fd)
+
+            self.client_worker[client_id] = worker
+            print(f"\x1b[36mClient \x1b[33m{client_id}\x1b[36m -> worker {worker.index}\x1b[0m")
+            return None
+
+    # the room system's endpoints (same as ./endpoints.py, but routed to the workers)
+
+    def checkroom(self, room_id: str):
+        worker = self.room_worker(room_id)
+        if worker is None: return {"available": True}
+        return worker.call("checkroom", room_id)
+
+    def joinroom(self, client_id: str, room_id: str):
+        worker = self.room_worker(room_id)
+        if worker is None: return {"success": False, "message": "The requested room does not exist."}
+        return self.move_client(client_id, worker) or worker.call("joinroom", client_id, room_id)
+
+    def leaveroom(self, client_id: str):
+        worker = self.client_worker.get(client_id)
+        if worker is None: return endpoints.leaveroom(client_id) # not handed over, so not in a room
+        return worker.call("leaveroom", client_id)
+
+    def createroom(self, client_id: str):
+        # clients that already are on a worker stay there
+        worker = self.client_worker.get(client_id) or self.least_loaded()
+        return self.move_client(client_id, worker) or worker.call("createroom", client_id)
+
+    def startgame(self, client_id: str, room_id: str):
+        worker = self.room_worker(room_id)
+        if worker is None: return {"success": False, "message": f"Room {room_id} does not exist."}
+        return worker.call("startgame", client_id, room_id)
+
+    def routes(self) -> list:
+        """
+        `ROUTES` (see `./endpoints.py`), with each view function replaced by the router's.
+        """
+        return [(rule, getattr(self, view_func.__name__)) for rule, view_func in ROUTES]
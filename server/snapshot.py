@@ -0,0 +1,168 @@
+import struct
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Tuple, TYPE_CHECKING
+
+from CONSTANTS import SNAPSHOT_HISTORY_LENGTH, KEYFRAME_INTERVAL
+
+if TYPE_CHECKING:
+    from world.entity import Entity
+
+SNAPSHOT_HEADER = struct.Struct("!IIdH")
+"""
+`[seq: uint32][baseline seq: uint32][server time: f64 seconds][number of entity records: uint16]`
+
+`seq` numbers every snapshot of a room (starting from 1). If `baseline seq` is 0 the snapshot is a keyframe,
+otherwise it only contains what changed since snapshot `baseline seq`, which the client has acknowledged.
+`server time` is when the state in it was simulated (the latest physics tick), so the client knows how old it is.
+"""
+
+ENTITY_RECORD = struct.Struct("!B5fBBI")
+"""
+The full state of one entity (27 bytes):
+
+`[slot: uint8][pos_x: f32][pos_y: f32][vel: f32][acc: f32][angle: f32][keys: uint8 bitmask][is_crashed: uint8][input seq: uint32]`
+
+`input seq` is the seq of the latest input from the entity's client that has been applied (see `Client.apply_input`),
+so the client knows which of its inputs this state already includes (see `game/prediction.py`).
+
+Usernames, colors and hitbox radii never change during a game, so they are only sent once (in `game-init`).
+The client maps `slot` back to a username with the `slot` field of each entity in `World.get_world_data`.
+
+### This must be the same as on the client side (see `game/snapshot.py`)
+"""
+
+FIELD_SLICES = [(1, 5), (5, 9), (9, 13), (13, 17), (17, 21), (21, 22), (22, 23), (23, 27)]
+"""
+Byte ranges of each field inside an `ENTITY_RECORD` (pos_x, pos_y, vel, acc, angle, keys, is_crashed, input seq).
+Bit `i` of a record's field mask says whether field `i` is present.
+"""
+
+ALL_FIELDS = 0xFF
+REMOVED = 0x00
+""" Field mask of an entity that was in the baseline but no longer exists (unchanged entities are left out instead). """
+
+def pack_keys(keys: list) -> int:
+    """
+    Packs `[forward, backward, left, right]` into a bitmask (bit 0 = forward, ..., bit 3 = right).
+    """
+    return keys[0] | (keys[1] << 1) | (keys[2] << 2) | (keys[3] << 3)
+
+def encode_entity(e: 'Entity') -> bytes:
+    """
+    Returns the full `ENTITY_RECORD` of an entity.
+    """
+    return ENTITY_RECORD.pack(
+        e.slot,
+        e.pos[0], e.pos[1],
+        e.vel, e.acc, e.angle%360,
+        pack_keys(e.key_presses),
+        e.crash_ticks > 0,
+        e.client.applied_input if e.client is not None else 0,
+    )
+
+class SnapshotEncoder:
+    """
+    Keeps the recent snapshots of one room, and encodes them either as keyframes
+    or as deltas against a snapshot a client has acknowledged.
+
+    ### Delta record format:
+    `[slot: uint8][field mask: uint8][changed fields...]` - fields are copied byte-for-byte
+    from the entity's `ENTITY_RECORD`, in order, so the client can patch its copy of the baseline.
+    Entities that did not change at all are left out. Keyframes use the same format with every field present.
+
+    Comparing the packed bytes (instead of the floats) means a field only counts as changed
+    if it would actually look different to the client.
+
+    ### Partial snapshots:
+    Clients are usually only sent the entities relevant to them (see `./interest.py`). The client keeps the last state
+    it was sent of every other entity, so a delta only has to know which entities the baseline snapshot included
+    *for that client*: those are diffed against the baseline, the rest are sent in full.
+    """
+
+    def __init__(self) -> None:
+        self.seq = 0
+        """ seq of the latest captured snapshot (0 = none yet) """
+
+        self.history: OrderedDict[int, Dict[int, bytes]] = OrderedDict()
+        """ seq -> {slot: ENTITY_RECORD bytes} for the last `SNAPSHOT_HISTORY_LENGTH` snapshots """
+
+        self.captured_at = 0
+        """ Server time (seconds) of the latest captured snapshot """
+
+        self._encoded: Dict[Tuple[int, FrozenSet[int], FrozenSet[int]], bytes] = {}
+        """ Cache of the latest snapshot's encodings, by `(baseline seq, included slots, baseline's included slots)` """
+
+    def capture(self, entities: Iterable['Entity'], captured_at: float) -> int:
+        """
+        Records the current state of every entity as a new snapshot, which they were in at `captured_at` (server time).
+        Returns its seq.
+        """
+
+        self.seq += 1
+        self.captured_at = captured_at
+        self.history[self.seq] = {e.slot: encode_entity(e) for e in entities}
+        while len(self.history) > SNAPSHOT_HISTORY_LENGTH:
+            self.history.popitem(last=False)
+
+        self._encoded = {}
+        return self.seq
+
+    def choose_baseline(self, acked_seq: int, last_keyframe_seq: int) -> int:
+        """
+        Returns which snapshot to diff the latest one against, for a client that acknowledged `acked_seq`
+        and was last sent a keyframe at `last_keyframe_seq`. Returns 0 if the client needs a keyframe.
+        """
+
+        if acked_seq not in self.history or acked_seq >= self.seq:
+            return 0
+
+        if self.seq - last_keyframe_seq >= KEYFRAME_INTERVAL:
+            return 0
+
+        return acked_seq
+
+    def encode(self, baseline_seq: int = 0, include: FrozenSet[int] = None, baseline_include: FrozenSet[int] = None) -> bytes:
+        """
+        Encodes the latest snapshot against `baseline_seq` (0 for a keyframe).
+
+        `include` limits which entities are sent (`None` = all of them).
+        `baseline_include` is what the baseline snapshot included for this client (`None` = all of them).
+
+        Encodings are cached until the next `capture()`, so clients that acknowledged
+        the same snapshot and have the same relevant entities share one encoding.
+        """
+
+        key = (baseline_seq, include, baseline_include)
+        cached = self._encoded.get(key)
+        if cached is not None: return cached
+
+        current = self.history[self.seq]
+        baseline = self.history.get(baseline_seq, {}) if baseline_seq else {}
+
+        records = []
+        for slot, record in current.items():
+            if include is not None and slot not in include: continue
+
+            old = baseline.get(slot) if baseline_include is None or slot in baseline_include else None
+
+            if old is None:
+                records.append(bytes([slot, ALL_FIELDS]) + record[1:])
+                continue
+
+            mask = 0
+            changed = []
+            for i, (start, end) in enumerate(FIELD_SLICES):
+                if record[start:end] != old[start:end]:
+                    mask |= 1 << i
+                    changed.append(record[start:end])
+
+            if mask:
+                records.append(bytes([slot, mask]) + b"".join(changed))
+
+        # entities that left the world (not just this client's relevant set)
+        for slot in baseline.keys() - current.keys():
+            records.append(bytes([slot, REMOVED]))
+
+        encoded = SNAPSHOT_HEADER.pack(self.seq, baseline_seq, self.captured_at, len(records)) + b"".join(records)
+        self._encoded[key] = encoded
+        return encoded
@@ -1,27 +1,154 @@
-import socket
+import struct
 import json
+from typing import List, Tuple
 
-def _send(socket: socket.socket, data, event_name: str = None) -> bool:
-    """
-    Send wrapper for sockets, adding the prefix data labeler. `data` must 
-    be a readable buffer, such as `bytes` or `array.array`.
-    
-    Please send `data` as a string (since we must serialize it to JSON)
-    
-    Returns `true` if the data was sent successfully, `false` otherwise.
-    """
-    try:
-        if event_name:
-            wrapped_data = {
-                "type": event_name,
-                "data": data
-            }
-            socket.send(bytes([0]) + bytes(json.dumps(wrapped_data), 'utf-8'))
-        
-        else:
-            socket.send(bytes([1]) + data)
-            
-        return True
-    except (ConnectionResetError, ConnectionAbortedError):
-        print(f"\x1b[31mCould not send (event=\x1b[33m{event_name}\x1b[0m) to socket: Connection closed!\x1b[0m")
-        return False
\ No newline at end of file
+HEADER = struct.Struct("!BI")
+"""
+Every message on the socket is a frame: a 5-byte header followed by the payload.
+The header is `[message type: uint8][payload length: uint32]`, big-endian.
+
+### This must be the same as on the client side (see `game/socket_wrapper.py`)
+"""
+
+MAX_FRAME_SIZE = 1 << 24
+""" Largest payload we accept (16 MiB). Anything bigger is treated as a corrupt stream. """
+
+# Message types (first byte of the header)
+MESSAGE_EVENT = 0
+""" server -> client: JSON `{"type": event_name, "data": ...}` """
+MESSAGE_PACKET = 1
+""" server -> client: physics data (binary snapshot, see `./snapshot.py`) """
+MESSAGE_USERNAME = 2
+""" client -> server: the first frame on a new connection, utf-8 username """
+MESSAGE_CLIENT_ID = 3
+""" server -> client: reply to `MESSAGE_USERNAME`, utf-8 client id """
+MESSAGE_INPUT = 4
+""" client -> server: the client's key state, as an `INPUT_RECORD`. Sent over UDP once the channel is active. """
+MESSAGE_ACK = 5
+""" client -> server: `uint32` seq of the latest physics snapshot received (see `./snapshot.py`) """
+
+MESSAGE_UDP_HELLO = 6
+"""
+Negotiates the UDP channel (see `./udp_channel.py`):
+1. client -> server (UDP): utf-8 client id, so the server can tell which client a datagram address belongs to
+2. server -> client (UDP): empty reply, proving datagrams get through both ways
+3. client -> server (TCP frame): empty, telling the server to start sending snapshots over UDP
+"""
+
+MESSAGE_PING = 7
+""" client -> server: a `PING_RECORD`, sent about once a second (see `Client.handle_message` in `./client_room.py`) """
+MESSAGE_PONG = 8
+""" server -> client: immediate reply to `MESSAGE_PING`, as a `PONG_RECORD` """
+
+INPUT_RECORD = struct.Struct("!IdB")
+"""
+`[input seq: uint32][client timestamp: f64 seconds][keys: uint8 bitmask (bit 0 = forward, ..., bit 3 = right)]`
+
+Always the whole key state rather than single key presses, so a lost or repeated message can't leave a key stuck.
+`input seq` counts up per connection; the server ignores any input that isn't newer than the last one it received.
+
+### This must be the same as on the client side (see `game/socket_wrapper.py`)
+"""
+
+PING_RECORD = struct.Struct("!ddd")
+"""
+`[client send time: f64][server time of the previous pong: f64, 0 if none][client hold: f64]`
+
+`client hold` is how many seconds the client held the previous pong before sending this ping, so the server
+can measure its own round trip time sample without trusting the client's clock: `now - previous pong time - hold`.
+
+### This must be the same as on the client side (see `game/socket_wrapper.py`)
+"""
+
+PONG_RECORD = struct.Struct("!ddd")
+"""
+`[client send time of the ping: f64][server receive time: f64][server send time: f64]`
+
+With the time the client receives it, these are the 4 timestamps of an NTP exchange (see `ServerClock` on the client side).
+
+### This must be the same as on the client side (see `game/socket_wrapper.py`)
+"""
+
+DATAGRAM_HEADER = struct.Struct("!BI")
+"""
+Every UDP datagram is `[message type: uint8][seq: uint32]` followed by the payload.
+Datagrams keep their boundaries, so no length is needed. `seq` counts up per sender and connection;
+receivers drop any datagram whose `seq` isn't newer than the last one they accepted (late or duplicated).
+
+### This must be the same as on the client side (see `game/socket_wrapper.py`)
+"""
+
+MAX_DATAGRAM_SIZE = 1200
+""" Larger messages are sent over TCP instead, to avoid IP fragmentation (which multiplies the loss rate). """
+
+def pack_frame(msg_type: int, payload: bytes) -> bytes:
+    """
+    Returns `payload` prefixed with a frame header.
+    """
+    return HEADER.pack(msg_type, len(payload)) + payload
+
+def pack_datagram(msg_type: int, seq: int, payload: bytes) -> bytes:
+    """
+    Returns `payload` prefixed with a datagram header.
+    """
+    return DATAGRAM_HEADER.pack(msg_type, seq) + payload
+
+def unpack_datagram(data: bytes) -> Tuple[int, int, bytes]:
+    """
+    Splits a datagram into `(msg_type, seq, payload)`. Raises `ValueError` if it is too short to have a header.
+    """
+    if len(data) < DATAGRAM_HEADER.size:
+        raise ValueError(f"Datagram of {len(data)} bytes is too short")
+
+    msg_type, seq = DATAGRAM_HEADER.unpack_from(data)
+    return msg_type, seq, data[DATAGRAM_HEADER.size:]
+
+class FrameDecoder:
+    """
+    Streaming frame decoder. TCP does not preserve message boundaries, so a single read can contain
+    several frames, part of one, or both. Feed every read into `feed()`, which returns
+    all frames that are complete so far and keeps the rest buffered for the next read.
+    """
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        """
+        Adds `data` to the buffer and returns a list of `(msg_type, payload)` for every complete frame.
+
+        Raises `ValueError` if a frame header announces a payload larger than `MAX_FRAME_SIZE`.
+        """
+        self.buffer += data
+
+        frames = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            msg_type, length = HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_FRAME_SIZE:
+                raise ValueError(f"Frame of {length} bytes exceeds the maximum of {MAX_FRAME_SIZE}")
+
+            end = offset + HEADER.size + length
+            if end > len(self.buffer): break # rest of this frame hasn't arrived yet
+
+            frames.append((msg_type, bytes(self.buffer[offset + HEADER.size:end])))
+            offset = end
+
+        del self.buffer[:offset]
+        return frames
+
+def wrap_message(data, event_name: str = None) -> bytes:
+    """
+    Returns `data` as a complete frame, ready to be queued for sending (see `Client.send_data`).
+    `data` must be a readable buffer, such as `bytes` or `array.array`.
+
+    If `event_name` is given, `data` is wrapped in an event and serialized to JSON.
+    """
+    if event_name:
+        wrapped_data = {
+            "type": event_name,
+            "data": data
+        }
+        return pack_frame(MESSAGE_EVENT, bytes(json.dumps(wrapped_data), 'utf-8'))
+
+    return pack_frame(MESSAGE_PACKET, bytes(data))
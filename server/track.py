@@ -0,0 +1,164 @@
+"""
+Compiled tracks: the curves of a map turned into lookup tables once, when the map is loaded,
+so finding the track's angle at a position doesn't mean searching through every curve.
+
+A track's angle is piecewise linear along it (see `GameMap.angle_at`), so it is stored as its breakpoints ("knots"):
+the start, `q1`, `q3` and end of every curve, with the angle at each. Between two knots, the angle is interpolated.
+
+To find the knots around a position without a search, the track is also split into buckets (`TABLE_RESOLUTION`
+meters each, or wider on long tracks with few curves), and each bucket stores the last knot at or before its start.
+A lookup is then one division, one table read, and a step past any knots inside the bucket (there are rarely any).
+
+Cars only ever move a few meters per tick, so each car also follows the track with its own `TrackCursor`, which
+remembers the knot it was at and just steps forward from it, without touching the bucket table at all.
+
+### This file must be identical on the server and client side (`server/track.py` and `game/track.py`)
+"""
+
+from typing import Iterable, Sequence
+
+TABLE_RESOLUTION = 1
+""" Meters of track per bucket of `CompiledTrack.bucket_knots` (at least) """
+BUCKETS_PER_KNOT = 4
+""" Buckets are widened on long tracks so there are at most this many per knot, which keeps the table small """
+
+class CompiledTrack:
+    """
+    A piecewise linear function of the position along the track: `knots_y[i]` at `knots_x[i]`, interpolated in between,
+    and 0 before the first knot and from the last one on.
+
+    Used for the track's angle (`GameMap.angle_at`), and for the vanishing point on the client.
+    Every room using the same map shares the same `CompiledTrack`, and it is never changed after it is built.
+    """
+
+    def __init__(
+        self, knots_x: Sequence[float], knots_y: Sequence[float],
+        resolution: float = TABLE_RESOLUTION, bucket_knots: Sequence[int] = None
+        ) -> None:
+        """
+        `bucket_knots` can be given if it was already built (by the same code, see `./map_format.py`).
+        Any sequences work, including read-only `memoryview`s of a compiled map file, which are used without copying.
+        """
+
+        self.knots_x: Sequence[float] = knots_x
+        """ Positions of the knots, sorted. Knots can repeat (zero-length pieces are never used). """
+        self.knots_y: Sequence[float] = knots_y
+        self.resolution = resolution
+
+        self.bucket_knots: Sequence[int] = [] if bucket_knots is None else bucket_knots
+        """ For every `resolution` meters from the first knot: the index of the last knot at or before the bucket's start """
+
+        if bucket_knots is None and len(self.knots_x):
+            first, last = self.knots_x[0], self.knots_x[-1]
+            self.resolution = resolution = max(resolution, (last - first) / (BUCKETS_PER_KNOT * len(self.knots_x)))
+
+            # one pass over the knots (they are sorted), instead of a binary search per bucket
+            self.bucket_knots = []
+            i = 0
+            for b in range(int((last - first) / resolution) + 1):
+                while i + 1 < len(self.knots_x) and self.knots_x[i+1] <= first + b * resolution: i += 1
+                self.bucket_knots.append(i)
+
+    def index_at(self, x: float) -> int:
+        """
+        The index of the last knot at or before `x`, in constant time. `x` must be inside the track (see `value_at`).
+        """
+
+        knots = self.knots_x
+        i = self.bucket_knots[int((x - knots[0]) / self.resolution)]
+
+        # the bucket starts at or before `x`, but there might be more knots between its start and `x`
+        while knots[i+1] <= x: i += 1
+        while knots[i] > x: i -= 1 # only if rounding put the bucket's start past `x`
+
+        return i
+
+    def value_at(self, x: float) -> float:
+        """
+        The value at `x`, in constant time.
+        """
+
+        knots = self.knots_x
+        if not len(knots) or x < knots[0] or x >= knots[-1]:
+            return 0
+
+        return self.interpolate(self.index_at(x), x)
+
+    def interpolate(self, i: int, x: float) -> float:
+        """
+        The value at `x`, which is between knots `i` and `i+1`.
+        """
+
+        knots = self.knots_x
+        y0, y1 = self.knots_y[i], self.knots_y[i+1]
+        if y0 == y1:
+            return y0
+
+        fraction = (x - knots[i]) / (knots[i+1] - knots[i])
+
+        # curves ramp from or to 0, so this is `theta_f * fraction` or `theta_f * (1 - fraction)`, like the per-curve formulas
+        if y0 == 0:
+            return y1 * fraction
+        if y1 == 0:
+            return y0 * (1 - fraction)
+        return y0 + (y1 - y0) * fraction
+
+class TrackCursor:
+    """
+    Looks up values of a `CompiledTrack` for one car, starting from the knot of its previous lookup.
+
+    Cars move forward a few meters per tick, so the knot is nearly always the same one or the next one,
+    whatever the length of the track. Anything else (a car reset, or a correction from the server) falls back
+    to `CompiledTrack.index_at`. Either way, `value_at` gives exactly the same result as the track's.
+    """
+
+    def __init__(self, track: CompiledTrack) -> None:
+        self.track = track
+        self.index = 0
+        """ The knot of the last lookup inside the track """
+
+    def value_at(self, x: float) -> float:
+        track = self.track
+        knots = track.knots_x
+        if not len(knots) or x < knots[0] or x >= knots[-1]:
+            return 0
+
+        i = self.index
+        if not knots[i] <= x < knots[i+1]:
+            if knots[i+1] <= x < knots[i+2]: # (i+2 exists, since x is before the last knot)
+                i += 1
+            else:
+                i = track.index_at(x)
+            self.index = i
+
+        return track.interpolate(i, x)
+
+def compile_curves(segments: Iterable) -> CompiledTrack:
+    """
+    Compiles the track angle described by a map's `CurveSegment`s (see `GameMap.angle_at`).
+    """
+
+    knots_x, knots_y = [], []
+
+    for segment in segments:
+        q1 = segment.mid_x - (segment.mid_x - segment.start_x)/2
+        q3 = segment.mid_x + (segment.end_x - segment.mid_x)/2
+
+        knots_x += [segment.start_x, q1, q3, segment.end_x]
+        knots_y += [0, segment.theta_f, segment.theta_f, 0]
+
+    return CompiledTrack(knots_x, knots_y)
+
+def compile_vanishing_points(segments: Iterable) -> CompiledTrack:
+    """
+    Compiles the angle of the vanishing point (see `GameMap.vanishing_point_at` on the client),
+    which ramps between each curve's start, mid and end instead.
+    """
+
+    knots_x, knots_y = [], []
+
+    for segment in segments:
+        knots_x += [segment.start_x, segment.mid_x, segment.end_x]
+        knots_y += [0, segment.theta_f, 0]
+
+    return CompiledTrack(knots_x, knots_y)
@@ -0,0 +1,100 @@
+from random import random
+from typing import Callable, Dict, Tuple, TYPE_CHECKING
+
+from socket_wrapper import pack_datagram, unpack_datagram, DATAGRAM_HEADER, MESSAGE_UDP_HELLO, MAX_DATAGRAM_SIZE
+from CONSTANTS import UDP_SIMULATED_LOSS
+
+if TYPE_CHECKING:
+    from client_room import Client
+
+class UDPChannel:
+    """
+    The optional unreliable channel, used for physics snapshots (server -> client) and key state / acks (client -> server).
+
+    Snapshots are superseded a few hundred ms after they're sent, so waiting for a lost one to be
+    retransmitted (which is what TCP does, holding up everything sent after it) is worse than useless.
+    Events (`game-init`, `crash`, `game-end`, ...) still go over the client's TCP connection.
+
+    The channel only identifies clients by the address their datagrams come from, which is bound to a client
+    by the `MESSAGE_UDP_HELLO` exchange (see `./socket_wrapper.py`). A client's snapshots are only sent over UDP
+    after it confirms, over TCP, that it received our reply (`Client.udp_active`) - otherwise they stay on TCP.
+
+    Owned by whichever runtime is running, which sets `sendto` and passes every received datagram to `handle_datagram`.
+    """
+
+    def __init__(self, id_to_client: Dict[str, 'Client'], simulated_loss: float = UDP_SIMULATED_LOSS) -> None:
+        self.id_to_client = id_to_client
+        self.addr_to_client: Dict[Tuple[str, int], 'Client'] = {}
+
+        self.simulated_loss = simulated_loss
+        """ Fraction of datagrams (both directions) to drop on purpose, for testing """
+
+        self.sendto: Callable[[bytes, Tuple[str, int]], None] = None
+        """ `sendto(datagram, address)` of the UDP socket/transport. Must not block. """
+
+    def handle_datagram(self, data: bytes, addr: Tuple[str, int]) -> None:
+        """
+        Handles one datagram received on the UDP socket.
+        """
+
+        if random() < self.simulated_loss: return
+
+        try:
+            msg_type, seq, payload = unpack_datagram(data)
+        except ValueError:
+            return
+
+        if msg_type == MESSAGE_UDP_HELLO:
+            cli = self.id_to_client.get(payload.decode('utf-8', 'replace'))
+            if cli is None or cli.sock is None: return
+
+            if cli.udp_addr != addr:
+                self.forget(cli)
+                cli.udp_addr = addr
+                cli.udp = self
+                self.addr_to_client[addr] = cli
+
+            self.send(cli, MESSAGE_UDP_HELLO, b"")
+            return
+
+        cli = self.addr_to_client.get(addr)
+        if cli is None: return
+
+        # late (reordered) or duplicated datagram
+        if seq <= cli.udp_seq_in: return
+        cli.udp_seq_in = seq
+
+        cli.handle_message(msg_type, payload)
+
+    def send(self, cli: 'Client', msg_type: int, payload: bytes) -> bool:
+        """
+        Sends a datagram to `cli`. It may be lost - that's the point.
+
+        Returns `False` (without sending) if the client has no UDP address or the datagram would be too large,
+        in which case the caller should use TCP instead.
+        """
+
+        addr = cli.udp_addr
+        if addr is None or DATAGRAM_HEADER.size + len(payload) > MAX_DATAGRAM_SIZE:
+            return False
+
+        cli.udp_seq_out += 1
+        if random() < self.simulated_loss: return True
+
+        try:
+            self.sendto(pack_datagram(msg_type, cli.udp_seq_out, payload), addr)
+        except OSError:
+            pass # full socket buffer, unreachable port, etc. - as good as lost
+
+        return True
+
+    def forget(self, cli: 'Client') -> None:
+        """
+        Unbinds `cli`'s UDP address. Called when its TCP connection closes.
+        """
+
+        if cli.udp_addr is not None and self.addr_to_client.get(cli.udp_addr) is cli:
+            del self.addr_to_client[cli.udp_addr]
+
+        cli.udp_addr = None
+        cli.udp_active = False
@@ -0,0 +1,184 @@
+"""
+A vectorized version of `./physics.py`, for rooms with a lot of entities.
+
+Instead of every `Entity` keeping its own floats and being stepped one at a time, `EntityArrays` keeps the state of every
+entity in a world as columns of NumPy arrays (one row per entity), and `step` advances all of them at once, curve angle
+lookup included. The entities become thin views over their row (see `ArrayEntity` in `./world/entity.py`).
+
+Each step runs the same formulas in the same order as `physics.step` (and the same track lookup), so results match the
+scalar engine up to the last bit of `sin`/`cos` (NumPy's and the C library's can differ by an ulp). The client always runs the scalar version.
+
+NumPy is optional - without it, `World` just uses the scalar engine (see `World.__init__`).
+"""
+
+from typing import List, TYPE_CHECKING
+
+try:
+    import numpy as np
+except ImportError: # pragma: no cover
+    np = None
+
+from CONSTANTS import OOB_LENIENCY, TRACK_WIDTH
+from game_map import GameMap
+import physics
+
+if TYPE_CHECKING:
+    from world.entity import Entity
+
+INITIAL_CAPACITY = 16
+""" Rows allocated up front. Doubled whenever the arrays fill up. """
+
+def track_angles(knots_x: 'np.ndarray', knots_y: 'np.ndarray', pos_x: 'np.ndarray') -> 'np.ndarray':
+    """
+    `CompiledTrack.value_at` (see `./track.py`) for every x-position in `pos_x` at once,
+    given the track's knots as arrays. Uses a vectorized binary search instead of the bucket table.
+    """
+
+    angles = np.zeros_like(pos_x)
+    if len(knots_x) == 0: return angles
+
+    inside = (pos_x >= knots_x[0]) & (pos_x < knots_x[-1])
+    x = pos_x[inside]
+
+    # the last knot at or before each position, like `value_at`
+    i = np.searchsorted(knots_x, x, side='right') - 1
+    x0, x1, y0, y1 = knots_x[i], knots_x[i+1], knots_y[i], knots_y[i+1]
+    fraction = (x - x0) / (x1 - x0)
+
+    angles[inside] = np.where(y0 == y1, y0,
+        np.where(y0 == 0, y1 * fraction,
+        np.where(y1 == 0, y0 * (1 - fraction), y0 + (y1 - y0) * fraction)))
+
+    return angles
+
+class EntityArrays:
+    """
+    Structure-of-arrays storage for the physics state of every entity in one world.
+
+    Rows `0..count-1` are in use. Removing an entity moves the last row into its place, so the used rows stay contiguous,
+    and `owners[row]` keeps track of which entity is in which row (each entity also knows its own `row`).
+
+    ### Columns:
+    - `pos_x`, `pos_y`, `vel`, `acc`, `angle`: `float64`, as in `physics.State`
+    - `keys`: `bool`, shape `(capacity, 4)` - `[forward, backward, left, right]`
+    - `crash_ticks`: `int64`, ticks left in the current crash (see `Entity.crash_ticks`)
+    """
+
+    def __init__(self, gamemap: GameMap, capacity: int = INITIAL_CAPACITY) -> None:
+        self.gamemap = gamemap
+        self.knots_x = np.asarray(gamemap.track.knots_x, dtype=float) # no copy for a compiled map
+        self.knots_y = np.asarray(gamemap.track.knots_y, dtype=float)
+        self.count = 0
+        self.owners: List['Entity'] = []
+
+        self.pos_x = np.zeros(capacity)
+        self.pos_y = np.zeros(capacity)
+        self.vel = np.zeros(capacity)
+        self.acc = np.zeros(capacity)
+        self.angle = np.zeros(capacity)
+        self.keys = np.zeros((capacity, 4), dtype=bool)
+        self.crash_ticks = np.zeros(capacity, dtype=np.int64)
+
+    def _columns(self) -> List[str]:
+        return ["pos_x", "pos_y", "vel", "acc", "angle", "keys", "crash_ticks"]
+
+    def add(self, owner: 'Entity') -> int:
+        """
+        Allocates a zeroed row for `owner`, and returns its index.
+        """
+
+        if self.count == len(self.pos_x):
+            for name in self._columns():
+                column = getattr(self, name)
+                grown = np.zeros((len(column) * 2,) + column.shape[1:], dtype=column.dtype)
+                grown[:self.count] = column[:self.count]
+                setattr(self, name, grown)
+
+        row = self.count
+        for name in self._columns():
+            getattr(self, name)[row] = 0
+
+        self.owners.append(owner)
+        self.count += 1
+        return row
+
+    def remove(self, row: int) -> None:
+        """
+        Frees `row`, moving the last row into it (and updating that entity's `row`).
+        """
+
+        last = self.count - 1
+        if row != last:
+            for name in self._columns():
+                column = getattr(self, name)
+                column[row] = column[last]
+
+            moved = self.owners[last]
+            moved.row = row
+            self.owners[row] = moved
+
+        self.owners.pop()
+        self.count -= 1
+
+    def step(self, dt: float = physics.DT) -> None:
+        """
+        Advances every entity by one tick, like calling `Entity.update` on each of them.
+
+        Crashed entities only count down their `crash_ticks`. Everything else goes through the same formulas as `physics.step`.
+        """
+
+        n = self.count
+        if n == 0: return
+
+        crash_ticks = self.crash_ticks[:n]
+        moving = crash_ticks <= 0
+        np.subtract(crash_ticks, 1, out=crash_ticks, where=~moving)
+
+        pos_x, pos_y, vel, angle = self.pos_x[:n], self.pos_y[:n], self.vel[:n], self.angle[:n]
+        keys = self.keys[:n]
+        forward, backward, left, right = keys[:, 0], keys[:, 1], keys[:, 2], keys[:, 3]
+
+        # update angle (see `physics.step` for what all of this means)
+        turn_resistance_factor = -(0.01*vel-1)**2 + 1
+        new_angle = angle + (right.astype(np.int8) - left.astype(np.int8)) * 50 * turn_resistance_factor * dt
+        new_angle %= 360
+
+        # clamp angle to 270-360 and 0-90 only
+        new_angle[(new_angle >= 180) & (new_angle < 270)] = 270
+        new_angle[(new_angle < 180) & (new_angle > 90)] = 90
+
+        sqrt_vel = np.sqrt(vel)
+        new_acc = np.where(
+            backward & ~forward, -10.0,
+            np.where(forward & ~backward, 10 - sqrt_vel, -sqrt_vel)
+        )
+
+        new_vel = np.maximum(0, np.minimum(vel + new_acc * dt, 100))
+
+        angular_accel = 10/(0.4 * new_vel + 2.22) + .5
+
+        relative_angle = np.radians((new_angle + angular_accel * dt - track_angles(self.knots_x, self.knots_y, pos_x)) % 360)
+        new_pos_x = pos_x + new_vel * np.cos(relative_angle) * dt
+        new_pos_y = pos_y + new_vel * np.sin(relative_angle) * dt
+
+        # crashed entities keep their state
+        np.copyto(self.pos_x[:n], new_pos_x, where=moving)
+        np.copyto(self.pos_y[:n], new_pos_y, where=moving)
+        np.copyto(self.vel[:n], new_vel, where=moving)
+        np.copyto(self.acc[:n], new_acc, where=moving)
+        np.copyto(self.angle[:n], new_angle, where=moving)
+
+    def out_of_bounds(self) -> List[int]:
+        """
+        Returns the rows of every entity that isn't crashed, but is too far off the track (see `Entity.check_out_of_bounds`).
+        """
+
+        n = self.count
+        oob = (np.abs(self.pos_y[:n]) > OOB_LENIENCY + TRACK_WIDTH/2) & (self.crash_ticks[:n] <= 0)
+        return np.flatnonzero(oob).tolist()
+
+    def leader_x(self) -> float:
+        """
+        The furthest x-position of any entity (`-inf` if there are none).
+        """
+        return float(self.pos_x[:self.count].max()) if self.count else float('-inf')
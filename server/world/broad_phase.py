@@ -0,0 +1,54 @@
+from typing import List, Tuple
+
+from world.entity import Entity
+
+class SweepAndPrune:
+    """
+    Finds the pairs of entities that might be colliding, without checking every pair.
+
+    Entities are kept sorted by `pos[0]` (distance along the track). Two entities can only touch if they are closer
+    along the track than the sum of their hitbox radii, so each entity only needs to be checked against the
+    next few in the list, and the scan stops at the first one that is too far ahead.
+
+    The list is kept between ticks. Cars barely change order from one tick to the next, so re-sorting
+    it is close to linear (Python's sort is fast on nearly sorted lists).
+    """
+
+    def __init__(self) -> None:
+        self.order: List[Entity] = []
+        """ Every entity, sorted by `pos[0]` as of the last `candidate_pairs` """
+
+    def add(self, entity: Entity) -> None:
+        self.order.append(entity)
+
+    def remove(self, entity: Entity) -> None:
+        self.order.remove(entity)
+
+    def candidate_pairs(self) -> List[Tuple[Entity, Entity]]:
+        """
+        Returns every pair of entities that are closer along the track than the sum of their hitbox radii.
+        Every colliding pair is in here, along with a few that aren't (they still need `are_colliding`).
+
+        The pairs are in no particular order.
+        """
+
+        order = self.order
+        order.sort(key=lambda e: e.pos[0])
+
+        xs = [e.pos[0] for e in order]
+        radii = [e.hitbox_radius for e in order]
+        max_radius = max(radii, default=0)
+
+        pairs = []
+
+        for a in range(len(order)):
+            xa, ra = xs[a], radii[a]
+
+            # nothing further along than `ra + max_radius` can touch `a`
+            b = a + 1
+            while b < len(order) and xs[b] - xa < ra + max_radius:
+                if xs[b] - xa < ra + radii[b]:
+                    pairs.append((order[a], order[b]))
+                b += 1
+
+        return pairs
@@ -1,12 +1,14 @@
-import math
-from typing import List, TYPE_CHECKING
-from time import time_ns
+from typing import Iterator, List, TYPE_CHECKING
+import time
 
 from CONSTANTS import *
 from game_map import GameMap
+import physics
+from track import TrackCursor
 
 if TYPE_CHECKING:
     from client_room import Client
+    from vector_physics import EntityArrays
 
 class Entity:
     """
@@ -42,6 +44,8 @@ class Entity:
         self.name = name
         self.color = color
         self.client = client
+        self.slot: int = None
+        """ Small integer id of this entity in binary snapshots. Set by `World.create_entity`. """
         self.gamemap = gamemap
         self.pos = pos
         """ `[distance along track, offset from track center]` """
@@ -50,15 +54,17 @@ class Entity:
         self.angle = angle%360
         self.hitbox_radius = hitbox_radius
         
-        self.last_update_timestamp = time_ns()
+        self.track_cursor = TrackCursor(gamemap.track)
+        """ Follows this car along the track, for the track angle lookups of its physics steps (see `track.py`) """
         
-        self.crash_end_timestamp = 0
+        self.crash_ticks = 0
+        """ Ticks left until this entity recovers from a crash (0 = not crashed). It doesn't move while crashed. """
         
         # False = key is not held down, True = key is held down
         # Use this to update acceleration and angle
         # w = +acc, s = -acc, a = +angle, d = -angle
         self.key_presses = keys.copy()
-        """ `[forward, backward, left, right]` - see `./key_decoder.py` for more info."""
+        """ `[forward, backward, left, right]` - set from each `MESSAGE_INPUT` the client sends (see `Client.apply_input`)."""
 
     def update_keys(self, keyid: int, down: bool) -> None:
         """
@@ -73,71 +79,20 @@ class Entity:
     
     def update(self):
         """
-        Updates physics, including position, velocity, acceleration, and angle.
+        Advances physics (position, velocity, acceleration, and angle) by one tick, with the current `key_presses`.
+        See `step` in `../physics.py` (the same code the client runs).
         
-        If the track is curved at this entity's x-position, 
-        then position is updated with the entity's relative angle (`self.angle - track_angle`)
-        
-        For example, if the entity has an angle of -10 degrees (turned left), 
-        but the track is curved at 30 degrees (going right) at that x-pos,
-        then position is updated similar to as follows:
-        
-        ```python
-        x_position += velocity * cos(radians(-10-30)) * delta_time_s   
-        y_position += velocity * sin(radians(-10-30)) * delta_time_s
-        ```    
-        
-        which would result in them drifting to the left side of the track.
-        
-        Should be run on every server tick (for now, 24tps) - see `../CONSTANTS.py`
+        Should be run on every server tick (`TICK_SPEED` per second) - see `../CONSTANTS.py`
         """
         
         # if we are still in the crash duration, don't update anything
-        if self.crash_end_timestamp > time_ns()/1e9:
-            self.last_update_timestamp = time_ns()
+        if self.crash_ticks > 0:
+            self.crash_ticks -= 1
             return
         
-        delta_time_s = (time_ns() - self.last_update_timestamp) / 1e9
-        
-        # update angle
-        # formula for turn resistance: factor = -(0.01*vel-1)**2 + 1 (0x at vel=0, 1x at vel=100, 0x at vel=200)
-        turn_resistance_factor = -(0.01*self.vel-1)**2 + 1
-        self.angle += (self.key_presses[3] - self.key_presses[2]) * 50 * turn_resistance_factor * delta_time_s
-        self.angle %= 360
-        
-        # clamp angle to 270-360 and 0-90 only
-        if self.angle>=180 and self.angle<270:
-            self.angle = 270
-        elif self.angle<180 and self.angle>90:
-            self.angle = 90
-        
-        # if w is held down, set x acceleration to 10- sqrt vel <- ensures no acc at v=100m/s
-        # if s is held down, set x acceleration to -10, other handling ensures that velocity will stay between 0 and 100 m/s
-        # if neither or both, set x acceleration to - sqrt vel <- simulates drag and high air resistance at higher speeds
-        if self.key_presses[1] and not self.key_presses[0]:
-            self.acc = -10 
-        elif self.key_presses[0] and not self.key_presses[1]:
-            self.acc = 10 - math.sqrt(self.vel)
-        else:
-            self.acc = -math.sqrt(self.vel)
-
-        # update velocity with with methods to guarantee it's within the ranges of 0-100
-        self.vel = max(0, min(self.vel + self.acc * delta_time_s, 100))
-
-
-        #adjusting angular accel value to slow turning at higher speeds
-        denominator = 0.4 * self.vel + 2.22 
-        #value that changes how much a person can turn based on speed 
-        angular_accel = 10/denominator + .5 
-
-        # update positions
-        #angle change now involves speed with mod 360 to reset angle 
-        relative_angle = (self.angle + angular_accel * delta_time_s - self.gamemap.angle_at(self.pos[0])) % 360
-        self.pos[0] += self.vel * math.cos(math.radians(relative_angle)) * delta_time_s
-        self.pos[1] += self.vel * math.sin(math.radians(relative_angle)) * delta_time_s
-        
-        # update timestamp
-        self.last_update_timestamp = time_ns()
+        self.pos[0], self.pos[1], self.vel, self.acc, self.angle = physics.step(
+            self.pos[0], self.pos[1], self.vel, self.angle, self.key_presses, self.track_cursor.value_at
+        )
     
     def check_out_of_bounds(self) -> bool:
         """
@@ -147,7 +102,7 @@ class Entity:
         If `True`, calls `self.on_wall_collide()`. If `False`, does nothing more.
         """
         
-        if self.crash_end_timestamp > time_ns()/1e9:
+        if self.crash_ticks > 0:
             return False
         
         if abs(self.pos[1]) > OOB_LENIENCY + TRACK_WIDTH/2:
@@ -193,16 +148,16 @@ class Entity:
         """
         
         return {
-            "pos": self.pos,
+            "pos": list(self.pos),
             "vel": self.vel,
             "acc": self.acc,
             "angle": self.angle%360,
             "hitbox_radius": self.hitbox_radius,
             "keys": self.key_presses,
-            "is_crashed": self.crash_end_timestamp > time_ns()/1e9
+            "is_crashed": self.crash_ticks > 0
         }
         
-    def on_entity_collide(self, other: 'Entity', spawn_direction: str, end_timestamp: float) -> None:
+    def on_entity_collide(self, other: 'Entity', spawn_direction: str) -> None:
         """
         Called when this entity collides, but it must be WITH ANOTHER ENTITY.
         
@@ -214,7 +169,7 @@ class Entity:
         # set all keys to False
         self.key_presses = [False, False, False, False]
         
-        self.crash_end_timestamp = end_timestamp
+        self.crash_ticks = CRASH_TICKS
         
         # new physics: set velocity to 0, set acceleration to 0, set angle to track angle, 
         # and set y_pos to what's specified in `spawn_direction`
@@ -232,7 +187,7 @@ class Entity:
         
         self.client.send_data({
             "new_physics": {
-                "pos": self.pos,
+                "pos": list(self.pos),
                 "vel": 0,
                 "acc": 0,
                 "angle": self.angle,
@@ -240,7 +195,7 @@ class Entity:
                 "keys": self.key_presses,
                 "is_crashed": True
             }, 
-            "crash_end_timestamp": end_timestamp
+            "crash_end_timestamp": self.crash_end_timestamp()
         }, 'crash')
         
     def on_wall_collide(self) -> None:
@@ -251,7 +206,7 @@ class Entity:
         # set all keys to False
         self.key_presses = [False, False, False, False]
         
-        self.crash_end_timestamp = time_ns()/1e9 + CRASH_DURATION
+        self.crash_ticks = CRASH_TICKS
         # new physics: set velocity to 0, set acceleration to 0, set angle to track angle, and set y_pos to 0
         
         # set the new physics here
@@ -262,7 +217,7 @@ class Entity:
         
         self.client.send_data({
             "new_physics": {
-                "pos": self.pos,
+                "pos": list(self.pos),
                 "vel": 0,
                 "acc": 0,
                 "angle": self.angle,
@@ -270,5 +225,104 @@ class Entity:
                 "keys": self.key_presses,
                 "is_crashed": True
             },
-            "crash_end_timestamp": self.crash_end_timestamp
+            "crash_end_timestamp": self.crash_end_timestamp()
         }, 'crash')
+    
+    def crash_end_timestamp(self) -> float:
+        """
+        When (server clock, seconds) the current crash will be over, for the client's crash countdown.
+        The crash itself is timed in ticks (`crash_ticks`), so this is only an estimate if ticks run late.
+        """
+        return time.time() + self.crash_ticks * physics.DT
+
+class _PosView:
+    """
+    `ArrayEntity.pos`: behaves like the `[pos_x, pos_y]` list of a plain `Entity`, but reads and writes the entity's row.
+    """
+
+    def __init__(self, entity: 'ArrayEntity') -> None:
+        self.entity = entity
+
+    def __getitem__(self, i: int) -> float:
+        arrays = self.entity.arrays
+        return float((arrays.pos_x, arrays.pos_y)[i][self.entity.row])
+
+    def __setitem__(self, i: int, value: float) -> None:
+        arrays = self.entity.arrays
+        (arrays.pos_x, arrays.pos_y)[i][self.entity.row] = value
+
+    def __len__(self) -> int:
+        return 2
+
+    def __iter__(self) -> Iterator[float]:
+        return iter((self[0], self[1]))
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+class ArrayEntity(Entity):
+    """
+    An `Entity` whose physics state lives in a row of an `EntityArrays` (see `../vector_physics.py`) instead of its own attributes.
+    Used by worlds running the vectorized engine, where `World.update` steps all of the rows at once instead of calling `update`.
+
+    Everything else (events, snapshots, collisions) uses it exactly like a plain `Entity`.
+    """
+
+    def __init__(self, arrays: 'EntityArrays', *args, **kwargs) -> None:
+        self.arrays = arrays
+        self.row = arrays.add(self)
+        """ Index of this entity's row. Can change when another entity is removed (see `EntityArrays.remove`). """
+        self._pos_view = _PosView(self)
+
+        super().__init__(*args, **kwargs)
+
+    @property
+    def pos(self) -> _PosView:
+        return self._pos_view
+
+    @pos.setter
+    def pos(self, value: List[float]) -> None:
+        self.arrays.pos_x[self.row], self.arrays.pos_y[self.row] = value
+
+    @property
+    def vel(self) -> float:
+        return float(self.arrays.vel[self.row])
+
+    @vel.setter
+    def vel(self, value: float) -> None:
+        self.arrays.vel[self.row] = value
+
+    @property
+    def acc(self) -> float:
+        return float(self.arrays.acc[self.row])
+
+    @acc.setter
+    def acc(self, value: float) -> None:
+        self.arrays.acc[self.row] = value
+
+    @property
+    def angle(self) -> float:
+        return float(self.arrays.angle[self.row])
+
+    @angle.setter
+    def angle(self, value: float) -> None:
+        self.arrays.angle[self.row] = value
+
+    @property
+    def crash_ticks(self) -> int:
+        return int(self.arrays.crash_ticks[self.row])
+
+    @crash_ticks.setter
+    def crash_ticks(self, value: int) -> None:
+        self.arrays.crash_ticks[self.row] = value
+
+    @property
+    def key_presses(self) -> List[bool]:
+        return self.arrays.keys[self.row].tolist()
+
+    @key_presses.setter
+    def key_presses(self, value: List[bool]) -> None:
+        self.arrays.keys[self.row] = value
+
+    def update_keys(self, keyid: int, down: bool) -> None:
+        self.arrays.keys[self.row, keyid] = down
@@ -1,23 +1,26 @@
 from typing import Dict, List
-from time import time_ns
-import math
+import time
+import heapq
 
-from world.entity import Entity
-from game_map import GameMap
+from world.entity import Entity, ArrayEntity
+from world.broad_phase import SweepAndPrune
+from map_registry import map_registry
+from vector_physics import EntityArrays, np
 from CONSTANTS import *
 
 def are_colliding(e1: Entity, e2: Entity) -> bool:
     """
     Runs distance formula on two entities' positions.
     Returns whether or not the distance is less than the sum of their hitbox radii
+    (compared squared, so there's no square root)
     
     `True` if they are colliding, `False` otherwise. 
     """
     
-    return math.sqrt(
+    return (
         (e1.pos[0] - e2.pos[0])**2 + 
         (e1.pos[1] - e2.pos[1])**2
-    ) < e1.hitbox_radius + e2.hitbox_radius
+    ) < (e1.hitbox_radius + e2.hitbox_radius)**2
 
 class World:
     """
@@ -25,18 +28,45 @@ class World:
     
     Must be initialized with a specific map.
     """
+    
+    vectorized = VECTOR_PHYSICS
+    """ Default engine for new worlds (see `__init__`) """
         
-    def __init__(self, map_name: str = None) -> None:
+    def __init__(self, map_name: str = None, vectorized: bool = None) -> None:
         """
         Creates a new World object with no entities added.
         
         If no map name is provided, a random map is picked.
+        
+        If `vectorized` (by default, `World.vectorized`), entity state is kept in NumPy arrays and stepped all at once
+        (see `../vector_physics.py`). Otherwise (or if NumPy isn't installed), each entity is stepped on its own.
         """
         
-        self.gamemap = GameMap(map_name)
+        self.gamemap = map_registry.get(map_name)
+        """ shared with every other world on the same map (see `../map_registry.py`) """
         self.entities: Dict[str, Entity] = {}        
         """ a map from client_ids to entity objects """
         
+        if vectorized is None: vectorized = World.vectorized
+        if vectorized and np is None:
+            print("\x1b[33mNumPy is not installed, using the scalar physics engine\x1b[0m")
+            vectorized = False
+        
+        self.arrays: EntityArrays | None = EntityArrays(self.gamemap) if vectorized else None
+        """ Physics state of every entity, if using the vectorized engine """
+        
+        self.tick = 0
+        """ Number of physics ticks run so far. Every tick advances exactly `physics.DT` seconds. """
+        self.tick_timestamp = time.time()
+        """ When (server time, seconds) the latest tick ran - the time the entities' current state is from """
+        
+        self.broad_phase = SweepAndPrune()
+        """ finds the pairs of entities that might be colliding (see `check_entity_collisions`) """
+        
+        self.free_slots: List[int] = []
+        """ min-heap of slot ids freed by `destroy_entity`, reused before new ones are handed out """
+        self.next_slot = 0
+        
     def create_entity(
         self, 
         name: str,
@@ -55,8 +85,20 @@ class World:
         Returns a reference the entity.
         """
         
-        e = Entity(name, color, client, self.gamemap, pos, vel, acc, angle, hitbox_radius)
+        if self.arrays is not None:
+            e = ArrayEntity(self.arrays, name, color, client, self.gamemap, pos, vel, acc, angle, hitbox_radius)
+        else:
+            e = Entity(name, color, client, self.gamemap, pos, vel, acc, angle, hitbox_radius)
+        
+        # slot ids identify entities in binary snapshots (see ../snapshot.py), so they must be small and unique
+        if self.free_slots:
+            e.slot = heapq.heappop(self.free_slots)
+        else:
+            e.slot = self.next_slot
+            self.next_slot += 1
+        
         self.entities[client.id] = e
+        self.broad_phase.add(e)
         
         return e
         
@@ -65,11 +107,16 @@ class World:
         Removes the entity with the specified client_id from the world.
         """
         
-        del self.entities[client_id]
+        e = self.entities.pop(client_id)
+        heapq.heappush(self.free_slots, e.slot)
+        self.broad_phase.remove(e)
+        
+        if self.arrays is not None:
+            self.arrays.remove(e.row)
         
     def update(self) -> bool:
         """
-        Updates all entities in the world.
+        Advances every entity in the world by one tick (see `../physics.py`), and increments `tick`.
         
         This also handles all collisions.
         
@@ -79,7 +126,12 @@ class World:
         Returns `True` if the game has ended, `False` otherwise.
         """
         
-        [e.update() for e in self.entities.values()]   
+        if self.arrays is not None:
+            self.arrays.step()
+        else:
+            [e.update() for e in self.entities.values()]   
+        self.tick += 1
+        self.tick_timestamp = time.time()
         
         # check for win before collisions because if you cross then game technically ends
         win_result = self.check_win()
@@ -101,6 +153,10 @@ class World:
         Returns `True` if the game has ended, `False` otherwise.
         """  
         
+        # nobody can have finished if the leader hasn't
+        if self.arrays is not None and self.arrays.leader_x() < self.gamemap.map_data['length']:
+            return False
+        
         progresses = [e.get_progress() for e in self.entities.values()]
         
         if any([p >= 1 for p in progresses]):
@@ -128,8 +184,32 @@ class World:
         """
         Checks for collisions between entities.
         
-        Since there are only 8 players max, a brute force approach should be fine.
-        (we would only check 28 pairs max)
+        Only the pairs that `broad_phase` finds close enough along the track are checked (see `./broad_phase.py`).
+        
+        Colliding pairs are handled in the same order as checking every pair would (by order of joining),
+        with the same entity spawning left, since each collision moves the entities before the next pair is checked.
+        """
+        
+        join_order = {e.slot: i for i, e in enumerate(self.entities.values())}
+        
+        pairs = []
+        for e1, e2 in self.broad_phase.candidate_pairs():
+            if join_order[e1.slot] > join_order[e2.slot]:
+                e1, e2 = e2, e1
+            pairs.append((join_order[e1.slot], join_order[e2.slot], e1, e2))
+        pairs.sort(key=lambda pair: pair[:2])
+        
+        for _, _, e1, e2 in pairs:
+            if are_colliding(e1, e2):
+                # Tell both entities that they crashed
+                e1.on_entity_collide(e2, 'left')
+                e2.on_entity_collide(e1, 'right')
+
+    def check_entity_collisions_brute_force(self) -> None:
+        """
+        Checks every pair of entities for collisions (what `check_entity_collisions` did before the broad phase).
+        
+        Gives the same results, and is only kept to compare against (see `../../benchmarks/collisions.py`).
         """
         entity_list = list(self.entities.values())
         
@@ -139,9 +219,8 @@ class World:
                 
                 if are_colliding(e1:=entity_list[i], e2:=entity_list[j]):
                     # Tell both entities that they crashed
-                    crash_end_timestamp = time_ns()/1e9 + CRASH_DURATION
-                    e1.on_entity_collide(e2, 'left', crash_end_timestamp)
-                    e2.on_entity_collide(e1, 'right', crash_end_timestamp)
+                    e1.on_entity_collide(e2, 'left')
+                    e2.on_entity_collide(e1, 'right')
 
     def check_out_of_bounds(self) -> None:
         """
@@ -150,6 +229,12 @@ class World:
         All entities that have gone too far will be crashed and the info will be sent to client
         """
 
+        if self.arrays is not None:
+            # only the entities the arrays flag need the full check (which crashes them)
+            for row in self.arrays.out_of_bounds():
+                self.arrays.owners[row].check_out_of_bounds()
+            return
+        
         for entity in self.entities.values():
             entity.check_out_of_bounds()
                     
@@ -157,12 +242,15 @@ class World:
         """
         Returns a JSON-serializable list of dicts containing all data for every entity in the world.
         
+        This is sent once in `game-init`. Live physics updates use the binary format in `../snapshot.py` instead.
+        
         Schema:
         ```typescript
         [
           {
             username: string,
             color: string,
+            slot: number, // identifies this entity in binary snapshots
             physics: {
               pos: [pos_x: number, pos_y: number],
               vel: number,
@@ -181,6 +269,7 @@ class World:
         return [{
             "username": e.name,
             "color": e.color,
+            "slot": e.slot,
             "physics": e.get_physics_data()
         } for e in self.entities.values()]
         
@@ -206,5 +295,6 @@ class World:
         
         if not field is None:
             return self.gamemap.map_data[field]
-                
-        return self.gamemap.map_data
\ No newline at end of file
+        
+        # a copy, since the map's own data is read-only (and shared)
+        return dict(self.gamemap.map_data)
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""
+Checks that every shipped compiled map (`.pmap`, see `server/map_format.py`) gives the same lookups as its `.map` file,
+on the server's and the client's side.
+
+Run from the repository root: `python -m pytest tests`
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.chdir(ROOT) # maps are loaded from ./server/maps
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+from CONSTANTS import MAPS, MAPS_DIR
+from map_format import CompiledMapFile, compiled_file_for
+from map_registry import parse_map_file
+from track import compile_curves, compile_vanishing_points
+
+MAPS_DIRS = [MAPS_DIR, "./game/maps"]
+
+def sample_points(length: float, step: float = 0.5) -> list:
+    """ Every `step` meters along the track, and a little past both ends """
+    return [-10 + i * step for i in range(int((length + 20) / step) + 1)]
+
+@pytest.mark.parametrize("maps_dir", MAPS_DIRS)
+@pytest.mark.parametrize("map_name", list(MAPS.keys()))
+def test_compiled_lookups_match_parsed_map(map_name: str, maps_dir: str) -> None:
+    map_data = MAPS[map_name]
+    compiled = CompiledMapFile(f"{maps_dir}/{compiled_file_for(map_data['map_file'])}")
+    segments = parse_map_file(f"{maps_dir}/{map_data['map_file']}")
+
+    assert compiled.metadata == map_data
+    assert [tuple(segment) for segment in compiled.segments(lambda *values: values)] == [tuple(segment) for segment in segments]
+
+    for compiled_track, parsed_track in [
+        (compiled.angle_track, compile_curves(segments)),
+        (compiled.vanishing_track, compile_vanishing_points(segments)),
+    ]:
+        assert compiled_track.resolution == parsed_track.resolution
+        for x in sample_points(map_data["length"]):
+            assert compiled_track.value_at(x) == parsed_track.value_at(x), f"{map_name} differs at x={x}"